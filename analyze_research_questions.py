@@ -7,285 +7,292 @@ YAMAPアウトドア保険 加入者アンケート分析スクリプト
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
 import warnings
+import argparse
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+
+from survey_aggregates import DEFAULT_CHUNKSIZE, SurveyAggregates, aggregate_frame, stream_aggregates
+from survey_charts import chart, draw_charts
+from survey_column_store import open_store
+from survey_incremental import update_aggregates
+from survey_crosstab import ALL_QUESTIONS, ATTRIBUTES, QUESTIONS
+from survey_excel import crosstab_sheets, frame_rows, write_workbook
+from survey_indicators import build_indicators
+from survey_loader import CSV_PATH, load_survey
+from survey_schema import COLUMNS, KEYS_BY_HEADER
+from survey_timeseries import timestamp_range
+from survey_weights import print_raking, rake_frame, read_margins
+from survey_trace import add_arguments as add_trace_arguments, enable_from_args as enable_trace, traced
+
 warnings.filterwarnings('ignore')
 
-# 日本語フォントの設定
-plt.rcParams['font.family'] = 'DejaVu Sans'
-sns.set_style("whitegrid")
-sns.set_palette("husl")
+# 並列実行の単位（表示の順序）: 属性ごとの分析 → ②アップセル → ③継続・非継続
+UNITS = [('attribute', attr_name) for attr_name in ATTRIBUTES] + [('upsell', None), ('continuation', None)]
+
+# 加入状況のセグメント（継続・アップセル経験者など）の判定に使う設問
+SEGMENT_KEYS = ['status', 'switch_timing']
+
+# ②・③で使う設問
+UNIT_KEYS = {
+    'upsell': ['switch_trigger', 'hesitation', 'future_intention'],
+    'continuation': ['year_plan_reason', 'cancel_reason', 'cancel_detail', 'age', 'gender', 'frequency'],
+}
 
-# CSVファイルのパス
-CSV_PATH = Path.home() / "Downloads" / "20251031_YAMAPアウトドア保険 加入者アンケート（回答） - フォームの回答 1.csv"
+@traced()
+def load_data(chunksize=None, incremental=False, full=False, margins_path=None):
+    """データを読み込んで集計する（chunksizeを指定するとチャンクごとに読み込む）
 
-def load_data():
-    """データを読み込む"""
+    incremental=Trueの場合は前回の集計に追記分だけを足し込む（full=Trueで全件を集計し直す）。
+    margins_pathを指定すると、構成比のCSVにレイキングしたウェイト付きの件数で集計する。
+    """
     print("データを読み込んでいます...")
-    df = pd.read_csv(CSV_PATH, encoding='utf-8')
-    print(f"データ読み込み完了: {len(df)}件の回答")
-    return df
+    if incremental:
+        agg, n_new = update_aggregates(CSV_PATH, chunksize or DEFAULT_CHUNKSIZE, full=full)
+        print(f"差分更新: 新しい回答 {n_new}件を集計")
+    elif chunksize:
+        agg = stream_aggregates(CSV_PATH, chunksize)
+    else:
+        df = load_survey(CSV_PATH)
+        weights = None
+        if margins_path:
+            raking = rake_frame(df, read_margins(margins_path))
+            print_raking(raking)
+            weights = raking.weights
+        agg = aggregate_frame(df, build_indicators(df), weights=weights)
+    print(f"データ読み込み完了: {agg.n_rows}件の回答")
+    return agg
 
-def split_multiple_choice(value):
-    """複数選択の回答を分割"""
-    if pd.isna(value):
-        return []
-    if isinstance(value, str):
-        return [v.strip() for v in value.split(',')]
-    return []
+def _count_dict(counts):
+    """件数のSeriesを表示用の辞書にする（ウェイト付きの件数は整数に丸める）"""
+    return {value: round(count) for value, count in counts.items()}
 
-def analyze_by_attribute(df):
-    """①属性ごとの加入動機、価値、加入タイミング、経路の分析"""
+def print_counts(counts, total, unit='人', indent='  '):
+    """件数と割合を1行ずつ表示"""
+    for value, count in counts.items():
+        pct = count / total * 100
+        print(f"{indent}{value}: {count:.0f}{unit} ({pct:.1f}%)")
+
+@traced()
+def analyze_by_attribute(agg, crosstab=None):
+    """①属性ごとの加入動機、価値、加入タイミング、経路の分析（crosstab: 集計済みのクロス集計）"""
     print("\n" + "="*100)
     print("① 属性ごとの加入動機、価値（便益・独自性）、加入タイミング、経路の分析")
     print("="*100)
     
-    results = {}
-    
-    # 属性定義
-    attributes = {
-        '年代': '年代をお選びください。',
-        '性別': '性別をお選びください。',
-        '地域': 'お住まいの地域をお選びください。',
-        '登山歴': 'あなたの登山歴に最も近いものをお選びください。',
-        '登山頻度': '直近1年以内に、どのくらいの頻度で登山・ハイキングをしていますか？'
+    # 全属性×設問のクロス集計（集計済み）
+    if crosstab is None:
+        crosstab = agg.crosstab()
+    print_attribute_blocks(agg, crosstab)
+    return crosstab
+
+def print_attribute_blocks(agg, crosstab):
+    """属性ごと・属性値ごとに設問の上位の回答を表示する（集計値に含まれる属性のみ）"""
+    sizes = agg.segment_table()
+    cells = {key: rows for key, rows in crosstab.groupby(['属性', '属性値', '設問'], sort=False)}
+    
+    # 設問ごとの表示（見出し, 表示件数, 単位）
+    display = {
+        '加入理由': ('加入理由（上位3）', 3, '回'),
+        '加入タイミング': ('加入タイミング', None, '人'),
+        '認知経路': ('認知経路（上位3）', 3, '回'),
+        '感じた価値・便益': ('感じた価値・便益', 3, '人'),
+        '決め手となった情報': ('決め手となった情報', 3, '人'),
     }
     
-    # 分析対象の項目
-    join_reason_col = 'あなたがYAMAPアウトドア保険に加入した理由を教えてください。（当てはまるものに全てチェックをしてください）[MA]'
-    timing_col = 'ヤマップグループの「外あそびレジャー保険」「山歩保険」にご加入されたタイミングについて教えてください。'
-    channel_col = 'YAMAPアウトドア保険を知ったきっかけをすべてお選びください。（複数選択可）[MA]'
-    benefit_col = '保険加入後、保険から感じるメリットとして、以下のどれを最も実感しますか？'
-    decision_col = '保険のご案内ページで、加入の「決め手となった情報」を1つ選んでお答えください。'
-    
-    for attr_name, attr_col in attributes.items():
-        if attr_col not in df.columns:
-            continue
-        
+    for attr_name, attr_sizes in sizes.groupby('属性', sort=False):
         print(f"\n【{attr_name}別の分析】")
         print("-" * 80)
         
-        attr_results = {}
-        
-        # 各属性値ごとに分析
-        for attr_value in df[attr_col].dropna().unique():
-            subset = df[df[attr_col] == attr_value]
-            
-            if len(subset) == 0:
+        # 各属性値ごとに表示
+        for attr_value, n in zip(attr_sizes['属性値'], attr_sizes['母数']):
+            if n == 0:
                 continue
             
-            print(f"\n■ {attr_name}: {attr_value} (n={len(subset)})")
-            
-            # 加入理由
-            if join_reason_col in df.columns:
-                all_reasons = []
-                for reasons_str in subset[join_reason_col].dropna():
-                    all_reasons.extend(split_multiple_choice(reasons_str))
-                if all_reasons:
-                    reason_counts = pd.Series(all_reasons).value_counts()
-                    print("\n  【加入理由（上位3）】")
-                    for reason, count in reason_counts.head(3).items():
-                        pct = count / len(subset) * 100
-                        print(f"    {reason}: {count}回 ({pct:.1f}%)")
-            
-            # 加入タイミング
-            if timing_col in df.columns:
-                timing_counts = subset[timing_col].value_counts()
-                print("\n  【加入タイミング】")
-                for timing, count in timing_counts.items():
-                    pct = count / len(subset) * 100
-                    print(f"    {timing}: {count}人 ({pct:.1f}%)")
-            
-            # 認知経路
-            if channel_col in df.columns:
-                all_channels = []
-                for channels_str in subset[channel_col].dropna():
-                    all_channels.extend(split_multiple_choice(channels_str))
-                if all_channels:
-                    channel_counts = pd.Series(all_channels).value_counts()
-                    print("\n  【認知経路（上位3）】")
-                    for channel, count in channel_counts.head(3).items():
-                        pct = count / len(subset) * 100
-                        print(f"    {channel}: {count}回 ({pct:.1f}%)")
+            print(f"\n■ {attr_name}: {attr_value} (n={n:.0f})")
             
-            # 価値（便益）
-            if benefit_col in df.columns:
-                benefit_counts = subset[benefit_col].value_counts()
-                print("\n  【感じた価値・便益】")
-                for benefit, count in benefit_counts.head(3).items():
-                    pct = count / len(subset) * 100
-                    print(f"    {benefit}: {count}人 ({pct:.1f}%)")
-            
-            # 決め手となった情報
-            if decision_col in df.columns:
-                decision_counts = subset[decision_col].value_counts()
-                print("\n  【決め手となった情報】")
-                for decision, count in decision_counts.head(3).items():
-                    pct = count / len(subset) * 100
-                    print(f"    {decision}: {count}人 ({pct:.1f}%)")
-    
-    return results
+            for question, (col, is_multi) in QUESTIONS.items():
+                if not agg.has(KEYS_BY_HEADER[col]):
+                    continue
+                rows = cells.get((attr_name, attr_value, question))
+                # 複数選択は回答がある場合のみ表示
+                if is_multi and rows is None:
+                    continue
+                title, limit, unit = display[question]
+                print(f"\n  【{title}】")
+                if rows is None:
+                    continue
+                if limit is not None:
+                    rows = rows.head(limit)
+                for option, count, pct in zip(rows['選択肢'], rows['件数'], rows['割合']):
+                    print(f"    {option}: {count:.0f}{unit} ({pct:.1f}%)")
 
-def analyze_upsell_experience(df):
+@traced()
+def analyze_upsell_experience(agg):
     """②7日プランから年プランへのアップセル経験者のインサイト"""
     print("\n" + "="*100)
     print("② 7日プランから年プランへのアップセル経験者のインサイト")
     print("="*100)
     
-    # 現在の加入状況から短期プラン経験者を特定
-    status_col = '以下から、現在のご加入状況について1つお選びください。'
-    switch_trigger_col = '短期契約の後に1年契約に切り替えようと思ったきっかけを教えてください。（複数選択可）[MA]'
-    switch_timing_col = '実際に短期契約の後に1年契約に切り替えたのはいつですか？'
-    hesitation_col = 'どのような点で迷われましたか？（複数選択可）[MA]'
-    future_intention_col = '今後、1年契約に切り替えるご意向はありますか？'
-    
-    # アップセル経験者を特定
-    # 現在年契約に加入している人で、短期プランを経験した人
-    year_plan = df[df[status_col].str.contains('1年契約', na=False)]
-    
-    # 短期プラン経験者を特定（切り替えた人）
-    switched = year_plan[year_plan[switch_timing_col].notna()]
+    # アップセル経験者: 現在年契約に加入している人で、短期→年契約の切り替え時期に回答した人
+    n_year_plan = agg.size('year_plan')
+    n_switched = agg.size('switched')
     
     print(f"\n【アップセル経験者数】")
-    print(f"  短期プランから年プランに切り替えた人: {len(switched)}人")
-    print(f"  年契約加入者全体: {len(year_plan)}人")
-    if len(year_plan) > 0:
-        print(f"  切り替え率: {len(switched)/len(year_plan)*100:.1f}%")
+    print(f"  短期プランから年プランに切り替えた人: {n_switched:.0f}人")
+    print(f"  年契約加入者全体: {n_year_plan:.0f}人")
+    if n_year_plan > 0:
+        print(f"  切り替え率: {n_switched/n_year_plan*100:.1f}%")
     
-    if len(switched) > 0:
+    if n_switched > 0:
         print(f"\n【切り替えきっかけ】")
-        all_triggers = []
-        for triggers_str in switched[switch_trigger_col].dropna():
-            all_triggers.extend(split_multiple_choice(triggers_str))
-        if all_triggers:
-            trigger_counts = pd.Series(all_triggers).value_counts()
-            for trigger, count in trigger_counts.items():
-                pct = count / len(switched) * 100
-                print(f"  {trigger}: {count}回 ({pct:.1f}%)")
+        print_counts(agg.counts('switched', 'switch_trigger'), n_switched, unit='回')
         
         print(f"\n【切り替えタイミング】")
-        timing_counts = switched[switch_timing_col].value_counts()
-        for timing, count in timing_counts.items():
-            pct = count / len(switched) * 100
-            print(f"  {timing}: {count}人 ({pct:.1f}%)")
+        print_counts(agg.counts('switched', 'switch_timing'), n_switched)
         
         # 迷った点
         print(f"\n【迷った点（短期→年契約への切り替え時）】")
-        all_hesitations = []
-        for hesitations_str in switched[hesitation_col].dropna():
-            all_hesitations.extend(split_multiple_choice(hesitations_str))
-        if all_hesitations:
-            hesitation_counts = pd.Series(all_hesitations).value_counts()
-            for hesitation, count in hesitation_counts.items():
-                pct = count / len(switched) * 100
-                print(f"  {hesitation}: {count}回 ({pct:.1f}%)")
+        print_counts(agg.counts('switched', 'hesitation'), n_switched, unit='回')
     
     # 現在短期プランに加入している人の将来意向
-    short_plan = df[df[status_col].str.contains('7日契約|30日契約', na=False)]
-    if len(short_plan) > 0:
+    n_short_plan = agg.size('short_plan')
+    if n_short_plan > 0:
         print(f"\n【現在短期プラン加入者の年契約への切り替え意向】")
-        print(f"  分母（短期プラン加入者総数）: {len(short_plan)}人")
-        intention_counts = short_plan[future_intention_col].value_counts()
-        for intention, count in intention_counts.items():
-            pct = count / len(short_plan) * 100
-            print(f"  {intention}: {count}人 ({pct:.1f}%)")
+        print(f"  分母（短期プラン加入者総数）: {n_short_plan:.0f}人")
+        intention_counts = agg.counts('short_plan', 'future_intention')
+        print_counts(intention_counts, n_short_plan)
         
         # あまり/全く検討していない人の合計
         not_considering = intention_counts.get('あまり検討していない', 0) + intention_counts.get('全く検討していない', 0)
         print(f"\n  【あまり/全く検討していない人の合計】")
-        print(f"    分子: {not_considering}人")
-        print(f"    分母: {len(short_plan)}人")
-        print(f"    割合: {not_considering/len(short_plan)*100:.1f}%")
-    
-    return switched
+        print(f"    分子: {not_considering:.0f}人")
+        print(f"    分母: {n_short_plan:.0f}人")
+        print(f"    割合: {not_considering/n_short_plan*100:.1f}%")
 
-def analyze_continuation(df):
+@traced()
+def analyze_continuation(agg):
     """③外あそび1年の継続・非継続理由"""
     print("\n" + "="*100)
     print("③ 外あそびレジャー保険1年契約の継続・非継続理由")
     print("="*100)
     
-    status_col = '以下から、現在のご加入状況について1つお選びください。'
-    
-    # 継続している人
-    continuing = df[df[status_col].str.contains('外あそびレジャー保険の1年契約に加入し、現在も加入中', na=False)]
-    
-    # 非継続した人（解約した人）
-    discontinued = df[df[status_col].str.contains('契約が終了している|解約', na=False)]
+    # 継続している人・非継続した人（解約した人）
+    n_continuing = agg.size('continuing')
+    n_discontinued = agg.size('discontinued')
     
     # 継続率の計算
-    total = len(continuing) + len(discontinued)
+    total = n_continuing + n_discontinued
     if total > 0:
-        continuation_rate = len(continuing) / total * 100
+        continuation_rate = n_continuing / total * 100
         print(f"\n【継続率】")
-        print(f"  継続者数（分子）: {len(continuing)}人")
-        print(f"  非継続者数: {len(discontinued)}人")
-        print(f"  合計（分母）: {total}人")
+        print(f"  継続者数（分子）: {n_continuing:.0f}人")
+        print(f"  非継続者数: {n_discontinued:.0f}人")
+        print(f"  合計（分母）: {total:.0f}人")
         print(f"  継続率: {continuation_rate:.1f}%")
-        print(f"    = {len(continuing)}人 / {total}人")
+        print(f"    = {n_continuing:.0f}人 / {total:.0f}人")
     
     # 継続理由を分析
-    if len(continuing) > 0:
+    if n_continuing > 0:
         print(f"\n【継続している人】")
-        print(f"  継続者数: {len(continuing)}人")
+        print(f"  継続者数: {n_continuing:.0f}人")
         
         # 1年契約を選択した決め手
-        reason_col = '1年契約を選択した決め手を教えてください。（当てはまるものに全てチェックをしてください）[MA]'
-        if reason_col in df.columns:
-            all_reasons = []
-            for reasons_str in continuing[reason_col].dropna():
-                all_reasons.extend(split_multiple_choice(reasons_str))
-            if all_reasons:
-                reason_counts = pd.Series(all_reasons).value_counts()
-                print("\n  【1年契約を選んだ決め手】")
-                for reason, count in reason_counts.items():
-                    pct = count / len(continuing) * 100
-                    print(f"    {reason}: {count}回 ({pct:.1f}%)")
+        reason_counts = agg.counts('continuing', 'year_plan_reason')
+        if len(reason_counts) > 0:
+            print("\n  【1年契約を選んだ決め手】")
+            print_counts(reason_counts, n_continuing, unit='回', indent='    ')
         
         # 属性別の継続者特徴
         print("\n  【継続者の属性特徴】")
-        print(f"    年代: {continuing['年代をお選びください。'].value_counts().to_dict()}")
-        print(f"    性別: {continuing['性別をお選びください。'].value_counts().to_dict()}")
-        print(f"    登山頻度: {continuing['直近1年以内に、どのくらいの頻度で登山・ハイキングをしていますか？'].value_counts().to_dict()}")
+        print(f"    年代: {_count_dict(agg.counts('continuing', 'age'))}")
+        print(f"    性別: {_count_dict(agg.counts('continuing', 'gender'))}")
+        print(f"    登山頻度: {_count_dict(agg.counts('continuing', 'frequency'))}")
     
     # 非継続理由を分析
-    if len(discontinued) > 0:
+    if n_discontinued > 0:
         print(f"\n【非継続（解約）した人】")
-        print(f"  非継続者数: {len(discontinued)}人")
+        print(f"  非継続者数: {n_discontinued:.0f}人")
         
-        cancel_reason_col = '解約した理由を上位3つまで選んで教えてください。'
-        if cancel_reason_col in df.columns:
-            all_reasons = []
-            for reasons_str in discontinued[cancel_reason_col].dropna():
-                all_reasons.extend(split_multiple_choice(reasons_str))
-            if all_reasons:
-                reason_counts = pd.Series(all_reasons).value_counts()
-                print("\n  【解約理由】")
-                for reason, count in reason_counts.items():
-                    pct = count / len(discontinued) * 100
-                    print(f"    {reason}: {count}回 ({pct:.1f}%)")
+        reason_counts = agg.counts('discontinued', 'cancel_reason')
+        if len(reason_counts) > 0:
+            print("\n  【解約理由】")
+            print_counts(reason_counts, n_discontinued, unit='回', indent='    ')
         
         # 解約理由の詳細
-        detail_col = '上記で選んだ選択肢について、より具体的に教えてください。'
-        if detail_col in df.columns:
-            details = discontinued[detail_col].dropna()
-            if len(details) > 0:
-                print(f"\n  【解約理由の詳細（例）】")
-                for idx, detail in details.head(5).items():
-                    if detail and len(str(detail)) > 10:
-                        print(f"    - {str(detail)[:100]}...")
+        details = agg.examples.get(('discontinued', 'cancel_detail'), [])
+        if len(details) > 0:
+            print(f"\n  【解約理由の詳細（例）】")
+            for detail in details:
+                if detail and len(str(detail)) > 10:
+                    print(f"    - {str(detail)[:100]}...")
         
         # 属性別の非継続者特徴
         print("\n  【非継続者の属性特徴】")
-        print(f"    年代: {discontinued['年代をお選びください。'].value_counts().to_dict()}")
-        print(f"    性別: {discontinued['性別をお選びください。'].value_counts().to_dict()}")
-        print(f"    登山頻度: {discontinued['直近1年以内に、どのくらいの頻度で登山・ハイキングをしていますか？'].value_counts().to_dict()}")
-    
-    return continuing, discontinued
+        print(f"    年代: {_count_dict(agg.counts('discontinued', 'age'))}")
+        print(f"    性別: {_count_dict(agg.counts('discontinued', 'gender'))}")
+        print(f"    登山頻度: {_count_dict(agg.counts('discontinued', 'frequency'))}")
+
+def _unit_columns(unit):
+    """並列実行の単位ごとに列ストアから読み込む列（加入状況のセグメントに使う列は全単位で読む）"""
+    kind, attr_name = unit
+    if kind == 'attribute':
+        keys = [KEYS_BY_HEADER[ATTRIBUTES[attr_name]]] + [KEYS_BY_HEADER[col] for col, _ in ALL_QUESTIONS.values()]
+    else:
+        keys = UNIT_KEYS[kind]
+    return [COLUMNS[key] for key in SEGMENT_KEYS + keys]
+
+def _run_unit(store, unit):
+    """1単位分の列だけで集計し、表示する内容を文字列で返す（ワーカープロセスで実行）"""
+    columns = _unit_columns(unit)
+    agg = aggregate_frame(store.frame(columns), store.indicators(columns))
+    out = io.StringIO()
+    with redirect_stdout(out):
+        kind, _ = unit
+        if kind == 'attribute':
+            print_attribute_blocks(agg, agg.crosstab())
+        elif kind == 'upsell':
+            analyze_upsell_experience(agg)
+        else:
+            analyze_continuation(agg)
+    return out.getvalue(), agg
+
+@traced()
+def run_analyses_parallel(workers=0):
+    """①〜③を列ストアからプロセスプールで実行する（戻り値: 全単位をまとめた集計値。①〜③で使わない設問は含まない）
+
+    ワーカーには列ストアのパスだけを渡し、各ワーカーが必要な列だけをメモリマップで読む
+    （DataFrameはpickleしない）。表示と集計値は単位の定義順にまとめるため、逐次実行と同じになる。
+    """
+    print("データを読み込んでいます...")
+    store = open_store(CSV_PATH)
+    n_workers = min(len(UNITS), workers or os.cpu_count() or 1)
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(_run_unit, [store] * len(UNITS), UNITS))
+    else:
+        results = [_run_unit(store, unit) for unit in UNITS]
 
-def create_summary_report(df, switched, continuing, discontinued):
+    agg = SurveyAggregates()
+    for _, part in results:
+        agg.combine(part)
+    agg.n_columns = len(store.columns)
+    # タイムスタンプの範囲は語彙（出現した値の一覧）から求める
+    agg.timestamp_min, agg.timestamp_max = timestamp_range(store.vocab(COLUMNS['timestamp']))
+    print(f"データ読み込み完了: {agg.n_rows}件の回答")
+
+    print("\n" + "="*100)
+    print("① 属性ごとの加入動機、価値（便益・独自性）、加入タイミング、経路の分析")
+    print("="*100)
+    for text, _ in results:
+        print(text, end='')
+    return agg
+
+@traced()
+def create_summary_report(agg, crosstab=None):
     """サマリーレポートを作成"""
     print("\n" + "="*100)
     print("サマリーレポートの作成")
@@ -293,114 +300,134 @@ def create_summary_report(df, switched, continuing, discontinued):
     
     # Excel形式でレポートを作成
     output_path = Path("yamap_analysis_report.xlsx")
+    n_rows = agg.n_rows
+    
+    # 基本統計
+    summary_data = {
+        '項目': ['総回答数', '年契約継続者', '年契約非継続者', 'アップセル経験者'],
+        '人数': [
+            n_rows,
+            agg.size('continuing'),
+            agg.size('discontinued'),
+            agg.size('switched')
+        ],
+        '割合': [
+            100.0,
+            agg.size('continuing')/n_rows*100 if n_rows > 0 else 0,
+            agg.size('discontinued')/n_rows*100 if n_rows > 0 else 0,
+            agg.size('switched')/n_rows*100 if n_rows > 0 else 0
+        ]
+    }
+    sheets = [('サマリー', frame_rows(pd.DataFrame(summary_data), count_columns=['人数']))]
     
-    with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-        # 基本統計
-        summary_data = {
-            '項目': ['総回答数', '年契約継続者', '年契約非継続者', 'アップセル経験者'],
-            '人数': [
-                len(df),
-                len(continuing),
-                len(discontinued),
-                len(switched)
-            ],
-            '割合': [
-                100.0,
-                len(continuing)/len(df)*100 if len(df) > 0 else 0,
-                len(discontinued)/len(df)*100 if len(df) > 0 else 0,
-                len(switched)/len(df)*100 if len(df) > 0 else 0
-            ]
-        }
-        pd.DataFrame(summary_data).to_excel(writer, sheet_name='サマリー', index=False)
-        
-        # 属性別集計
-        attr_summary = df.groupby('年代をお選びください。').agg({
-            'ユーザーID': 'count'
-        }).reset_index()
-        attr_summary.columns = ['年代', '回答者数']
-        attr_summary.to_excel(writer, sheet_name='属性別集計', index=False)
+    # 属性別集計
+    age_counts = agg.counts('all', 'age', order='domain')
+    attr_summary = pd.DataFrame({'年代': age_counts.index, '回答者数': age_counts.values})
+    sheets.append(('属性別集計', frame_rows(attr_summary, count_columns=['回答者数'])))
+    
+    # 属性×設問のクロス集計（縦持ちの全件と、属性×設問ごとの件数・割合のシート）
+    if crosstab is not None:
+        sheets.append(('属性別クロス集計', frame_rows(crosstab, percent_columns=['割合'], count_columns=['件数', '母数'])))
+        sheets.extend(crosstab_sheets(crosstab, agg.segment_table()))
+    
+    # 書き込み専用モードで1シートずつ書き出す（メモリ使用量はシートの大きさによらない）
+    write_workbook(output_path, sheets)
     
     print(f"✓ レポートを保存: {output_path}")
 
-def create_visualizations(df, switched, continuing, discontinued):
-    """可視化を作成"""
-    print("\n" + "="*100)
-    print("グラフを作成しています...")
-    print("="*100)
-    
-    fig_dir = Path("visualizations")
-    fig_dir.mkdir(exist_ok=True)
+def chart_specs(agg):
+    """作成するグラフの (表示名, チャート定義) のリスト"""
+    charts = []
     
     # 1. 加入タイミングの分布
-    timing_col = 'ヤマップグループの「外あそびレジャー保険」「山歩保険」にご加入されたタイミングについて教えてください。'
-    if timing_col in df.columns:
-        plt.figure(figsize=(12, 6))
-        timing_counts = df[timing_col].value_counts()
-        timing_counts.plot(kind='barh', color='skyblue', edgecolor='black')
-        plt.title('加入タイミングの分布', fontsize=14, fontweight='bold')
-        plt.xlabel('回答者数', fontsize=12)
-        plt.tight_layout()
-        plt.savefig(fig_dir / 'joining_timing.png', dpi=300, bbox_inches='tight')
-        print(f"✓ 加入タイミング分布: {fig_dir / 'joining_timing.png'}")
-        plt.close()
+    if agg.has('join_timing'):
+        charts.append(('加入タイミング分布', chart(
+            'joining_timing.png', 'barh', agg.counts('all', 'join_timing'),
+            '加入タイミングの分布', (12, 6), 'skyblue', xlabel='回答者数')))
     
     # 2. 認知経路の分布
-    channel_col = 'YAMAPアウトドア保険を知ったきっかけをすべてお選びください。（複数選択可）[MA]'
-    if channel_col in df.columns:
-        plt.figure(figsize=(12, 8))
-        all_channels = []
-        for channels_str in df[channel_col].dropna():
-            all_channels.extend(split_multiple_choice(channels_str))
-        channel_counts = pd.Series(all_channels).value_counts()
-        channel_counts.plot(kind='barh', color='lightgreen', edgecolor='black')
-        plt.title('認知経路の分布', fontsize=14, fontweight='bold')
-        plt.xlabel('回答数', fontsize=12)
-        plt.tight_layout()
-        plt.savefig(fig_dir / 'channel_distribution.png', dpi=300, bbox_inches='tight')
-        print(f"✓ 認知経路分布: {fig_dir / 'channel_distribution.png'}")
-        plt.close()
+    if agg.has('channel'):
+        charts.append(('認知経路分布', chart(
+            'channel_distribution.png', 'barh', agg.counts('all', 'channel'),
+            '認知経路の分布', (12, 8), 'lightgreen', xlabel='回答数')))
     
     # 3. 継続 vs 非継続の比較
-    if len(continuing) > 0 and len(discontinued) > 0:
-        plt.figure(figsize=(10, 6))
-        status_data = pd.DataFrame({
-            '継続': [len(continuing)],
-            '非継続': [len(discontinued)]
-        })
-        status_data.T.plot(kind='bar', color=['green', 'red'], edgecolor='black')
-        plt.title('1年契約の継続 vs 非継続', fontsize=14, fontweight='bold')
-        plt.ylabel('人数', fontsize=12)
-        plt.xticks(rotation=0)
-        plt.legend().remove()
-        plt.tight_layout()
-        plt.savefig(fig_dir / 'continuation_status.png', dpi=300, bbox_inches='tight')
-        print(f"✓ 継続状況: {fig_dir / 'continuation_status.png'}")
-        plt.close()
+    n_continuing = agg.size('continuing')
+    n_discontinued = agg.size('discontinued')
+    if n_continuing > 0 and n_discontinued > 0:
+        status_counts = pd.Series({'継続': n_continuing, '非継続': n_discontinued})
+        charts.append(('継続状況', chart(
+            'continuation_status.png', 'bar', status_counts,
+            '1年契約の継続 vs 非継続', (10, 6), ['green', 'red'], ylabel='人数',
+            xticks_rotation=0)))
+    
+    return charts
+
+@traced()
+def create_visualizations(agg):
+    """可視化を作成（前回から変化のないグラフは描き直さない）"""
+    print("\n" + "="*100)
+    print("グラフを作成しています...")
+    print("="*100)
+    
+    draw_charts(chart_specs(agg))
 
 def main():
     """メイン処理"""
+    parser = argparse.ArgumentParser(description="YAMAPアウトドア保険 加入者アンケート分析（リサーチクエスチョン）")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="CSVを指定行数ずつ読み込んで集計する（大きなエクスポート向け）")
+    parser.add_argument('--incremental', action='store_true',
+                        help="前回の集計結果に追記された回答だけを足し込む")
+    parser.add_argument('--full', action='store_true',
+                        help="--incrementalの保存済み集計を使わず全件を集計し直す")
+    parser.add_argument('--no-charts', action='store_true',
+                        help="グラフを作成しない（matplotlib / seabornを読み込まない）")
+    parser.add_argument('--no-excel', action='store_true',
+                        help="Excelレポートを作成しない（openpyxlを読み込まない）")
+    parser.add_argument('--weights', type=Path, default=None, metavar='MARGINS_CSV',
+                        help="年代・性別・地域の構成比のCSVにレイキングしたウェイト付きで集計する")
+    parser.add_argument('--workers', type=int, nargs='?', const=0, default=None, metavar='N',
+                        help="属性ごとの分析・アップセル・継続の分析をN個のプロセスで並列に実行する（Nの省略時はCPU数）")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    if args.full and not args.incremental:
+        parser.error("--fullは--incrementalと同時に指定してください")
+    if args.workers is not None and (args.chunksize or args.incremental):
+        parser.error("--workersは--chunksize・--incrementalと同時に指定できません")
+    if args.weights and (args.chunksize or args.incremental or args.workers is not None):
+        parser.error("--weightsは--chunksize・--incremental・--workersと同時に指定できません（ウェイトは全件から求める）")
+    enable_trace(args)
+    
     print("="*100)
     print("YAMAPアウトドア保険 加入者アンケート分析")
     print("リサーチクエスチョンに基づく詳細分析")
     print("="*100)
     
-    # データ読み込み
-    df = load_data()
-    
-    # ①属性ごとの加入動機、価値、加入タイミング、経路の分析
-    analyze_by_attribute(df)
-    
-    # ②アップセル経験者のインサイト
-    switched = analyze_upsell_experience(df)
-    
-    # ③継続・非継続理由
-    continuing, discontinued = analyze_continuation(df)
+    if args.workers is not None:
+        # ①〜③を単位ごとに並列に集計・表示する（表示の順序と数字は逐次実行と同じ）
+        agg = run_analyses_parallel(args.workers)
+        crosstab = agg.crosstab()
+    else:
+        # データ読み込み・集計
+        agg = load_data(args.chunksize, args.incremental, args.full, args.weights)
+        
+        # ①属性ごとの加入動機、価値、加入タイミング、経路の分析
+        crosstab = analyze_by_attribute(agg)
+        
+        # ②アップセル経験者のインサイト
+        analyze_upsell_experience(agg)
+        
+        # ③継続・非継続理由
+        analyze_continuation(agg)
     
     # サマリーレポート作成
-    create_summary_report(df, switched, continuing, discontinued)
+    if not args.no_excel:
+        create_summary_report(agg, crosstab)
     
     # 可視化
-    create_visualizations(df, switched, continuing, discontinued)
+    if not args.no_charts:
+        create_visualizations(agg)
     
     print("\n" + "="*100)
     print("分析が完了しました！")
@@ -408,4 +435,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
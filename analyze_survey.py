@@ -6,55 +6,73 @@ YAMAPアウトドア保険 加入者アンケート分析スクリプト
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
 import warnings
-warnings.filterwarnings('ignore')
+import argparse
+
+from survey_aggregates import DEFAULT_CHUNKSIZE, aggregate_frame, stream_aggregates
+from survey_charts import chart, draw_charts
+from survey_incremental import update_aggregates
+from survey_indicators import build_indicators
+from survey_loader import CSV_PATH, load_survey
+from survey_weights import print_raking, rake_frame, read_margins
+from survey_trace import add_arguments as add_trace_arguments, enable_from_args as enable_trace, traced
 
-# 日本語フォントの設定
-plt.rcParams['font.family'] = 'DejaVu Sans'
-sns.set_style("whitegrid")
-sns.set_palette("husl")
+warnings.filterwarnings('ignore')
 
-# CSVファイルのパス
-CSV_PATH = Path.home() / "Downloads" / "20251031_YAMAPアウトドア保険 加入者アンケート（回答） - フォームの回答 1.csv"
+@traced()
+def load_data(chunksize=None, incremental=False, full=False, margins_path=None):
+    """データを読み込んで集計する（chunksizeを指定するとチャンクごとに読み込む）
 
-def load_data():
-    """データを読み込む"""
+    incremental=Trueの場合は前回の集計に追記分だけを足し込む（full=Trueで全件を集計し直す）。
+    margins_pathを指定すると、構成比のCSVにレイキングしたウェイト付きの件数で集計する。
+    """
     print("データを読み込んでいます...")
-    df = pd.read_csv(CSV_PATH, encoding='utf-8')
-    print(f"データ読み込み完了: {len(df)}件の回答")
-    print(f"列数: {len(df.columns)}")
-    return df
+    if incremental:
+        agg, n_new = update_aggregates(CSV_PATH, chunksize or DEFAULT_CHUNKSIZE, full=full)
+        print(f"差分更新: 新しい回答 {n_new}件を集計")
+    elif chunksize:
+        agg = stream_aggregates(CSV_PATH, chunksize)
+    else:
+        df = load_survey(CSV_PATH)
+        weights = None
+        if margins_path:
+            raking = rake_frame(df, read_margins(margins_path))
+            print_raking(raking)
+            weights = raking.weights
+        agg = aggregate_frame(df, build_indicators(df), weights=weights)
+    print(f"データ読み込み完了: {agg.n_rows}件の回答")
+    print(f"列数: {agg.n_columns}")
+    return agg
 
-def basic_statistics(df):
+def print_counts(counts, total, unit='人'):
+    """件数と割合を1行ずつ表示"""
+    for value, count in counts.items():
+        print(f"  {value}: {count:.0f}{unit} ({count/total*100:.1f}%)")
+
+@traced()
+def basic_statistics(agg):
     """基本統計情報を表示"""
     print("\n" + "="*80)
     print("基本統計情報")
     print("="*80)
-    print(f"総回答数: {len(df)}")
-    print(f"回答期間: {df['タイムスタンプ'].min()} ～ {df['タイムスタンプ'].max()}")
+    print(f"総回答数: {agg.n_rows}")
+    print(f"回答期間: {agg.timestamp_min} ～ {agg.timestamp_max}")
     
     # 年代別の分布
     print("\n【年代別の分布】")
-    age_counts = df['年代をお選びください。'].value_counts().sort_index()
-    for age, count in age_counts.items():
-        print(f"  {age}: {count}人 ({count/len(df)*100:.1f}%)")
+    print_counts(agg.counts('all', 'age', order='domain'), agg.n_rows)
     
     # 性別の分布
     print("\n【性別の分布】")
-    gender_counts = df['性別をお選びください。'].value_counts()
-    for gender, count in gender_counts.items():
-        print(f"  {gender}: {count}人 ({count/len(df)*100:.1f}%)")
+    print_counts(agg.counts('all', 'gender'), agg.n_rows)
     
     # 地域別の分布
     print("\n【地域別の分布（上位10）】")
-    region_counts = df['お住まいの地域をお選びください。'].value_counts().head(10)
-    for region, count in region_counts.items():
-        print(f"  {region}: {count}人 ({count/len(df)*100:.1f}%)")
+    print_counts(agg.counts('all', 'region').head(10), agg.n_rows)
 
-def insurance_analysis(df):
+@traced()
+def insurance_analysis(agg):
     """保険関連の分析"""
     print("\n" + "="*80)
     print("保険関連の分析")
@@ -62,29 +80,21 @@ def insurance_analysis(df):
     
     # 加入タイミング
     print("\n【加入タイミング】")
-    timing_col = 'ヤマップグループの「外あそびレジャー保険」「山歩保険」にご加入されたタイミングについて教えてください。'
-    if timing_col in df.columns:
-        timing_counts = df[timing_col].value_counts()
-        for timing, count in timing_counts.items():
-            print(f"  {timing}: {count}人 ({count/len(df)*100:.1f}%)")
+    if agg.has('join_timing'):
+        print_counts(agg.counts('all', 'join_timing'), agg.n_rows)
     
     # 初めての加入かどうか
     print("\n【初めての登山保険加入かどうか】")
-    first_col = '登山保険への加入は今回が初めてですか？'
-    if first_col in df.columns:
-        first_counts = df[first_col].value_counts()
-        for val, count in first_counts.items():
-            print(f"  {val}: {count}人 ({count/len(df)*100:.1f}%)")
+    if agg.has('first_insurance'):
+        print_counts(agg.counts('all', 'first_insurance'), agg.n_rows)
     
     # 現在の加入状況
     print("\n【現在の加入状況】")
-    status_col = '以下から、現在のご加入状況について1つお選びください。'
-    if status_col in df.columns:
-        status_counts = df[status_col].value_counts()
-        for status, count in status_counts.items():
-            print(f"  {status}: {count}人 ({count/len(df)*100:.1f}%)")
+    if agg.has('status'):
+        print_counts(agg.counts('all', 'status'), agg.n_rows)
 
-def satisfaction_analysis(df):
+@traced()
+def satisfaction_analysis(agg):
     """満足度・推奨度の分析"""
     print("\n" + "="*80)
     print("満足度・推奨度の分析")
@@ -92,21 +102,16 @@ def satisfaction_analysis(df):
     
     # 加入手続きの簡単さ
     print("\n【加入手続きの簡単さ】")
-    easy_col = 'YAMAPアウトドア保険への加入手続きは簡単でしたか？'
-    if easy_col in df.columns:
-        easy_counts = df[easy_col].value_counts().sort_index()
-        for val, count in easy_counts.items():
-            print(f"  {val}: {count}人 ({count/len(df)*100:.1f}%)")
+    if agg.has('ease'):
+        print_counts(agg.counts('all', 'ease', order='domain'), agg.n_rows)
     
     # 推奨意向
     print("\n【家族・友人への推奨意向】")
-    recommend_col = '加入中のYAMAPアウトドア保険を家族や友人、山仲間に勧めたいですか？'
-    if recommend_col in df.columns:
-        recommend_counts = df[recommend_col].value_counts()
-        for val, count in recommend_counts.items():
-            print(f"  {val}: {count}人 ({count/len(df)*100:.1f}%)")
+    if agg.has('recommend'):
+        print_counts(agg.counts('all', 'recommend'), agg.n_rows)
 
-def hiking_experience_analysis(df):
+@traced()
+def hiking_experience_analysis(agg):
     """登山経験に関する分析"""
     print("\n" + "="*80)
     print("登山経験に関する分析")
@@ -114,126 +119,118 @@ def hiking_experience_analysis(df):
     
     # 登山頻度
     print("\n【登山頻度】")
-    freq_col = '直近1年以内に、どのくらいの頻度で登山・ハイキングをしていますか？'
-    if freq_col in df.columns:
-        freq_counts = df[freq_col].value_counts()
-        for val, count in freq_counts.items():
-            print(f"  {val}: {count}人 ({count/len(df)*100:.1f}%)")
+    if agg.has('frequency'):
+        print_counts(agg.counts('all', 'frequency'), agg.n_rows)
     
     # 登山歴
     print("\n【登山歴】")
-    history_col = 'あなたの登山歴に最も近いものをお選びください。'
-    if history_col in df.columns:
-        history_counts = df[history_col].value_counts()
-        for val, count in history_counts.items():
-            print(f"  {val}: {count}人 ({count/len(df)*100:.1f}%)")
+    if agg.has('history'):
+        print_counts(agg.counts('all', 'history'), agg.n_rows)
 
-def motivation_analysis(df):
+@traced()
+def motivation_analysis(agg):
     """加入動機の分析"""
     print("\n" + "="*80)
     print("加入動機の分析")
     print("="*80)
     
-    # 加入理由
-    reason_col = 'あなたがYAMAPアウトドア保険に加入した理由を教えてください。（当てはまるものに全てチェックをしてください）[MA]'
-    if reason_col in df.columns:
-        # 複数選択の回答を分割してカウント
-        all_reasons = []
-        for reasons_str in df[reason_col].dropna():
-            if isinstance(reasons_str, str):
-                reasons = [r.strip() for r in reasons_str.split(',')]
-                all_reasons.extend(reasons)
-        
-        reason_counts = pd.Series(all_reasons).value_counts()
+    # 加入理由（複数選択の回答は選択肢ごとに数える）
+    if agg.has('join_reason'):
+        reason_counts = agg.counts('all', 'join_reason')
         print("\n【加入理由（複数選択可）】")
-        for reason, count in reason_counts.head(10).items():
-            print(f"  {reason}: {count}回 ({count/len(df)*100:.1f}%)")
+        print_counts(reason_counts.head(10), agg.n_rows, unit='回')
+
+def chart_specs(agg):
+    """作成するグラフの (表示名, チャート定義) のリスト"""
+    return [
+        # 1. 年代別の分布
+        ('年代分布グラフを保存', chart(
+            'age_distribution.png', 'bar', agg.counts('all', 'age', order='domain'),
+            '年代別の回答者分布', (10, 6), 'skyblue', xlabel='年代', ylabel='回答者数',
+            xticks_rotation=45, xticks_ha='right')),
+        # 2. 性別の分布
+        ('性別分布グラフを保存', chart(
+            'gender_distribution.png', 'pie', agg.counts('all', 'gender'),
+            '性別の分布', (8, 6), ['lightblue', 'lightcoral'])),
+        # 3. 地域別の分布（上位10）
+        ('地域分布グラフを保存', chart(
+            'region_distribution.png', 'barh', agg.counts('all', 'region').head(10),
+            '地域別の回答者分布（上位10）', (12, 6), 'lightgreen', xlabel='回答者数', ylabel='地域')),
+    ]
 
-def create_visualizations(df):
-    """可視化を作成"""
+@traced()
+def create_visualizations(agg):
+    """可視化を作成（前回から変化のないグラフは描き直さない）"""
     print("\n" + "="*80)
     print("グラフを作成しています...")
     print("="*80)
     
-    fig_dir = Path("visualizations")
-    fig_dir.mkdir(exist_ok=True)
-    
-    # 1. 年代別の分布
-    plt.figure(figsize=(10, 6))
-    age_counts = df['年代をお選びください。'].value_counts().sort_index()
-    age_counts.plot(kind='bar', color='skyblue', edgecolor='black')
-    plt.title('年代別の回答者分布', fontsize=14, fontweight='bold')
-    plt.xlabel('年代', fontsize=12)
-    plt.ylabel('回答者数', fontsize=12)
-    plt.xticks(rotation=45, ha='right')
-    plt.tight_layout()
-    plt.savefig(fig_dir / 'age_distribution.png', dpi=300, bbox_inches='tight')
-    print(f"✓ 年代分布グラフを保存: {fig_dir / 'age_distribution.png'}")
-    plt.close()
-    
-    # 2. 性別の分布
-    plt.figure(figsize=(8, 6))
-    gender_counts = df['性別をお選びください。'].value_counts()
-    plt.pie(gender_counts.values, labels=gender_counts.index, autopct='%1.1f%%', 
-            startangle=90, colors=['lightblue', 'lightcoral'])
-    plt.title('性別の分布', fontsize=14, fontweight='bold')
-    plt.tight_layout()
-    plt.savefig(fig_dir / 'gender_distribution.png', dpi=300, bbox_inches='tight')
-    print(f"✓ 性別分布グラフを保存: {fig_dir / 'gender_distribution.png'}")
-    plt.close()
-    
-    # 3. 地域別の分布（上位10）
-    plt.figure(figsize=(12, 6))
-    region_counts = df['お住まいの地域をお選びください。'].value_counts().head(10)
-    region_counts.plot(kind='barh', color='lightgreen', edgecolor='black')
-    plt.title('地域別の回答者分布（上位10）', fontsize=14, fontweight='bold')
-    plt.xlabel('回答者数', fontsize=12)
-    plt.ylabel('地域', fontsize=12)
-    plt.tight_layout()
-    plt.savefig(fig_dir / 'region_distribution.png', dpi=300, bbox_inches='tight')
-    print(f"✓ 地域分布グラフを保存: {fig_dir / 'region_distribution.png'}")
-    plt.close()
+    draw_charts(chart_specs(agg))
+
+@traced()
+def save_data_summary(agg, summary_path=Path("data_summary.csv")):
+    """データの概要をCSVで保存"""
+    summary_data = {
+        '項目': ['総回答数', '年代数', '性別数', '地域数'],
+        '値': [
+            agg.n_rows,
+            len(agg.counts('all', 'age')),
+            len(agg.counts('all', 'gender')),
+            len(agg.counts('all', 'region'))
+        ]
+    }
+    pd.DataFrame(summary_data).to_csv(summary_path, index=False, encoding='utf-8-sig')
+    print(f"\n✓ サマリーデータを保存: {summary_path}")
 
 def main():
     """メイン処理"""
+    parser = argparse.ArgumentParser(description="YAMAPアウトドア保険 加入者アンケート分析")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="CSVを指定行数ずつ読み込んで集計する（大きなエクスポート向け）")
+    parser.add_argument('--incremental', action='store_true',
+                        help="前回の集計結果に追記された回答だけを足し込む")
+    parser.add_argument('--full', action='store_true',
+                        help="--incrementalの保存済み集計を使わず全件を集計し直す")
+    parser.add_argument('--no-charts', action='store_true',
+                        help="グラフを作成しない（matplotlib / seabornを読み込まない）")
+    parser.add_argument('--weights', type=Path, default=None, metavar='MARGINS_CSV',
+                        help="年代・性別・地域の構成比のCSVにレイキングしたウェイト付きで集計する")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    if args.full and not args.incremental:
+        parser.error("--fullは--incrementalと同時に指定してください")
+    if args.weights and (args.chunksize or args.incremental):
+        parser.error("--weightsは--chunksize・--incrementalと同時に指定できません（ウェイトは全件から求める）")
+    enable_trace(args)
+    
     print("="*80)
     print("YAMAPアウトドア保険 加入者アンケート分析")
     print("="*80)
     
-    # データ読み込み
-    df = load_data()
+    # データ読み込み・集計
+    agg = load_data(args.chunksize, args.incremental, args.full, args.weights)
     
     # 基本統計
-    basic_statistics(df)
+    basic_statistics(agg)
     
     # 保険関連の分析
-    insurance_analysis(df)
+    insurance_analysis(agg)
     
     # 満足度分析
-    satisfaction_analysis(df)
+    satisfaction_analysis(agg)
     
     # 登山経験分析
-    hiking_experience_analysis(df)
+    hiking_experience_analysis(agg)
     
     # 加入動機分析
-    motivation_analysis(df)
+    motivation_analysis(agg)
     
     # 可視化
-    create_visualizations(df)
+    if not args.no_charts:
+        create_visualizations(agg)
     
     # データの概要をCSVで保存
-    summary_path = Path("data_summary.csv")
-    summary_data = {
-        '項目': ['総回答数', '年代数', '性別数', '地域数'],
-        '値': [
-            len(df),
-            df['年代をお選びください。'].nunique(),
-            df['性別をお選びください。'].nunique(),
-            df['お住まいの地域をお選びください。'].nunique()
-        ]
-    }
-    pd.DataFrame(summary_data).to_csv(summary_path, index=False, encoding='utf-8-sig')
-    print(f"\n✓ サマリーデータを保存: {summary_path}")
+    save_data_summary(agg)
     
     print("\n" + "="*80)
     print("分析が完了しました！")
@@ -241,5 +238,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
-
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析処理のベンチマーク
+合成データ（survey_synthetic.py）を件数別に作成し、読み込み・集計・各分析関数・インサイト作成の
+処理時間とメモリ使用量（tracemallocのピーク）を計測してJSONに保存する
+--compare に過去の結果を渡すと、処理時間が閾値以上に増えた処理を表示して終了コード1で終了する
+"""
+
+import argparse
+import io
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import analyze_research_questions as research
+from create_marketing_insights import build_insights, write_reports
+from survey_aggregates import aggregate_frame
+from survey_indicators import build_indicators
+from survey_loader import load_survey
+from survey_synthetic import write_survey_csv
+
+# 件数の名前 → 件数
+SIZES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+DEFAULT_SIZES = ['1k', '100k']
+
+# 合成データと読み込みキャッシュの保存先
+DATA_DIR = Path(".cache") / "benchmark"
+RESULTS_DIR = Path("benchmark_results")
+
+# 処理時間（中央値）がこの割合以上増えたら劣化とみなす
+REGRESSION_THRESHOLD = 0.2
+
+# これより短い処理は計測誤差が大きいため、劣化の判定から外す（秒）
+MIN_SECONDS = 0.01
+
+def _quiet(func, *args):
+    """コンソール出力を捨てて実行する"""
+    with redirect_stdout(io.StringIO()):
+        return func(*args)
+
+def measure(func, *args, repeat=3):
+    """処理時間（repeat回）とメモリ使用量のピークを計測する（戻り値: 計測結果, 最後の戻り値）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = _quiet(func, *args)
+        timings.append(time.perf_counter() - start)
+
+    # メモリは時間の計測とは別に1回だけ（tracemallocを有効にすると遅くなるため）
+    tracemalloc.start()
+    try:
+        _quiet(func, *args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds': timings,
+        'median': statistics.median(timings),
+        'min': min(timings),
+        'peak_bytes': peak,
+    }, result
+
+def synthetic_csv(n_rows, seed=0, data_dir=DATA_DIR):
+    """件数・シードごとの合成データ（作成済みなら再利用する）"""
+    path = Path(data_dir) / f"synthetic_{n_rows}_{seed}.csv"
+    if not path.exists():
+        print(f"合成データを作成しています: {path}")
+        write_survey_csv(path, n_rows, seed)
+    return path
+
+def _write_insights(df, out_root):
+    """インサイトを作成して書き出す（毎回新しいフォルダに、描画結果のキャッシュを使わずに）"""
+    insights = build_insights(df)
+    out_dir = Path(tempfile.mkdtemp(dir=out_root))
+    write_reports(insights, {'json': out_dir / "marketing_insights_report.json",
+                             'markdown': out_dir / "marketing_insights_report.md"}, cache=False)
+    return insights
+
+def run_size(n_rows, repeat=3, seed=0):
+    """1つの件数について全ての処理を計測する"""
+    csv_path = synthetic_csv(n_rows, seed)
+    cache_dir = DATA_DIR / "cache"
+    results = {}
+
+    results['load_survey'], df = measure(lambda: load_survey(csv_path, use_cache=False), repeat=repeat)
+    load_survey(csv_path, cache_dir=cache_dir)
+    results['load_survey_cached'], _ = measure(lambda: load_survey(csv_path, cache_dir=cache_dir), repeat=repeat)
+    results['build_indicators'], indicators = measure(build_indicators, df, repeat=repeat)
+    results['aggregate_frame'], agg = measure(aggregate_frame, df, indicators, repeat=repeat)
+    results['analyze_by_attribute'], _ = measure(research.analyze_by_attribute, agg, repeat=repeat)
+    results['analyze_upsell_experience'], _ = measure(research.analyze_upsell_experience, agg, repeat=repeat)
+    results['analyze_continuation'], _ = measure(research.analyze_continuation, agg, repeat=repeat)
+    with tempfile.TemporaryDirectory() as out_dir:
+        results['create_marketing_insights'], _ = measure(_write_insights, df, Path(out_dir), repeat=repeat)
+    return results
+
+def _git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'git_commit': _git_commit(),
+    }
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """過去の結果と処理時間（中央値）を比べ、劣化した (件数, 処理, 比率) のリストを返す"""
+    regressions = []
+    for size, cases in results['results'].items():
+        for name, current in cases.items():
+            if not isinstance(current, dict):
+                continue
+            previous = baseline.get('results', {}).get(size, {}).get(name)
+            if not isinstance(previous, dict) or previous['median'] <= 0:
+                continue
+            ratio = current['median'] / previous['median']
+            regressed = ratio > 1 + threshold and current['median'] >= MIN_SECONDS
+            mark = '⚠' if regressed else ' '
+            print(f"  {mark} {size:>5} {name:<28} {previous['median']*1000:9.1f}ms → "
+                  f"{current['median']*1000:9.1f}ms (×{ratio:.2f})")
+            if regressed:
+                regressions.append((size, name, ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="分析処理のベンチマーク（合成データ）")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=DEFAULT_SIZES,
+                        help="計測する件数")
+    parser.add_argument('--repeat', type=int, default=3, help="処理ごとの計測回数")
+    parser.add_argument('--seed', type=int, default=0, help="合成データの乱数シード")
+    parser.add_argument('--output', type=Path, default=None,
+                        help="結果の保存先（省略時は benchmark_results/<日時>.json）")
+    parser.add_argument('--compare', type=Path, default=None, help="比較する過去の結果（JSON）")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="劣化とみなす処理時間の増加率")
+    args = parser.parse_args()
+
+    print("="*80)
+    print("分析処理のベンチマーク")
+    print("="*80)
+
+    started = datetime.now()
+    results = {'created': started.isoformat(timespec='seconds'), 'environment': environment(),
+               'repeat': args.repeat, 'seed': args.seed, 'results': {}}
+    for size in args.sizes:
+        print(f"\n【{size}（{SIZES[size]:,}件）】")
+        cases = run_size(SIZES[size], args.repeat, args.seed)
+        results['results'][size] = {'rows': SIZES[size], **cases}
+        for name, result in cases.items():
+            print(f"  {name:<28} 中央値 {result['median']*1000:9.1f}ms  "
+                  f"メモリ(ピーク) {result['peak_bytes']/1024/1024:8.1f}MB")
+
+    output = args.output or RESULTS_DIR / f"{started:%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n✓ 結果を保存: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n【{args.compare} との比較】")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n処理時間が{args.threshold*100:.0f}%以上増えた処理: {len(regressions)}件")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+起動時間のベンチマーク
+分析スクリプトのimportにかかる時間を別プロセスで計測し、目標時間を超えた場合や
+グラフ・Excel用のライブラリが読み込まれていた場合に終了コード1で終了する
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# 計測するスクリプト（モジュール名）
+SCRIPTS = ['analyze_survey', 'analyze_research_questions', 'create_marketing_insights']
+
+# import時に読み込まれてはいけないライブラリ（グラフ・Excelの作成時にのみ使う）
+HEAVY_MODULES = ['matplotlib', 'seaborn', 'openpyxl']
+
+# importにかかる時間の目標（秒、中央値）
+STARTUP_TARGET_SECONDS = 1.0
+
+# 子プロセスで実行するコード: importの所要時間と読み込まれた重いライブラリを出力する
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+print(json.dumps({{'seconds': elapsed, 'heavy': heavy}}))
+"""
+
+def measure(module, repeat=5):
+    """スクリプトのimportをrepeat回計測し、所要時間（秒）のリストと読み込まれた重いライブラリを返す"""
+    timings = []
+    heavy = set()
+    for _ in range(repeat):
+        code = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        probe = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(probe['seconds'])
+        heavy.update(probe['heavy'])
+    return timings, sorted(heavy)
+
+def main():
+    parser = argparse.ArgumentParser(description="分析スクリプトの起動時間のベンチマーク")
+    parser.add_argument('--repeat', type=int, default=5, help="スクリプトごとの計測回数")
+    parser.add_argument('--target', type=float, default=STARTUP_TARGET_SECONDS,
+                        help="importにかかる時間の目標（秒、中央値）")
+    args = parser.parse_args()
+
+    print("="*80)
+    print("起動時間のベンチマーク")
+    print("="*80)
+    ok = True
+    for module in SCRIPTS:
+        timings, heavy = measure(module, args.repeat)
+        median = statistics.median(timings)
+        passed = median <= args.target and not heavy
+        ok &= passed
+        print(f"{'✓' if passed else '✗'} {module}: 中央値 {median*1000:.0f}ms "
+              f"(最小 {min(timings)*1000:.0f}ms / 最大 {max(timings)*1000:.0f}ms, 目標 {args.target*1000:.0f}ms)")
+        if heavy:
+            print(f"  import時に読み込まれたライブラリ: {', '.join(heavy)}")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
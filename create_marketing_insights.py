@@ -4,22 +4,224 @@
 マーケティング施策に活用するためのインサイトレポート作成
 """
 
-import pandas as pd
+import argparse
 from pathlib import Path
-import json
 
-CSV_PATH = Path.home() / "Downloads" / "20251031_YAMAPアウトドア保険 加入者アンケート（回答） - フォームの回答 1.csv"
+import numpy as np
 
-def split_multiple_choice(value):
-    if pd.isna(value):
-        return []
-    if isinstance(value, str):
-        return [v.strip() for v in value.split(',')]
-    return []
+from survey_cooccurrence import cooccurrence
+from survey_crosstab import compute_crosstabs, segment_sizes, top_options
+from survey_indicators import build_indicators, option_counts
+from survey_intervals import DEFAULT_METHOD, METHODS, confidence_key, interval_labels
+from survey_loader import CSV_PATH, load_survey
+from survey_metrics import compile_metrics
+from survey_report import (FORMATS, Block, Distribution, Fields, ItemList, Rate, RateGroups, RenderCache, Report,
+                           Section, Suggestions, Table, render)
+from survey_schema import COLUMNS, value_counts
+from survey_segment_index import SegmentIndex
+from survey_significance import ALPHA, distinctive_cells, significance_table
+from survey_timeseries import timestamp_range
+from survey_trace import add_arguments as add_trace_arguments, enable_from_args as enable_trace, traced
+from survey_waves import load_waves, wave_insights
+from survey_weights import effective_n, kish_design_effect, print_raking, rake_frame, read_margins
 
-def create_marketing_insights():
-    """マーケティング施策に活用するインサイトを作成"""
-    df = pd.read_csv(CSV_PATH, encoding='utf-8')
+JSON_PATH = Path("marketing_insights_report.json")
+MD_PATH = Path("marketing_insights_report.md")
+XLSX_PATH = Path("marketing_insights_report.xlsx")
+
+DEFAULT_FORMATS = ['json', 'markdown']
+FORMAT_LABELS = {'json': 'JSON', 'markdown': 'Markdown', 'xlsx': 'Excel'}
+
+# 信頼区間の項目名（例: 95%信頼区間）
+CI_KEY = confidence_key()
+
+# 割合の項目: (分子, 分母, 割合, 信頼区間の項目名) → 割合の直後に信頼区間を追加する
+RATE_FIELDS = [
+    ('人数', '分母', '割合', CI_KEY),
+    ('回答数', '分母', '割合', CI_KEY),
+    ('分子（短期プランから年契約に切り替えた人）', '分母（年契約加入者全体）', '切り替え率', CI_KEY),
+    ('分子（あまり/全く検討していない人の合計）', '分母（短期プラン加入者総数）', '割合', CI_KEY),
+    ('継続者数（分子）', '合計（分母）', '継続率', CI_KEY),
+    # 特徴的な回答（属性値の回答者とそれ以外）
+    ('件数', '母数', '割合', f"割合（{CI_KEY}）"),
+    ('それ以外の件数', 'それ以外の母数', 'それ以外の割合', f"それ以外の割合（{CI_KEY}）"),
+]
+
+# 分布の項目: (分布, 分母) → 「分布（信頼区間）」を分布の直後に追加する
+DISTRIBUTION_FIELDS = [
+    ('年代別分布', '総回答数'),
+    ('性別分布', '総回答数'),
+    ('地域別分布（上位10）', '総回答数'),
+    ('内訳', '合計'),
+    # 年代別の特徴（その年代の人数に占める割合）
+    ('主要加入理由', '人数'),
+    ('主要認知経路', '人数'),
+    ('主要価値', '人数'),
+]
+
+# 年代別の特徴の表の列
+AGE_COLUMNS = ['年代', '項目', '回答', '件数', '割合', CI_KEY]
+
+# 年代別の詳細分析の指標（分母: 年代、分子: 感じた価値・加入理由）
+AGE_60_PLUS = {'age': ['60代', '70代以上']}
+AGE_30_40 = {'age': ['30代', '40代']}
+FAMILY_RESPONSIBILITY = {'benefit': '「家族への責任」を果たしている'}
+EASY_PROCEDURE = {'join_reason': {'contains': '加入手続きが簡単だったから'}}
+DETAIL_METRICS = {
+    '家族への責任（60代以上）': {'denominator': AGE_60_PLUS, 'numerator': FAMILY_RESPONSIBILITY},
+    '家族への責任（30-40代）': {'denominator': AGE_30_40, 'numerator': FAMILY_RESPONSIBILITY},
+    '手続きの簡単さ（30-40代）': {'denominator': AGE_30_40, 'numerator': EASY_PROCEDURE},
+    '手続きの簡単さ（60代以上）': {'denominator': AGE_60_PLUS, 'numerator': EASY_PROCEDURE},
+}
+DETAIL_PLAN = compile_metrics(DETAIL_METRICS)
+
+# 特徴的な回答として挙げる組み合わせの件数
+N_DISTINCTIVE = 10
+
+SIGNIFICANCE_METHOD = (f"属性値の回答者とそれ以外の回答者の選択率を比較（カイ二乗検定、期待度数5未満はFisherの正確検定）。"
+                       f"全組み合わせをBenjamini-Hochberg法で補正し、補正後p値 < {ALPHA}を有意とする")
+WEIGHTED_SIGNIFICANCE_METHOD = ("ウェイト付きの件数をデザイン効果で割った有効サンプルサイズ上の件数で、属性値の回答者とそれ以外の回答者の"
+                                f"選択率を比較（カイ二乗検定）。全組み合わせをBenjamini-Hochberg法で補正し、補正後p値 < {ALPHA}を有意とする")
+DISTINCTIVE_COLUMNS = ['属性', '属性値', '設問', '選択肢', '件数', '割合', f"割合（{CI_KEY}）",
+                       'それ以外の割合', f"それ以外の割合（{CI_KEY}）", 'リフト', '補正後p値']
+
+def _count(value):
+    """件数を表示用の整数にする（ウェイト付きの件数は丸める）"""
+    return int(round(value))
+
+def _count_dict(counts):
+    """件数のSeriesを表示用の辞書にする"""
+    return {value: _count(count) for value, count in counts.items()}
+
+def _size(mask, weights=None):
+    """ブールマスクの人数（ウェイトがあればウェイトの合計）"""
+    return int(mask.sum()) if weights is None else float(weights[mask].sum())
+
+def significance_insight(tests, k=N_DISTINCTIVE, weighted=False):
+    """一括検定の結果から「属性ごとに特徴的な回答」のインサイトを作る（それ以外より有意に高い回答の上位k件）"""
+    cells = []
+    for row in distinctive_cells(tests, k).itertuples(index=False):
+        cells.append({
+            "属性": row.属性,
+            "属性値": row.属性値,
+            "設問": row.設問,
+            "選択肢": row.選択肢,
+            "件数": _count(row.件数),
+            "母数": _count(row.母数),
+            "それ以外の件数": _count(row.それ以外の件数),
+            "それ以外の母数": _count(row.それ以外の母数),
+            "割合": f"{row.割合:.1f}%",
+            "それ以外の割合": f"{row.それ以外の割合:.1f}%",
+            "リフト": f"{row.リフト:.2f}倍",
+            "補正後p値": f"{row.補正後p値:.3g}",
+        })
+    return {
+        "見出し": "属性ごとに特徴的な回答（有意差の検定）",
+        "検定方法": WEIGHTED_SIGNIFICANCE_METHOD if weighted else SIGNIFICANCE_METHOD,
+        "検定した組み合わせ": int(tests['p値'].notna().sum()),
+        "有意な組み合わせ": int(tests['有意'].sum()),
+        "特徴的な回答": cells,
+    }
+
+# 共起を求める設問と、挙げる組み合わせの件数
+COOCCURRENCE_KEYS = ['join_reason', 'channel', 'year_plan_reason']
+N_COOCCURRENCE = 10
+
+COOCCURRENCE_METHOD = ("2つの設問の両方に回答した人の中で、両方を選んだ割合 / それぞれを選んだ割合の積（リフト）と、"
+                       "両方を選んだ人 / どちらかを選んだ人（Jaccard）。5件以上の組み合わせが対象")
+COOCCURRENCE_COLUMNS = ['設問A', '選択肢A', '設問B', '選択肢B', '件数', 'Jaccard', 'リフト']
+
+def cooccurrence_insight(result, k=N_COOCCURRENCE):
+    """共起の結果から「一緒に選ばれやすい回答」のインサイトを作る（設問間の組み合わせのリフトの上位k件）"""
+    pairs = result.pairs(within=False)
+    pairs = pairs.sort_values(['リフト', '件数'], ascending=[False, False], kind='stable').head(k)
+    cells = []
+    for row in pairs.itertuples(index=False):
+        cells.append({
+            "設問A": row.設問A,
+            "選択肢A": row.選択肢A,
+            "設問B": row.設問B,
+            "選択肢B": row.選択肢B,
+            "件数": _count(row.件数),
+            "Jaccard": f"{row.Jaccard:.3f}",
+            "リフト": f"{row.リフト:.2f}倍",
+        })
+    return {
+        "見出し": "加入理由・認知経路・1年契約の決め手の共起",
+        "算出方法": COOCCURRENCE_METHOD,
+        "共起する回答": cells,
+    }
+
+def _insert_after(d, after, key, value):
+    """辞書のafterの直後にkeyを追加する（JSONの項目の並びを保つため）"""
+    items = list(d.items())
+    d.clear()
+    for k, v in items:
+        d[k] = v
+        if k == after:
+            d[key] = value
+
+def _rate_cells(node):
+    """インサイト内の割合（分子, 分母）を持つ辞書を再帰的に探す（1つの割合に1つの信頼区間）"""
+    if isinstance(node, dict):
+        rates = set()
+        for numerator, denominator, rate, key in RATE_FIELDS:
+            if rate in node and rate not in rates and numerator in node and denominator in node:
+                rates.add(rate)
+                yield node, rate, key, (int(node[numerator]), int(node[denominator]))
+        for value in node.values():
+            yield from _rate_cells(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _rate_cells(value)
+
+def _distribution_cells(node):
+    """インサイト内の分布（{回答: 件数}）と分母を持つ辞書を再帰的に探す"""
+    if isinstance(node, dict):
+        for field, denominator in DISTRIBUTION_FIELDS:
+            if isinstance(node.get(field), dict) and denominator in node:
+                for label, count in node[field].items():
+                    yield node, field, label, (int(count), int(node[denominator]))
+        for value in node.values():
+            yield from _distribution_cells(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _distribution_cells(value)
+
+def attach_intervals(insights, method=DEFAULT_METHOD, design_effect=1.0):
+    """レポートの全ての割合に信頼区間を追加する（全セルをまとめて1回で計算する）
+
+    design_effect: ウェイト付きの件数のデザイン効果（Kish）。件数をこれで割った有効サンプルサイズで区間を求める。
+    """
+    rates = list(_rate_cells(insights))
+    distributions = list(_distribution_cells(insights))
+    labels = interval_labels([cell for *_, cell in rates + distributions], method, design_effect=design_effect)
+
+    for (node, rate, key, _), interval in zip(rates, labels):
+        _insert_after(node, rate, key, interval)
+    grouped = {}
+    for (node, field, label, _), interval in zip(distributions, labels[len(rates):]):
+        grouped.setdefault((id(node), field), (node, field, {}))[2][label] = interval
+    for node, field, intervals in grouped.values():
+        _insert_after(node, field, f"{field}（{CI_KEY}）", intervals)
+    return insights
+
+@traced()
+def build_insights(df, indicators=None, index=None, interval_method=DEFAULT_METHOD, weights=None):
+    """マーケティング施策に活用するインサイトを集計する（セグメント・属性の条件はSegmentIndexで求める）
+
+    全ての割合に信頼区間（interval_method: 'wilson' / 'bootstrap'）を付ける。
+    weights（行ごとのウェイト）を渡すと件数・人数はウェイトの合計になり、信頼区間・検定は
+    有効サンプルサイズ（Kish）で求める（indexを渡す場合は同じウェイトで作成したもの）。
+    """
+    if indicators is None:
+        indicators = build_indicators(df)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+    if index is None:
+        index = SegmentIndex.from_frame(df, indicators, weights)
+    masks = index.segment_masks()
+    design_effect = kish_design_effect(weights)
     
     insights = {
         "基本情報": {
@@ -41,42 +243,49 @@ def create_marketing_insights():
     }
     
     # 基本情報の集計
-    total_responses = len(df)
+    total_responses = len(df) if weights is None else _count(weights.sum())
     
     # デモグラフィック情報
-    age_dist = df['年代をお選びください。'].value_counts().sort_index().to_dict()
-    gender_dist = df['性別をお選びください。'].value_counts().to_dict()
-    region_dist = df['お住まいの地域をお選びください。'].value_counts().head(10).to_dict()
+    age_dist = value_counts(df[COLUMNS['age']], weights).sort_index().to_dict()
+    gender_dist = value_counts(df[COLUMNS['gender']], weights).to_dict()
+    region_dist = value_counts(df[COLUMNS['region']], weights).head(10).to_dict()
     
     # 加入保険の内訳
-    status_col = '以下から、現在のご加入状況について1つお選びください。'
-    insurance_status = df[status_col].value_counts()
+    status_col = COLUMNS['status']
+    insurance_status = value_counts(df[status_col], weights)
     
     # 主要な保険プランに集約
     insurance_summary = {
-        "山歩保険に加入中": int(insurance_status.get('山歩保険に加入し、現在も加入中', 0)),
-        "外あそびレジャー保険1年契約に加入中": int(insurance_status.get('外あそびレジャー保険の1年契約に加入し、現在も加入中', 0)),
-        "外あそびレジャー保険短期契約（現在加入中）": int(insurance_status.get('外あそびレジャー保険の7日契約、もしくは30日契約に現在加入中', 0)),
-        "外あそびレジャー保険短期契約（契約終了）": int(insurance_status.get('外あそびレジャー保険の7日契約、もしくは30日契約に加入し、現在は契約が終了している', 0)),
-        "短期から年契約に移行": int(insurance_status.get('外あそびレジャー保険の7日・30日契約に加入した後に、1年契約に移行した', 0)),
-        "その他・契約終了": int(df[status_col].str.contains('契約が終了している|解約', na=False).sum())
+        "山歩保険に加入中": _count(insurance_status.get('山歩保険に加入し、現在も加入中', 0)),
+        "外あそびレジャー保険1年契約に加入中": _count(insurance_status.get('外あそびレジャー保険の1年契約に加入し、現在も加入中', 0)),
+        "外あそびレジャー保険短期契約（現在加入中）": _count(insurance_status.get('外あそびレジャー保険の7日契約、もしくは30日契約に現在加入中', 0)),
+        "外あそびレジャー保険短期契約（契約終了）": _count(insurance_status.get('外あそびレジャー保険の7日契約、もしくは30日契約に加入し、現在は契約が終了している', 0)),
+        "短期から年契約に移行": _count(insurance_status.get('外あそびレジャー保険の7日・30日契約に加入した後に、1年契約に移行した', 0)),
+        "その他・契約終了": _count(_size(masks['discontinued'], weights))
     }
     
+    period_start, period_end = timestamp_range(df[COLUMNS['timestamp']])
+    overview = {
+        "見出し": "調査概要",
+        "総回答数": total_responses,
+        "回答期間": {
+            "開始": str(period_start),
+            "終了": str(period_end)
+        }
+    }
+    if weights is not None:
+        overview["ウェイト調整"] = {
+            "有効サンプルサイズ": _count(effective_n(weights)),
+            "デザイン効果": f"{design_effect:.2f}",
+        }
     insights["基本情報"]["インサイト"] = [
-        {
-            "見出し": "調査概要",
-            "総回答数": total_responses,
-            "回答期間": {
-                "開始": str(df['タイムスタンプ'].min()),
-                "終了": str(df['タイムスタンプ'].max())
-            }
-        },
+        overview,
         {
             "見出し": "デモグラフィック情報",
             "総回答数": total_responses,  # パーセント計算用に追加
-            "年代別分布": {k: int(v) for k, v in age_dist.items()},
-            "性別分布": {k: int(v) for k, v in gender_dist.items()},
-            "地域別分布（上位10）": {k: int(v) for k, v in region_dist.items()}
+            "年代別分布": _count_dict(age_dist),
+            "性別分布": _count_dict(gender_dist),
+            "地域別分布（上位10）": _count_dict(region_dist)
         },
         {
             "見出し": "加入保険の内訳",
@@ -87,55 +296,27 @@ def create_marketing_insights():
     
     # ①属性別分析の主要インサイト
     # 年代別の特徴
+    age_attribute = {'年代': COLUMNS['age']}
+    age_crosstab = compute_crosstabs(df, indicators, attributes=age_attribute, weights=weights)
+    age_sizes = segment_sizes(df, attributes=age_attribute, weights=weights)
     age_analysis = {}
-    for age in df['年代をお選びください。'].dropna().unique():
-        subset = df[df['年代をお選びください。'] == age]
-        
-        # 加入理由
-        all_reasons = []
-        for reasons_str in subset['あなたがYAMAPアウトドア保険に加入した理由を教えてください。（当てはまるものに全てチェックをしてください）[MA]'].dropna():
-            all_reasons.extend(split_multiple_choice(reasons_str))
-        top_reasons = pd.Series(all_reasons).value_counts().head(3)
-        
-        # 認知経路
-        all_channels = []
-        for channels_str in subset['YAMAPアウトドア保険を知ったきっかけをすべてお選びください。（複数選択可）[MA]'].dropna():
-            all_channels.extend(split_multiple_choice(channels_str))
-        top_channels = pd.Series(all_channels).value_counts().head(2)
-        
-        # 価値
-        benefit = subset['保険加入後、保険から感じるメリットとして、以下のどれを最も実感しますか？'].value_counts().head(1)
-        
+    for age, n in zip(age_sizes['属性値'], age_sizes['母数']):
         age_analysis[age] = {
-            "人数": len(subset),
-            "主要加入理由": top_reasons.to_dict(),
-            "主要認知経路": top_channels.to_dict(),
-            "主要価値": benefit.to_dict() if len(benefit) > 0 else {}
+            "人数": _count(n),
+            "主要加入理由": _count_dict(top_options(age_crosstab, '年代', age, '加入理由', 3)),
+            "主要認知経路": _count_dict(top_options(age_crosstab, '年代', age, '認知経路', 2)),
+            "主要価値": _count_dict(top_options(age_crosstab, '年代', age, '感じた価値・便益', 1))
         }
     
     # 年代別の詳細分析
     detailed_insights = []
     
-    # 「家族への責任」の分析
-    benefit_col = '保険加入後、保険から感じるメリットとして、以下のどれを最も実感しますか？'
-    reason_col = 'あなたがYAMAPアウトドア保険に加入した理由を教えてください。（当てはまるものに全てチェックをしてください）[MA]'
-    
-    family_resp_60plus = len(df[(df['年代をお選びください。'].isin(['60代', '70代以上'])) & 
-                                 (df[benefit_col] == '「家族への責任」を果たしている')])
-    total_60plus = len(df[df['年代をお選びください。'].isin(['60代', '70代以上'])])
-    family_resp_30_40 = len(df[(df['年代をお選びください。'].isin(['30代', '40代'])) & 
-                               (df[benefit_col] == '「家族への責任」を果たしている')])
-    total_30_40 = len(df[df['年代をお選びください。'].isin(['30代', '40代'])])
-    
-    # 「手続きの簡単さ」の分析
-    easy_30_40 = 0
-    for reasons_str in df[(df['年代をお選びください。'].isin(['30代', '40代']))][reason_col].dropna():
-        if '加入手続きが簡単だったから' in str(reasons_str):
-            easy_30_40 += 1
-    easy_60plus = 0
-    for reasons_str in df[(df['年代をお選びください。'].isin(['60代', '70代以上']))][reason_col].dropna():
-        if '加入手続きが簡単だったから' in str(reasons_str):
-            easy_60plus += 1
+    # 「家族への責任」「手続きの簡単さ」の分析（指標の定義をまとめて評価する）
+    metrics = DETAIL_PLAN.evaluate(index)
+    family_resp_60plus, total_60plus = metrics['家族への責任（60代以上）']
+    family_resp_30_40, total_30_40 = metrics['家族への責任（30-40代）']
+    easy_30_40, _ = metrics['手続きの簡単さ（30-40代）']
+    easy_60plus, _ = metrics['手続きの簡単さ（60代以上）']
     
     insights["リサーチクエスチョン1"]["インサイト"].append({
         "見出し": "年代別の特徴",
@@ -143,28 +324,28 @@ def create_marketing_insights():
         "詳細分析": {
             "家族への責任": {
                 "60代以上": {
-                    "人数": int(family_resp_60plus),
-                    "分母": int(total_60plus),
+                    "人数": _count(family_resp_60plus),
+                    "分母": _count(total_60plus),
                     "割合": f"{family_resp_60plus/total_60plus*100:.1f}%",
                     "分析": "60代以上では「家族への責任」が2番目に高い価値（約30%）。1位は「いつでも山に行ける安心」（約50%）だが、家族への配慮は60代以上で相対的に高い。"
                 },
                 "30-40代": {
-                    "人数": int(family_resp_30_40),
-                    "分母": int(total_30_40),
+                    "人数": _count(family_resp_30_40),
+                    "分母": _count(total_30_40),
                     "割合": f"{family_resp_30_40/total_30_40*100:.1f}%",
                     "分析": "30-40代では「家族への責任」が20-30%程度で、60代以上より低い。"
                 }
             },
             "手続きの簡単さ": {
                 "30-40代": {
-                    "回答数": int(easy_30_40),
-                    "分母": int(total_30_40),
+                    "回答数": _count(easy_30_40),
+                    "分母": _count(total_30_40),
                     "割合": f"{easy_30_40/total_30_40*100:.1f}%",
                     "分析": "30-40代では「手続きの簡単さ」が加入理由の上位に入る（約60%）。全年代平均（57.3%）より高く、特に40代が62.7%と高い。"
                 },
                 "60代以上": {
-                    "回答数": int(easy_60plus),
-                    "分母": int(total_60plus),
+                    "回答数": _count(easy_60plus),
+                    "分母": _count(total_60plus),
                     "割合": f"{easy_60plus/total_60plus*100:.1f}%",
                     "分析": "60代以上でも「手続きの簡単さ」は約56%と高いが、30-40代ほどではない。"
                 }
@@ -174,14 +355,14 @@ def create_marketing_insights():
             {
                 "示唆": "60代以上は「家族への責任」を重視→LPで家族への配慮を強調",
                 "根拠": {
-                    "データ": f"60代以上で「家族への責任」を感じた人は{family_resp_60plus}人/{total_60plus}人（{family_resp_60plus/total_60plus*100:.1f}%）",
+                    "データ": f"60代以上で「家族への責任」を感じた人は{_count(family_resp_60plus)}人/{_count(total_60plus)}人（{family_resp_60plus/total_60plus*100:.1f}%）",
                     "プロセス": "60代以上では「いつでも山に行ける安心」が1位（約50%）だが、「家族への責任」が2位（約30%）で、他の年代と比べて相対的に高い。価値観の違いとして、家族への配慮を訴求することで共感を得られやすい。"
                 }
             },
             {
                 "示唆": "30-40代は「手続きの簡単さ」を重視→UI/UXの改善を訴求",
                 "根拠": {
-                    "データ": f"30-40代で「手続きの簡単さ」を理由にした人は{easy_30_40}回/{total_30_40}人（{easy_30_40/total_30_40*100:.1f}%）",
+                    "データ": f"30-40代で「手続きの簡単さ」を理由にした人は{_count(easy_30_40)}回/{_count(total_30_40)}人（{easy_30_40/total_30_40*100:.1f}%）",
                     "プロセス": "30-40代では「手続きの簡単さ」が加入理由として上位（約60%）。全年代平均（57.3%）より高く、特に40代が62.7%と突出。デジタルネイティブ世代として、手続きの煩雑さを嫌う傾向が強い。UI/UXの改善を具体的に訴求することで、加入意欲を高められる。"
                 }
             },
@@ -196,93 +377,94 @@ def create_marketing_insights():
     })
     
     # 加入タイミング
-    timing_counts = df['ヤマップグループの「外あそびレジャー保険」「山歩保険」にご加入されたタイミングについて教えてください。'].value_counts()
+    timing_counts = value_counts(df[COLUMNS['join_timing']], weights)
     insights["リサーチクエスチョン1"]["インサイト"].append({
         "見出し": "加入タイミング",
-        "内容": timing_counts.to_dict(),
+        "内容": _count_dict(timing_counts),
         "マーケ施策への示唆": [
             "年間を通した補償を検討する人が約60%→年契約の訴求を強化",
             "直前・前日加入も約30%→当日加入可能を訴求"
         ]
     })
     
+    # 属性値×選択肢の一括検定（年代などの「相対的に高い」を検定で裏付ける）
+    tests = significance_table(compute_crosstabs(df, indicators, weights=weights),
+                               segment_sizes(df, weights=weights), design_effect=design_effect)
+    insights["リサーチクエスチョン1"]["インサイト"].append(significance_insight(tests, weighted=weights is not None))
+
+    # 加入理由・認知経路・1年契約の決め手のうち、一緒に選ばれやすい回答
+    insights["リサーチクエスチョン1"]["インサイト"].append(cooccurrence_insight(
+        cooccurrence(df, COOCCURRENCE_KEYS, weights=weights, indicators=indicators)))
+    
     # ②アップセル経験者
-    status_col = '以下から、現在のご加入状況について1つお選びください。'
-    year_plan = df[df[status_col].str.contains('1年契約', na=False)]
-    switched = year_plan[year_plan['実際に短期契約の後に1年契約に切り替えたのはいつですか？'].notna()]
+    n_year_plan = _size(masks['year_plan'], weights)
+    n_switched = _size(masks['switched'], weights)
     
-    if len(switched) > 0:
-        all_triggers = []
-        for triggers_str in switched['短期契約の後に1年契約に切り替えようと思ったきっかけを教えてください。（複数選択可）[MA]'].dropna():
-            all_triggers.extend(split_multiple_choice(triggers_str))
-        trigger_counts = pd.Series(all_triggers).value_counts()
+    if masks['switched'].any():
+        trigger_counts = option_counts(indicators[COLUMNS['switch_trigger']], masks['switched'], weights)
         
         insights["リサーチクエスチョン2"]["インサイト"].append({
             "見出し": "アップセル経験者の特徴",
-            "分子（短期プランから年契約に切り替えた人）": int(len(switched)),
-            "分母（年契約加入者全体）": int(len(year_plan)),
-            "切り替え率": f"{len(switched)/len(year_plan)*100:.1f}%",
-            "切り替えきっかけ": {k: int(v) for k, v in trigger_counts.to_dict().items()},
+            "分子（短期プランから年契約に切り替えた人）": _count(n_switched),
+            "分母（年契約加入者全体）": _count(n_year_plan),
+            "切り替え率": f"{n_switched/n_year_plan*100:.1f}%",
+            "切り替えきっかけ": _count_dict(trigger_counts),
             "マーケ施策への示唆": [
-            f"短期→年契約への切り替え率は{len(switched)/len(year_plan)*100:.1f}%（{len(switched)}人/{len(year_plan)}人）",
+            f"短期→年契約への切り替え率は{n_switched/n_year_plan*100:.1f}%（{_count(n_switched)}人/{_count(n_year_plan)}人）",
             "切り替えきっかけを分析して、タイミングに合わせた訴求を実施",
             "短期プラン利用者への年契約提案を強化"
         ]})
     
     # 現在短期プラン加入者の意向
-    short_plan = df[df[status_col].str.contains('7日契約|30日契約', na=False)]
-    if len(short_plan) > 0:
-        intention = short_plan['今後、1年契約に切り替えるご意向はありますか？'].value_counts()
+    short_mask = masks['short_plan']
+    if short_mask.any():
+        n_short_plan = _size(short_mask, weights)
+        intention = value_counts(df.loc[short_mask, COLUMNS['future_intention']],
+                                 None if weights is None else weights[short_mask])
         not_considering = intention.get('あまり検討していない', 0) + intention.get('全く検討していない', 0)
         insights["リサーチクエスチョン2"]["インサイト"].append({
             "見出し": "短期プラン加入者の年契約への意向",
-            "分母（短期プラン加入者総数）": int(len(short_plan)),
-            "分子（あまり/全く検討していない人の合計）": int(not_considering),
-            "割合": f"{not_considering/len(short_plan)*100:.1f}%",
-            "内容": {k: int(v) for k, v in intention.to_dict().items()},
+            "分母（短期プラン加入者総数）": _count(n_short_plan),
+            "分子（あまり/全く検討していない人の合計）": _count(not_considering),
+            "割合": f"{not_considering/n_short_plan*100:.1f}%",
+            "内容": _count_dict(intention),
             "マーケ施策への示唆": [
-            f"短期プラン加入者の約{not_considering/len(short_plan)*100:.1f}%（{not_considering}人/{len(short_plan)}人）は「あまり/全く検討していない」",
+            f"短期プラン加入者の約{not_considering/n_short_plan*100:.1f}%（{_count(not_considering)}人/{_count(n_short_plan)}人）は「あまり/全く検討していない」",
             "年契約のメリット（コスパ、手間の削減）を訴求する必要あり"
         ]})
     
     # ③継続・非継続理由
-    continuing = df[df[status_col].str.contains('外あそびレジャー保険の1年契約に加入し、現在も加入中', na=False)]
-    discontinued = df[df[status_col].str.contains('契約が終了している|解約', na=False)]
+    n_continuing = _size(masks['continuing'], weights)
+    n_discontinued = _size(masks['discontinued'], weights)
     
     # 継続理由
-    all_reasons = []
-    reason_col = '1年契約を選択した決め手を教えてください。（当てはまるものに全てチェックをしてください）[MA]'
-    for reasons_str in continuing[reason_col].dropna():
-        all_reasons.extend(split_multiple_choice(reasons_str))
-    continue_reasons = pd.Series(all_reasons).value_counts().head(5)
+    reason_col = COLUMNS['year_plan_reason']
+    continue_reasons = option_counts(indicators[reason_col], masks['continuing'], weights).head(5)
     
-    total = len(continuing) + len(discontinued)
-    continuation_rate = len(continuing) / total * 100 if total > 0 else 0
+    total = n_continuing + n_discontinued
+    continuation_rate = n_continuing / total * 100 if total > 0 else 0
     insights["リサーチクエスチョン3"]["インサイト"].append({
         "見出し": "継続理由",
-        "継続者数（分子）": int(len(continuing)),
-        "非継続者数": int(len(discontinued)),
-        "合計（分母）": int(total),
+        "継続者数（分子）": _count(n_continuing),
+        "非継続者数": _count(n_discontinued),
+        "合計（分母）": _count(total),
         "継続率": f"{continuation_rate:.1f}%",
-        "主要な継続理由": {k: int(v) for k, v in continue_reasons.to_dict().items()},
+        "主要な継続理由": _count_dict(continue_reasons),
         "マーケ施策への示唆": [
-            f"継続率は{continuation_rate:.1f}%（{len(continuing)}人/{total}人）",
+            f"継続率は{continuation_rate:.1f}%（{_count(n_continuing)}人/{_count(total)}人）",
             "1年を通した安心、コスパ、頻度の高さが主要理由",
             "これらの価値をLPやプロモーションで強調"
         ]
     })
     
     # 非継続理由
-    cancel_reason_col = '解約した理由を上位3つまで選んで教えてください。'
-    all_cancel_reasons = []
-    for reasons_str in discontinued[cancel_reason_col].dropna():
-        all_cancel_reasons.extend(split_multiple_choice(reasons_str))
-    cancel_reasons = pd.Series(all_cancel_reasons).value_counts()
+    cancel_reason_col = COLUMNS['cancel_reason']
+    cancel_reasons = option_counts(indicators[cancel_reason_col], masks['discontinued'], weights)
     
     insights["リサーチクエスチョン3"]["インサイト"].append({
         "見出し": "非継続（解約）理由",
-        "非継続者数": len(discontinued),
-        "主要な解約理由": cancel_reasons.to_dict(),
+        "非継続者数": _count(n_discontinued),
+        "主要な解約理由": _count_dict(cancel_reasons),
         "マーケ施策への示唆": [
             "利用頻度が低いと感じる人が解約",
             "他プランへの切替え検討もあり→プラン間の比較を明確化",
@@ -290,125 +472,227 @@ def create_marketing_insights():
         ]
     })
     
-    # レポートを保存
-    output_path = Path("marketing_insights_report.json")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(insights, f, ensure_ascii=False, indent=2)
+    return attach_intervals(insights, interval_method, design_effect)
+
+REPORT_TITLE = "YAMAPアウトドア保険 マーケティングインサイトレポート"
+
+# 基本情報の分布の項目
+BASIC_DISTRIBUTIONS = ['年代別分布', '性別分布', '地域別分布（上位10）']
+
+def _interval(insight, field=None, label=None):
+    """インサイトに付けた信頼区間（「95%信頼区間 a%〜b%」。なければNone）"""
+    if field is None:
+        interval = insight.get(CI_KEY)
+    else:
+        interval = insight.get(f"{field}（{CI_KEY}）", {}).get(label)
+    return f"{CI_KEY} {interval}" if interval else None
+
+def _with_interval(value, insight):
+    interval = _interval(insight)
+    return f"{value}（{interval}）" if interval else value
+
+def _basic_blocks(basic_info):
+    """基本情報のブロック（調査概要・分布・加入保険の内訳）"""
+    total_responses = None
+    for insight in basic_info['インサイト']:
+        if '総回答数' in insight and insight['見出し'] == '調査概要':
+            total_responses = insight['総回答数']
+            break
+
+    blocks = []
+    for insight in basic_info['インサイト']:
+        block = Block(insight['見出し'])
+        if '総回答数' in insight and insight['見出し'] == '調査概要':
+            block.body.append(Fields([('総回答数', f"{insight['総回答数']}件")]))
+            if 'ウェイト調整' in insight:
+                weighting = insight['ウェイト調整']
+                block.body.append(Fields([('有効サンプルサイズ（ウェイト調整）', f"{weighting['有効サンプルサイズ']}件"),
+                                          ('デザイン効果', weighting['デザイン効果'])]))
+            if '回答期間' in insight:
+                block.body.append(ItemList('回答期間', [('開始', insight['回答期間']['開始']),
+                                                     ('終了', insight['回答期間']['終了'])]))
+        for field in BASIC_DISTRIBUTIONS:
+            if field in insight:
+                total_for_pct = insight.get('総回答数', total_responses)
+                block.body.append(Distribution(field, [
+                    (label, count, count / total_for_pct * 100, _interval(insight, field, label))
+                    for label, count in insight[field].items()]))
+        if '内訳' in insight:
+            total = insight['合計']
+            block.body.append(Distribution('加入保険の内訳', [
+                (label, count, count / total * 100 if total > 0 else 0, _interval(insight, '内訳', label))
+                for label, count in insight['内訳'].items()], total=total))
+        blocks.append(block)
+    return blocks
+
+def _detail_groups(details):
+    """詳細分析（①用）の割合"""
+    groups = []
+    for name, count_key, unit in (('家族への責任', '人数', '人'), ('手続きの簡単さ', '回答数', '回')):
+        if name in details:
+            groups.append((name, [
+                Rate(group, data[count_key], unit, data['分母'], data['割合'], _interval(data), data['分析'])
+                for group, data in details[name].items()]))
+    return groups
+
+def _wave_share(share, interval):
+    return f"{share}（{CI_KEY} {interval}）" if interval and interval != "-" else share
+
+def _wave_table(insight):
+    """調査回ごとの割合と前回差の表（調査回の比較用）"""
+    labels = list(insight['母数'])
+    delta_labels = labels[1:]
+    columns = (['回答'] + [f"{label}（n={insight['母数'][label]}）" for label in labels]
+               + [f"前回差（{label}）" for label in delta_labels])
+    rows = []
+    for answer, shares in insight['調査回別の割合'].items():
+        deltas = insight['前回差（pt）'].get(answer, {})
+        intervals = insight.get(f"調査回別の割合（{CI_KEY}）", {}).get(answer, {})
+        rows.append([answer] + [_wave_share(shares.get(label, "-"), intervals.get(label)) for label in labels]
+                    + [deltas.get(label, '-') for label in delta_labels])
+    return Table(columns, rows)
+
+def _age_table(content):
+    """年代別の特徴の表（年代ごとの主要な回答の件数・その年代の人数に占める割合・信頼区間）"""
+    rows = []
+    for age, data in content.items():
+        n = data['人数']
+        for field in ('主要加入理由', '主要認知経路', '主要価値'):
+            intervals = data.get(f"{field}（{CI_KEY}）", {})
+            for option, count in data.get(field, {}).items():
+                rows.append([f"{age}（n={n}）", field, option, str(count),
+                             f"{count / n * 100:.1f}%" if n else "-", intervals.get(option, "-")])
+    return Table(AGE_COLUMNS, rows)
+
+def _suggestions(suggestions):
+    if isinstance(suggestions, list) and len(suggestions) > 0 and isinstance(suggestions[0], dict):
+        items = [(s['示唆'], s['根拠']['データ'], s['根拠']['プロセス']) if '根拠' in s else (s['示唆'], None, None)
+                 for s in suggestions]
+        return Suggestions('マーケティング施策への示唆', items, detailed=True)
+    return Suggestions('マーケティング施策への示唆', list(suggestions))
+
+def _insight_block(insight):
+    """リサーチクエスチョンの1インサイトのブロック"""
+    block = Block(insight['見出し'])
+    if '詳細分析' in insight:
+        block.body.append(RateGroups('詳細分析', _detail_groups(insight['詳細分析'])))
+    # 分母と分子を明記（②用）
+    if '分母（短期プラン加入者総数）' in insight:
+        block.body.append(Fields([
+            ('分母（短期プラン加入者総数）', f"{insight['分母（短期プラン加入者総数）']}人"),
+            ('分子（あまり/全く検討していない人の合計）', f"{insight['分子（あまり/全く検討していない人の合計）']}人"),
+            ('割合', _with_interval(insight['割合'], insight)),
+        ]))
+    # アップセル経験者の切り替え率（②用）
+    if '分子（短期プランから年契約に切り替えた人）' in insight:
+        block.body.append(Fields([
+            ('分子（短期プランから年契約に切り替えた人）', f"{insight['分子（短期プランから年契約に切り替えた人）']}人"),
+            ('分母（年契約加入者全体）', f"{insight['分母（年契約加入者全体）']}人"),
+            ('切り替え率', _with_interval(insight['切り替え率'], insight)),
+        ]))
+    # 分母と分子を明記（③用）
+    if '合計（分母）' in insight:
+        block.body.append(Fields([
+            ('継続者数（分子）', f"{insight['継続者数（分子）']}人"),
+            ('非継続者数', f"{insight['非継続者数']}人"),
+            ('合計（分母）', f"{insight['合計（分母）']}人"),
+            ('継続率', _with_interval(insight['継続率'], insight)),
+        ]))
+    if '調査回別の割合' in insight:
+        block.body.append(_wave_table(insight))
+    if '特徴的な回答' in insight:
+        block.body.append(Fields([
+            ('検定方法', insight['検定方法']),
+            ('有意な組み合わせ', f"{insight['有意な組み合わせ']}件 / {insight['検定した組み合わせ']}件"),
+        ]))
+        if insight['特徴的な回答']:
+            block.body.append(Table(DISTINCTIVE_COLUMNS, [[str(cell[col]) for col in DISTINCTIVE_COLUMNS]
+                                                          for cell in insight['特徴的な回答']]))
+    if '共起する回答' in insight:
+        block.body.append(Fields([('算出方法', insight['算出方法'])]))
+        if insight['共起する回答']:
+            block.body.append(Table(COOCCURRENCE_COLUMNS, [[str(cell[col]) for col in COOCCURRENCE_COLUMNS]
+                                                           for cell in insight['共起する回答']]))
+    if '内容' in insight and insight['内容'] and all(isinstance(value, dict) and '人数' in value
+                                                   for value in insight['内容'].values()):
+        block.body.append(_age_table(insight['内容']))
+    elif '内容' in insight:
+        block.body.append(ItemList('データ', [(key, str(value)) for key, value in insight['内容'].items()]))
+    if 'マーケ施策への示唆' in insight:
+        block.body.append(_suggestions(insight['マーケ施策への示唆']))
+    return block
+
+def insights_report(insights):
+    """インサイトの辞書からレポートのモデルを作る（基本情報を先頭に、以降は辞書の順）"""
+    sections = []
+    if "基本情報" in insights:
+        basic_info = insights["基本情報"]
+        sections.append(Section("基本情報", basic_info['タイトル'], _basic_blocks(basic_info), basic_info))
+    for q_num, q_data in insights.items():
+        if q_num == "基本情報":
+            continue
+        sections.append(Section(q_num, q_data['タイトル'],
+                                [_insight_block(insight) for insight in q_data['インサイト']], q_data))
+    return Report(REPORT_TITLE, sections)
+
+@traced()
+def write_reports(insights, outputs=None, cache=True):
+    """インサイトを複数の形式で1回の走査で保存する（outputs: {形式: 保存先}。省略時はJSON・マークダウン）
+
+    cache=Trueなら、前回から内容が変わったセクションだけを描画し直す。
+    """
+    outputs = outputs or {'json': JSON_PATH, 'markdown': MD_PATH}
+    return render(insights_report(insights), outputs, RenderCache() if cache else None)
+
+def create_marketing_insights(interval_method=DEFAULT_METHOD, waves=None, labels=None, formats=None, margins_path=None):
+    """マーケティング施策に活用するインサイトを作成
+
+    waves（調査回ごとのCSV、古い順）を指定すると、最新回のインサイトに調査回の比較（前回差）を加える。
+    margins_pathを指定すると、構成比のCSVにレイキングしたウェイト付きの件数で集計する（調査回ごとに調整する）。
+    """
+    margins = read_margins(margins_path) if margins_path else None
+    if waves:
+        wave_aggregates, df, raking = load_waves(waves, labels, return_latest=True, margins=margins)
+    else:
+        df = load_survey(CSV_PATH)
+        raking = rake_frame(df, margins) if margins is not None else None
+    if raking is not None:
+        print_raking(raking)
+    insights = build_insights(df, interval_method=interval_method,
+                              weights=None if raking is None else raking.weights)
+    if waves:
+        insights["調査回の比較"] = wave_insights(wave_aggregates, interval_method=interval_method)
     
-    # マークダウン形式でも保存
-    md_path = Path("marketing_insights_report.md")
-    with open(md_path, 'w', encoding='utf-8') as f:
-        f.write("# YAMAPアウトドア保険 マーケティングインサイトレポート\n\n")
-        
-        # 基本情報を最初に表示
-        if "基本情報" in insights:
-            basic_info = insights["基本情報"]
-            # 総回答数を取得
-            total_responses = None
-            for insight in basic_info['インサイト']:
-                if '総回答数' in insight and insight['見出し'] == '調査概要':
-                    total_responses = insight['総回答数']
-                    break
-            
-            f.write(f"## 基本情報: {basic_info['タイトル']}\n\n")
-            for insight in basic_info['インサイト']:
-                f.write(f"### {insight['見出し']}\n\n")
-                if '総回答数' in insight and insight['見出し'] == '調査概要':
-                    f.write(f"**総回答数:** {insight['総回答数']}件\n\n")
-                    if '回答期間' in insight:
-                        f.write(f"**回答期間:**\n")
-                        f.write(f"- 開始: {insight['回答期間']['開始']}\n")
-                        f.write(f"- 終了: {insight['回答期間']['終了']}\n\n")
-                if '年代別分布' in insight:
-                    total_for_pct = insight.get('総回答数', total_responses)
-                    f.write("**年代別分布:**\n")
-                    for age, count in insight['年代別分布'].items():
-                        pct = count / total_for_pct * 100
-                        f.write(f"- {age}: {count}人 ({pct:.1f}%)\n")
-                    f.write("\n")
-                if '性別分布' in insight:
-                    total_for_pct = insight.get('総回答数', total_responses)
-                    f.write("**性別分布:**\n")
-                    for gender, count in insight['性別分布'].items():
-                        pct = count / total_for_pct * 100
-                        f.write(f"- {gender}: {count}人 ({pct:.1f}%)\n")
-                    f.write("\n")
-                if '地域別分布（上位10）' in insight:
-                    total_for_pct = insight.get('総回答数', total_responses)
-                    f.write("**地域別分布（上位10）:**\n")
-                    for region, count in insight['地域別分布（上位10）'].items():
-                        pct = count / total_for_pct * 100
-                        f.write(f"- {region}: {count}人 ({pct:.1f}%)\n")
-                    f.write("\n")
-                if '内訳' in insight:
-                    f.write("**加入保険の内訳:**\n")
-                    for insurance, count in insight['内訳'].items():
-                        pct = count / insight['合計'] * 100 if insight['合計'] > 0 else 0
-                        f.write(f"- {insurance}: {count}人 ({pct:.1f}%)\n")
-                    f.write(f"\n**合計:** {insight['合計']}人\n\n")
-        
-        # リサーチクエスチョンを表示
-        for q_num, q_data in insights.items():
-            if q_num == "基本情報":
-                continue  # 基本情報は既に表示済み
-            f.write(f"## {q_num}: {q_data['タイトル']}\n\n")
-            for insight in q_data['インサイト']:
-                f.write(f"### {insight['見出し']}\n\n")
-                
-                # 詳細分析の表示（①用）
-                if '詳細分析' in insight:
-                    f.write("**詳細分析:**\n\n")
-                    if '家族への責任' in insight['詳細分析']:
-                        f.write("##### 家族への責任\n\n")
-                        for age_group, data in insight['詳細分析']['家族への責任'].items():
-                            f.write(f"- **{age_group}:** {data['人数']}人/{data['分母']}人（{data['割合']}）\n")
-                            f.write(f"  - {data['分析']}\n\n")
-                    if '手続きの簡単さ' in insight['詳細分析']:
-                        f.write("##### 手続きの簡単さ\n\n")
-                        for age_group, data in insight['詳細分析']['手続きの簡単さ'].items():
-                            f.write(f"- **{age_group}:** {data['回答数']}回/{data['分母']}人（{data['割合']}）\n")
-                            f.write(f"  - {data['分析']}\n\n")
-                
-                # 分母と分子を明記（②用）
-                if '分母（短期プラン加入者総数）' in insight:
-                    f.write(f"**分母（短期プラン加入者総数）:** {insight['分母（短期プラン加入者総数）']}人\n\n")
-                    f.write(f"**分子（あまり/全く検討していない人の合計）:** {insight['分子（あまり/全く検討していない人の合計）']}人\n\n")
-                    f.write(f"**割合:** {insight['割合']}\n\n")
-                # アップセル経験者の切り替え率（②用）
-                if '分子（短期プランから年契約に切り替えた人）' in insight:
-                    f.write(f"**分子（短期プランから年契約に切り替えた人）:** {insight['分子（短期プランから年契約に切り替えた人）']}人\n\n")
-                    f.write(f"**分母（年契約加入者全体）:** {insight['分母（年契約加入者全体）']}人\n\n")
-                    f.write(f"**切り替え率:** {insight['切り替え率']}\n\n")
-                # 分母と分子を明記（③用）
-                if '合計（分母）' in insight:
-                    f.write(f"**継続者数（分子）:** {insight['継続者数（分子）']}人\n\n")
-                    f.write(f"**非継続者数:** {insight['非継続者数']}人\n\n")
-                    f.write(f"**合計（分母）:** {insight['合計（分母）']}人\n\n")
-                    f.write(f"**継続率:** {insight['継続率']}\n\n")
-                if '内容' in insight:
-                    f.write("**データ:**\n")
-                    for key, value in insight['内容'].items():
-                        f.write(f"- {key}: {value}\n")
-                    f.write("\n")
-                if 'マーケ施策への示唆' in insight:
-                    f.write("**マーケティング施策への示唆:**\n\n")
-                    # 示唆が辞書形式の場合（詳細版）
-                    if isinstance(insight['マーケ施策への示唆'], list) and len(insight['マーケ施策への示唆']) > 0 and isinstance(insight['マーケ施策への示唆'][0], dict):
-                        for suggestion in insight['マーケ施策への示唆']:
-                            f.write(f"##### {suggestion['示唆']}\n\n")
-                            if '根拠' in suggestion:
-                                f.write(f"- **データ:** {suggestion['根拠']['データ']}\n")
-                                f.write(f"- **プロセス:** {suggestion['根拠']['プロセス']}\n\n")
-                    else:
-                        # 文字列形式の場合（従来版）
-                        for suggestion in insight['マーケ施策への示唆']:
-                            f.write(f"- {suggestion}\n")
-                    f.write("\n")
-        
-    print(f"✓ マーケティングインサイトレポートを保存:")
-    print(f"  - JSON: {output_path}")
-    print(f"  - Markdown: {md_path}")
+    # レポートを保存（JSON・マークダウン・Excel・コンソール）
+    paths = {'json': JSON_PATH, 'markdown': MD_PATH, 'xlsx': XLSX_PATH, 'console': None}
+    outputs = {fmt: paths[fmt] for fmt in formats or DEFAULT_FORMATS}
+    write_reports(insights, outputs)
+    
+    saved = [(fmt, path) for fmt, path in outputs.items() if path is not None]
+    if saved:
+        print(f"✓ マーケティングインサイトレポートを保存:")
+        for fmt, path in saved:
+            print(f"  - {FORMAT_LABELS[fmt]}: {path}")
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="YAMAPアウトドア保険 マーケティングインサイトレポートの作成")
+    parser.add_argument('--interval', choices=METHODS, default=DEFAULT_METHOD,
+                        help="割合の信頼区間の計算方法（bootstrapは二項分布の一括リサンプリング）")
+    parser.add_argument('--waves', nargs='+', type=Path, default=None,
+                        help="調査回ごとのCSV（古い順）。最新回のレポートに前回差を加える")
+    parser.add_argument('--labels', nargs='+', default=None,
+                        help="--wavesの調査回の名前（省略時はファイル名の日付）")
+    parser.add_argument('--formats', nargs='+', choices=FORMATS, default=DEFAULT_FORMATS,
+                        help="作成する形式（consoleは画面に表示）")
+    parser.add_argument('--weights', type=Path, default=None, metavar='MARGINS_CSV',
+                        help="年代・性別・地域の構成比のCSVにレイキングしたウェイト付きで集計する（--wavesでは調査回ごと）")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    enable_trace(args)
+    
+    create_marketing_insights(args.interval, args.waves, args.labels, args.formats, args.weights)
 
 if __name__ == "__main__":
-    create_marketing_insights()
+    main()
 
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+マージ可能な集計値
+行データを持たず件数だけを保持するため、チャンクごとに集計して足し合わせれば
+全件を一度に読み込んだ場合と同じ数字になる（ストリーミング・差分更新で使う）
+"""
+
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from survey_crosstab import ALL_QUESTIONS, ATTRIBUTES, compute_crosstabs, segment_sizes
+from survey_indicators import build_indicators
+from survey_loader import CSV_PATH, iter_survey_chunks
+from survey_schema import COLUMNS, KEYS_BY_HEADER, MULTI_CHOICE_KEYS, SCHEMA, SINGLE_CHOICE_KEYS
+from survey_segments import SEGMENTS, segment_masks
+from survey_timeseries import timestamp_range
+from survey_trace import traced
+from survey_weights import kish_design_effect
+
+# 自由記述の例として保持する件数（セグメント×設問ごと、ファイル順で先頭から）
+N_EXAMPLES = 5
+
+# 自由記述の例を保持する設問（セグメント: キー）
+EXAMPLE_KEYS = {'discontinued': ['cancel_detail']}
+
+DEFAULT_CHUNKSIZE = 100_000
+
+def _sort_key(value, count, domain):
+    """件数の多い順。同数は選択肢の定義順 → 文字列順（チャンクの分け方によらず一定）"""
+    try:
+        position = domain.index(value)
+    except ValueError:
+        position = len(domain)
+    return (-count, position, str(value))
+
+def _ordered_series(counter, key, order='count'):
+    """Counterを並べたSeriesに変換する（order: 'count' 件数順 / 'domain' 選択肢の定義順）"""
+    domain = SCHEMA[key].get('domain', [])
+    items = [(value, count) for value, count in counter.items() if count > 0]
+    if order == 'domain':
+        items.sort(key=lambda item: _sort_key(item[0], 0, domain))
+    else:
+        items.sort(key=lambda item: _sort_key(item[0], item[1], domain))
+    # ウェイト付きの件数は小数
+    dtype = float if any(isinstance(count, float) for _, count in items) else np.int64
+    return pd.Series([count for _, count in items], index=[value for value, _ in items], dtype=dtype)
+
+class SurveyAggregates:
+    """アンケートの集計値（件数・クロス集計・セグメント人数）"""
+
+    def __init__(self):
+        self.n_rows = 0
+        self.n_columns = 0
+        self.timestamp_min = None
+        self.timestamp_max = None
+        self.segment_sizes = Counter({name: 0 for name in SEGMENTS})
+        # (セグメント, キー) -> Counter(回答 -> 件数)
+        self.value_counts = {}
+        self.option_counts = {}
+        # (属性, 属性値) -> 人数（初出順）、(属性, 属性値, 設問, 選択肢) -> 件数
+        self.attribute_sizes = Counter()
+        self.crosstab_counts = Counter()
+        # (セグメント, キー) -> 自由記述の例（ファイル順）
+        self.examples = {}
+        # ウェイトによるデザイン効果（Kish。ウェイトなしは1）。信頼区間の有効サンプルサイズに使う
+        self.design_effect = 1.0
+
+    @classmethod
+    def from_frame(cls, df, indicators=None, masks=None, weights=None):
+        """DataFrame（全件またはチャンク）から集計する（indicators・masksは計算済みなら渡す）
+
+        weights（行ごとのウェイト）を渡すと、件数・人数はウェイトの合計（小数）になる。
+        """
+        agg = cls()
+        if indicators is None:
+            indicators = build_indicators(df)
+        if masks is None:
+            masks = segment_masks(df)
+        count = int if weights is None else float
+
+        agg.n_rows = len(df)
+        agg.n_columns = len(df.columns)
+        agg.design_effect = kish_design_effect(weights)
+        if COLUMNS['timestamp'] in df.columns:
+            agg.timestamp_min, agg.timestamp_max = timestamp_range(df[COLUMNS['timestamp']])
+
+        for name, mask in masks.items():
+            agg.segment_sizes[name] = count(mask.sum() if weights is None else weights[mask].sum())
+
+        # 単一選択: 列ごとに1回コード化し、セグメントごとにbincountする
+        for key in SINGLE_CHOICE_KEYS:
+            col = COLUMNS[key]
+            if col not in df.columns:
+                continue
+            codes, values = pd.factorize(df[col])
+            values = list(values)
+            for name, mask in masks.items():
+                selected = codes[mask]
+                valid = selected >= 0
+                counts = np.bincount(selected[valid], minlength=len(values),
+                                     weights=None if weights is None else weights[mask][valid])
+                agg.value_counts[(name, key)] = Counter(
+                    {values[i]: count(c) for i, c in enumerate(counts) if c > 0})
+
+        # 複数選択: インジケータ行列のマスク付き列和
+        for key in MULTI_CHOICE_KEYS:
+            col = COLUMNS[key]
+            if col not in indicators:
+                continue
+            matrix = indicators[col]
+            values = matrix.to_numpy()
+            options = list(matrix.columns)
+            for name, mask in masks.items():
+                if weights is None:
+                    counts = values[mask].sum(axis=0, dtype=np.int64)
+                else:
+                    counts = weights[mask] @ values[mask]
+                agg.option_counts[(name, key)] = Counter(
+                    {options[i]: count(c) for i, c in enumerate(counts) if c > 0})
+
+        # 属性×設問のクロス集計（全ての単一選択・複数選択の設問）
+        for attr_name, attr_value, size in segment_sizes(df, weights=weights).itertuples(index=False):
+            agg.attribute_sizes[(attr_name, attr_value)] += count(size)
+        crosstab = compute_crosstabs(df, indicators, questions=ALL_QUESTIONS, weights=weights)
+        for row in crosstab[['属性', '属性値', '設問', '選択肢', '件数']].itertuples(index=False):
+            agg.crosstab_counts[tuple(row[:4])] += count(row[4])
+
+        # 自由記述の例
+        for name, keys in EXAMPLE_KEYS.items():
+            for key in keys:
+                col = COLUMNS[key]
+                if col in df.columns:
+                    texts = df.loc[masks[name], col].dropna().head(N_EXAMPLES)
+                    agg.examples[(name, key)] = list(texts)
+        return agg
+
+    def merge(self, other):
+        """別の集計値（後続のチャンク）を足し込む"""
+        self.n_rows += other.n_rows
+        self.n_columns = max(self.n_columns, other.n_columns)
+        if other.timestamp_min is not None:
+            bounds = [self.timestamp_min, self.timestamp_max, other.timestamp_min, other.timestamp_max]
+            self.timestamp_min, self.timestamp_max = timestamp_range([t for t in bounds if t is not None])
+        self.segment_sizes.update(other.segment_sizes)
+        for store, other_store in ((self.value_counts, other.value_counts),
+                                   (self.option_counts, other.option_counts)):
+            for k, counter in other_store.items():
+                store.setdefault(k, Counter()).update(counter)
+        self.attribute_sizes.update(other.attribute_sizes)
+        self.crosstab_counts.update(other.crosstab_counts)
+        for k, texts in other.examples.items():
+            merged = self.examples.setdefault(k, [])
+            merged.extend(texts[:N_EXAMPLES - len(merged)])
+        return self
+
+    def combine(self, other):
+        """同じ全件を別の列で集計した集計値から、まだない項目を加える（並列に集計した部分をまとめる）
+
+        mergeと違い件数は足さない（両方にある項目は同じ行から数えたものなので先に加えた方を残す）。
+        属性値の並びは加えた順になるため、属性の定義順に加える。
+        """
+        if self.n_rows == 0:
+            self.n_rows = other.n_rows
+            self.segment_sizes = other.segment_sizes.copy()
+            self.design_effect = other.design_effect
+        self.n_columns = max(self.n_columns, other.n_columns)
+        if self.timestamp_min is None:
+            self.timestamp_min, self.timestamp_max = other.timestamp_min, other.timestamp_max
+        for store, other_store in ((self.value_counts, other.value_counts),
+                                   (self.option_counts, other.option_counts),
+                                   (self.attribute_sizes, other.attribute_sizes),
+                                   (self.crosstab_counts, other.crosstab_counts),
+                                   (self.examples, other.examples)):
+            for k, value in other_store.items():
+                if k not in store:
+                    store[k] = value
+        return self
+
+    def counts(self, segment, key, order='count'):
+        """セグメント内の回答の件数（単一選択・複数選択のどちらも）"""
+        store = self.option_counts if SCHEMA[key]['kind'] == 'multi' else self.value_counts
+        return _ordered_series(store.get((segment, key), Counter()), key, order)
+
+    def has(self, key):
+        """データにその設問の列があったか"""
+        store = self.option_counts if SCHEMA[key]['kind'] == 'multi' else self.value_counts
+        return ('all', key) in store
+
+    def size(self, segment):
+        """セグメントの人数"""
+        return self.segment_sizes[segment]
+
+    def segment_table(self):
+        """属性値ごとの人数（属性の定義順 → 属性値の初出順）"""
+        rows = [(attr, value, size) for (attr, value), size in self.attribute_sizes.items()]
+        attr_order = {name: i for i, name in enumerate(ATTRIBUTES)}
+        rows.sort(key=lambda row: attr_order[row[0]])
+        return pd.DataFrame(rows, columns=['属性', '属性値', '母数'])
+
+    def crosstab(self):
+        """属性×設問のクロス集計（compute_crosstabsと同じ縦持ちの表。設問はALL_QUESTIONSの全て）"""
+        value_order = {k: i for i, k in enumerate(self.attribute_sizes)}
+        attr_order = {name: i for i, name in enumerate(ATTRIBUTES)}
+        question_order = {name: i for i, name in enumerate(ALL_QUESTIONS)}
+        domains = {name: SCHEMA[KEYS_BY_HEADER[col]].get('domain', []) for name, (col, _) in ALL_QUESTIONS.items()}
+
+        rows = []
+        for (attr, value, question, option), count in self.crosstab_counts.items():
+            if count <= 0:
+                continue
+            size = self.attribute_sizes[(attr, value)]
+            rows.append(((attr_order[attr], value_order[(attr, value)], question_order[question])
+                         + _sort_key(option, count, domains[question]),
+                         (attr, value, question, option, count, size, count / size * 100)))
+        rows.sort(key=lambda row: row[0])
+        return pd.DataFrame([row for _, row in rows],
+                            columns=['属性', '属性値', '設問', '選択肢', '件数', '母数', '割合'])
+
+@traced()
+def aggregate_frame(df, indicators=None, masks=None, weights=None):
+    """全件のDataFrameから集計する（weights: 行ごとのウェイト）"""
+    return SurveyAggregates.from_frame(df, indicators, masks, weights)
+
+@traced()
+def stream_aggregates(csv_path=CSV_PATH, chunksize=DEFAULT_CHUNKSIZE):
+    """CSVをチャンクごとに読み込みながら集計する（メモリ使用量はチャンクサイズで決まる）"""
+    agg = SurveyAggregates()
+    for chunk in iter_survey_chunks(csv_path, chunksize):
+        agg.merge(SurveyAggregates.from_frame(chunk))
+    return agg
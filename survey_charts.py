@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+グラフの描画
+グラフを「データ＋スタイル」の辞書（チャート定義）で表し、内容のハッシュが前回と同じ
+グラフは描き直さない。描き直しが必要なグラフはプロセスプールで並列に描画する
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+from pathlib import Path
+
+from survey_trace import traced
+
+# 描画処理を変えたときに上げる（全グラフを描き直す）
+CHART_VERSION = 1
+
+FIG_DIR = Path("visualizations")
+
+# 出力先フォルダ内の、グラフごとのハッシュの記録
+MANIFEST_NAME = '.chart_manifest.json'
+
+DEFAULT_STYLE = {
+    'dpi': 300,
+    'font_family': 'DejaVu Sans',
+    'style': 'whitegrid',
+    'palette': 'husl',
+}
+
+def series_data(counts):
+    """件数のSeriesをチャート定義に入れられる形（ラベル・値のリスト）に変換する
+
+    ウェイト付きの件数（小数）は丸めずにそのまま描画する。
+    """
+    return {
+        'labels': [str(label) for label in counts.index],
+        'values': [value.item() if hasattr(value, 'item') else value for value in counts.to_numpy()],
+    }
+
+def chart(file, kind, counts, title, figsize, color, xlabel=None, ylabel=None, **options):
+    """チャート定義を作る（kind: 'bar' / 'barh' / 'pie'）"""
+    spec = {
+        'file': file,
+        'kind': kind,
+        'data': series_data(counts),
+        'title': title,
+        'figsize': list(figsize),
+        'color': color,
+        'xlabel': xlabel,
+        'ylabel': ylabel,
+    }
+    spec.update(options)
+    return spec
+
+def heatmap(file, data, title, figsize, color, **options):
+    """ヒートマップのチャート定義を作る（data: 行・列のラベルと値の表。colorはカラーマップ名）"""
+    spec = {
+        'file': file,
+        'kind': 'heatmap',
+        'data': data,
+        'title': title,
+        'figsize': list(figsize),
+        'color': color,
+        'xlabel': None,
+        'ylabel': None,
+    }
+    spec.update(options)
+    return spec
+
+def _library_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+def chart_hash(spec, style=DEFAULT_STYLE):
+    """チャート定義・スタイル・描画ライブラリのバージョンのハッシュ"""
+    payload = {
+        'version': CHART_VERSION,
+        'spec': spec,
+        'style': style,
+        'libraries': [_library_version('matplotlib'), _library_version('seaborn'), _library_version('pandas')],
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+def _read_manifest(fig_dir):
+    try:
+        with open(fig_dir / MANIFEST_NAME, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_manifest(fig_dir, manifest):
+    path = fig_dir / MANIFEST_NAME
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _setup_style(style):
+    """ワーカーごとにmatplotlib / seabornの設定を行う"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    plt.rcParams['font.family'] = style['font_family']
+    sns.set_style(style['style'])
+    sns.set_palette(style['palette'])
+    return plt
+
+def render_chart(spec, path, style=DEFAULT_STYLE):
+    """チャート定義を1枚のPNGに描画する（プロセスプールのワーカーで実行される）"""
+    import pandas as pd
+
+    plt = _setup_style(style)
+    data = spec['data']
+
+    plt.figure(figsize=spec['figsize'])
+    if spec['kind'] == 'heatmap':
+        import seaborn as sns
+
+        table = pd.DataFrame(data['values'], index=data['rows'], columns=data['columns'], dtype=float)
+        sns.heatmap(table, annot=True, fmt='.2f', cmap=spec['color'], center=spec.get('center'),
+                    linewidths=0.5, ax=plt.gca())
+    elif spec['kind'] == 'pie':
+        counts = pd.Series(data['values'], index=data['labels'])
+        plt.pie(counts.values, labels=counts.index, autopct='%1.1f%%',
+                startangle=spec.get('startangle', 90), colors=spec['color'])
+    else:
+        counts = pd.Series(data['values'], index=data['labels'])
+        counts.plot(kind=spec['kind'], color=spec['color'], edgecolor='black', ax=plt.gca())
+    plt.title(spec['title'], fontsize=14, fontweight='bold')
+    if spec.get('xlabel'):
+        plt.xlabel(spec['xlabel'], fontsize=12)
+    if spec.get('ylabel'):
+        plt.ylabel(spec['ylabel'], fontsize=12)
+    if 'xticks_rotation' in spec:
+        plt.xticks(rotation=spec['xticks_rotation'], ha=spec.get('xticks_ha', 'center'))
+    plt.tight_layout()
+    tmp_path = Path(path).with_name(Path(path).stem + '.tmp.png')
+    plt.savefig(tmp_path, dpi=style['dpi'], bbox_inches='tight')
+    plt.close()
+    os.replace(tmp_path, path)
+    return str(path)
+
+@traced()
+def render_charts(specs, fig_dir=FIG_DIR, workers=None, style=DEFAULT_STYLE):
+    """チャート定義のリストを描画し、定義の順に (パス, 描画したか) を返す
+
+    前回と内容のハッシュが同じで出力ファイルが残っているグラフは描画しない。
+    描画が必要なグラフが2枚以上あれば、1枚ずつプロセスプールのワーカーに割り当てる。
+    """
+    fig_dir = Path(fig_dir)
+    fig_dir.mkdir(exist_ok=True)
+    manifest = _read_manifest(fig_dir)
+
+    hashes = {spec['file']: chart_hash(spec, style) for spec in specs}
+    pending = [spec for spec in specs
+               if manifest.get(spec['file']) != hashes[spec['file']] or not (fig_dir / spec['file']).exists()]
+
+    if len(pending) > 1 and workers != 1:
+        n_workers = min(len(pending), workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [pool.submit(render_chart, spec, fig_dir / spec['file'], style) for spec in pending]
+            for future in futures:
+                future.result()
+    else:
+        for spec in pending:
+            render_chart(spec, fig_dir / spec['file'], style)
+
+    if pending:
+        manifest.update({spec['file']: hashes[spec['file']] for spec in pending})
+        _write_manifest(fig_dir, manifest)
+
+    rendered = {spec['file'] for spec in pending}
+    return [(fig_dir / spec['file'], spec['file'] in rendered) for spec in specs]
+
+def draw_charts(charts, fig_dir=FIG_DIR, workers=None):
+    """(表示名, チャート定義) のリストを描画し、保存先を1行ずつ表示する"""
+    results = render_charts([spec for _, spec in charts], fig_dir, workers)
+    for (label, _), (path, rendered) in zip(charts, results):
+        print(f"✓ {label}: {path}" + ("" if rendered else "（変更なし）"))
+    return results
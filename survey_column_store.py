@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+辞書エンコードした列ストア（メモリマップで共有）
+列ごとに回答値を小さな整数コード（.npy）と語彙（.npy、UTF-8のバイト列と各値の開始位置）に分け、
+複数選択の列は選択肢ごとのビット列（64bit単位）の行列にして保存する。
+読み込みは読み取り専用のメモリマップで、使う列だけを開くため、複数のワーカープロセスが
+同じページキャッシュを共有し、起動時間は触った列の量だけになる
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from survey_indicators import build_indicators
+from survey_loader import CACHE_DIR, CSV_PATH, file_fingerprint, load_survey
+from survey_schema import COLUMNS, MULTI_CHOICE_KEYS, schema_fingerprint
+from survey_segment_index import Bitset
+from survey_trace import traced
+
+# ストアの形式を変えたときに上げる
+STORE_VERSION = 2
+
+MANIFEST_NAME = "manifest.json"
+
+def store_path_for(csv_path, cache_dir=CACHE_DIR):
+    """元ファイルごとのストアのディレクトリ"""
+    key = hashlib.sha256(str(Path(csv_path).resolve()).encode('utf-8')).hexdigest()[:16]
+    return Path(cache_dir) / f"{key}.store"
+
+def _code_dtype(n_values):
+    """語彙の数に収まる最小の符号付き整数型（欠損は-1）"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_values < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+def _save_strings(directory, stem, values):
+    """文字列のリストを (開始位置, UTF-8のバイト列) の2つの.npyで保存する
+
+    固定長の文字列配列は最も長い値の幅×件数になり、タイムスタンプ・ユーザーID・自由記述のように
+    ほぼ全行で値が異なる列では行数に比例して大きくなるため、値をつなげたバイト列で持つ。
+    """
+    encoded = [str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return {'offsets': _save(directory, f"{stem}.offsets.npy", offsets),
+            'data': _save(directory, f"{stem}.utf8.npy", data)}
+
+def _encode(series):
+    """列を (コード, 語彙, 型の名前, 順序付きか) にする（型の名前はcolumn()で元の型に戻すのに使う）"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes, values = series.cat.codes.to_numpy(), series.cat.categories
+        return codes, values, 'category', bool(series.cat.ordered)
+    codes, values = pd.factorize(series)
+    return codes, values, str(series.dtype), False
+
+def _save(directory, name, array):
+    np.save(directory / name, np.ascontiguousarray(array), allow_pickle=False)
+    return name
+
+@traced()
+def export_store(df, store_dir, indicators=None, source=None):
+    """DataFrameを列ストアとして書き出す（一時ディレクトリに書いてから置き換える）
+
+    source: 元ファイルの情報（file_fingerprintの戻り値）。open_storeの鮮度の確認に使う
+    """
+    store_dir = Path(store_dir)
+    tmp_dir = store_dir.with_name(f"{store_dir.name}.tmp{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    try:
+        columns = []
+        for i, col in enumerate(df.columns):
+            codes, values, dtype, ordered = _encode(df[col])
+            columns.append({
+                'name': col,
+                'dtype': dtype,
+                'ordered': ordered,
+                'codes': _save(tmp_dir, f"c{i:03d}.codes.npy", codes.astype(_code_dtype(len(values)))),
+                'vocab': _save_strings(tmp_dir, f"c{i:03d}.vocab", values),
+            })
+
+        if indicators is None:
+            indicators = build_indicators(df)
+        multi = {}
+        for i, key in enumerate(MULTI_CHOICE_KEYS):
+            col = COLUMNS[key]
+            if col not in indicators:
+                continue
+            matrix = indicators[col]
+            # 選択肢ごとにBitsetと同じ並び（1行1ビット、64bit単位で末尾は0）に詰める
+            n_words = (len(df) + 63) // 64
+            bits = np.zeros((matrix.shape[1], n_words), dtype=np.uint64)
+            for j, column in enumerate(matrix.to_numpy().T):
+                bits[j] = Bitset.from_mask(column > 0).words
+            multi[col] = {
+                'key': key,
+                'options': _save_strings(tmp_dir, f"m{i:03d}.options", matrix.columns),
+                'bits': _save(tmp_dir, f"m{i:03d}.bits.npy", bits),
+            }
+
+        manifest = {
+            'version': STORE_VERSION,
+            'schema': schema_fingerprint(),
+            'n_rows': len(df),
+            'columns': columns,
+            'multi': multi,
+            'source': source,
+        }
+        (tmp_dir / MANIFEST_NAME).write_text(json.dumps(manifest, ensure_ascii=False, indent=1), encoding='utf-8')
+        shutil.rmtree(store_dir, ignore_errors=True)
+        os.replace(tmp_dir, store_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return store_dir
+
+class ColumnStore:
+    """メモリマップで開いた列ストア（列・語彙は最初に使ったときに開く）
+
+    パスだけをワーカープロセスに渡し、各プロセスで開き直して使う（DataFrameをpickleしない）。
+    """
+
+    def __init__(self, store_dir):
+        self.path = Path(store_dir)
+        with open(self.path / MANIFEST_NAME, encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != STORE_VERSION:
+            raise ValueError(f"列ストアの形式が異なります: {self.path}")
+        self.n_rows = self.manifest['n_rows']
+        self.specs = {spec['name']: spec for spec in self.manifest['columns']}
+        self.columns = list(self.specs)
+        self._arrays = {}
+        self._strings = {}
+
+    def __getstate__(self):
+        # プロセス間ではパスだけを渡す
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def _array(self, name):
+        array = self._arrays.get(name)
+        if array is None:
+            array = self._arrays[name] = np.load(self.path / name, mmap_mode='r', allow_pickle=False)
+        return array
+
+    def _string_list(self, spec):
+        """_save_stringsで保存した文字列のリスト（最初に使ったときに一度だけデコードする）"""
+        values = self._strings.get(spec['data'])
+        if values is None:
+            offsets = self._array(spec['offsets']).tolist()
+            data = self._array(spec['data']).tobytes() if offsets[-1] else b''
+            values = self._strings[spec['data']] = [data[start:end].decode('utf-8')
+                                                    for start, end in zip(offsets[:-1], offsets[1:])]
+        return values
+
+    def codes(self, col):
+        """列の整数コード（読み取り専用のメモリマップ。欠損は-1）"""
+        return self._array(self.specs[col]['codes'])
+
+    def vocab(self, col):
+        """列の語彙（コード → 回答値のリスト）"""
+        return self._string_list(self.specs[col]['vocab'])
+
+    def column(self, col):
+        """列をload_surveyと同じ型のSeriesに戻す（カテゴリ以外は書き出したときの型に戻す）"""
+        spec = self.specs[col]
+        codes = np.asarray(self.codes(col), dtype=np.int64)
+        vocab = self.vocab(col)
+        if spec['dtype'] == 'category':
+            values = pd.Categorical.from_codes(codes, categories=vocab, ordered=spec['ordered'])
+            return pd.Series(values, name=col)
+        decoded = np.array(vocab + [np.nan], dtype=object)[codes]
+        return pd.Series(decoded, name=col, dtype=object).astype(spec['dtype'])
+
+    @traced()
+    def frame(self, columns=None):
+        """指定した列（省略時は全列）のDataFrame"""
+        columns = self.columns if columns is None else [col for col in self.columns if col in columns]
+        return pd.DataFrame({col: self.column(col) for col in columns})
+
+    def option_bitsets(self, col):
+        """複数選択の列の {選択肢: Bitset}（ビット列はメモリマップをそのまま参照する）"""
+        spec = self.manifest['multi'].get(col)
+        if spec is None:
+            return {}
+        bits = self._array(spec['bits'])
+        return {option: Bitset(bits[j], self.n_rows) for j, option in enumerate(self._string_list(spec['options']))}
+
+    def indicators(self, columns=None):
+        """build_indicatorsと同じ形（列名 -> 0/1行列のDataFrame）"""
+        result = {}
+        for col, spec in self.manifest['multi'].items():
+            if columns is not None and col not in columns:
+                continue
+            bits = self._array(spec['bits'])
+            matrix = np.unpackbits(np.ascontiguousarray(bits).view(np.uint8), axis=1,
+                                   count=self.n_rows, bitorder='little').T
+            options = pd.Index(self._string_list(spec['options']), dtype=object)
+            result[col] = pd.DataFrame(np.ascontiguousarray(matrix), columns=options)
+        return result
+
+    def nbytes(self):
+        """ストアのファイルサイズの合計"""
+        return sum(path.stat().st_size for path in self.path.iterdir())
+
+def _is_fresh(manifest, csv_path):
+    """ストアが元ファイル・スキーマと一致しているか（更新時刻が違えば内容ハッシュで判定）"""
+    source = manifest.get('source') or {}
+    if manifest.get('version') != STORE_VERSION or manifest.get('schema') != schema_fingerprint():
+        return False
+    stat = os.stat(csv_path)
+    if source.get('size') != stat.st_size:
+        return False
+    return source.get('mtime_ns') == stat.st_mtime_ns or source.get('sha256') == file_fingerprint(csv_path)['sha256']
+
+@traced()
+def open_store(csv_path=CSV_PATH, cache_dir=CACHE_DIR):
+    """元ファイルの列ストアを開く（ないか古い場合はload_surveyで読み込んで作成する）"""
+    csv_path = Path(csv_path)
+    store_dir = store_path_for(csv_path, cache_dir)
+    try:
+        store = ColumnStore(store_dir)
+        if _is_fresh(store.manifest, csv_path):
+            return store
+    except (OSError, ValueError, KeyError):
+        pass
+    df = load_survey(csv_path, cache_dir=cache_dir)
+    export_store(df, store_dir, source=file_fingerprint(csv_path))
+    return ColumnStore(store_dir)
+
+def main():
+    """列ストアを作成し、列ごとのサイズと読み込み時間を表示する"""
+    parser = argparse.ArgumentParser(description="辞書エンコードした列ストアの作成")
+    parser.add_argument('--csv', type=Path, default=CSV_PATH, help="アンケートのCSV")
+    parser.add_argument('--output', type=Path, default=None, help="ストアの保存先（省略時はキャッシュ）")
+    args = parser.parse_args()
+
+    if args.output:
+        df = load_survey(args.csv)
+        store = ColumnStore(export_store(df, args.output, source=file_fingerprint(args.csv)))
+    else:
+        store = open_store(args.csv)
+    print(f"✓ 列ストア: {store.path}（{store.n_rows}件, {len(store.columns)}列, {store.nbytes() / 1024:.0f}KB）")
+    for spec in store.manifest['columns']:
+        print(f"  {store.codes(spec['name']).dtype}  語彙{len(store.vocab(spec['name'])):>6}  {spec['name'][:40]}")
+    start = time.perf_counter()
+    ColumnStore(store.path).frame()
+    print(f"全列の読み込み: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+複数選択（[MA]）設問の選択肢の共起（設問内・設問間）
+回答者×（選択肢・設問への回答有無）の0/1行列Xを、設問ごとに
+「回答者→回答の組み合わせ」（1行に1つだけ1の疎行列。実体は組み合わせのコード）と
+「組み合わせ→（選択肢, 回答有無）」の小さな0/1行列の積に分けて持ち、Xᵀ·diag(w)·X を
+設問の組ごとの「組み合わせ×組み合わせ」の人数の表（コードのbincount）を挟んだ小さな行列積で求める。
+選択肢×選択肢の共起件数と、分母になる「両方の設問に回答した人」の人数がまとめて求まり、
+行数に比例するのは設問ごとのコードの配列だけになる。セグメントのマスク・ウェイトはbincountに反映する
+
+Jaccard・リフトは、2つの選択肢の設問の両方に回答した人の中で求める
+（短期プラン加入者だけに聞いた設問など、分岐のある設問の組み合わせでも比べられる）。
+"""
+
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from survey_indicators import build_indicator_matrix
+from survey_schema import COLUMNS, MULTI_CHOICE_KEYS
+from survey_trace import traced
+
+# 設問の表示名
+QUESTION_LABELS = {
+    'join_reason': '加入理由',
+    'channel': '認知経路',
+    'switch_trigger': '切り替えのきっかけ',
+    'hesitation': '迷った点',
+    'year_plan_reason': '1年契約の決め手',
+    'cancel_reason': '解約理由',
+}
+
+# 共起の組み合わせとして挙げる最小件数
+MIN_COUNT = 5
+
+PAIR_COLUMNS = ['設問A', '選択肢A', '設問B', '選択肢B', '件数', '母数', 'Jaccard', 'リフト']
+
+# グラフにする設問の組み合わせ: (ファイル名, 設問A, 設問B)
+CHART_PAIRS = [
+    ('cooccurrence_reason_channel.png', 'join_reason', 'channel'),
+    ('cooccurrence_reason_year_plan.png', 'join_reason', 'year_plan_reason'),
+]
+
+def _combinations(series):
+    """複数選択の列を (行ごとの回答の組み合わせのコード, 組み合わせ) にする（欠損は-1）"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy().astype(np.int64), pd.Index(series.cat.categories, dtype=object)
+    codes, values = pd.factorize(series)
+    return codes.astype(np.int64), pd.Index(values, dtype=object)
+
+@dataclass
+class Cooccurrence:
+    """選択肢×選択肢の共起
+
+    labels:   行・列の (設問のキー, 選択肢)
+    counts:   共起件数（対角は選択肢の件数）
+    exposure: 選択肢×設問。その設問に回答した人のうち、選択肢を選んだ人数
+    answered: 設問×設問。両方の設問に回答した人数
+    """
+
+    keys: list
+    labels: list
+    counts: np.ndarray
+    exposure: np.ndarray
+    answered: np.ndarray
+
+    def _index(self):
+        return pd.MultiIndex.from_tuples([(QUESTION_LABELS.get(key, key), option) for key, option in self.labels],
+                                         names=['設問', '選択肢'])
+
+    def _bases(self):
+        """組み合わせごとの (Aの件数, Bの件数, 母数)（いずれも両方の設問に回答した人の中）"""
+        question = np.array([self.keys.index(key) for key, _ in self.labels], dtype=np.intp)
+        count_a = self.exposure[:, question]
+        count_b = count_a.T
+        base = self.answered[question][:, question]
+        return count_a, count_b, base
+
+    def _frame(self, values):
+        index = self._index()
+        return pd.DataFrame(values, index=index, columns=index)
+
+    def count_frame(self):
+        """共起件数の表"""
+        return self._frame(self.counts)
+
+    def jaccard(self):
+        """Jaccard係数（両方を選んだ人 / どちらかを選んだ人。同じ選択肢同士はnan）"""
+        count_a, count_b, _ = self._bases()
+        union = count_a + count_b - self.counts
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.where(union > 0, self.counts / union, np.nan)
+        np.fill_diagonal(values, np.nan)
+        return self._frame(values)
+
+    def lift(self):
+        """リフト（両方を選ぶ割合 / それぞれを選ぶ割合の積。同じ選択肢同士はnan）"""
+        count_a, count_b, base = self._bases()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.where((count_a > 0) & (count_b > 0), self.counts * base / (count_a * count_b), np.nan)
+        np.fill_diagonal(values, np.nan)
+        return self._frame(values)
+
+    def block(self, key_a, key_b, measure='lift'):
+        """設問Aの選択肢（行）×設問Bの選択肢（列）の部分（measure: 'count' / 'jaccard' / 'lift'）"""
+        frames = {'count': self.count_frame, 'jaccard': self.jaccard, 'lift': self.lift}
+        if measure not in frames:
+            raise ValueError(f"不明な指標: {measure}（{', '.join(frames)}）")
+        table = frames[measure]()
+        return table.loc[QUESTION_LABELS.get(key_a, key_a), QUESTION_LABELS.get(key_b, key_b)]
+
+    def pairs(self, min_count=MIN_COUNT, within=True):
+        """選択肢の組み合わせの縦持ちの表（列: PAIR_COLUMNS。withinがFalseなら設問間のみ）"""
+        count_a, count_b, base = self._bases()
+        jaccard = self.jaccard().to_numpy()
+        lift = self.lift().to_numpy()
+        first, second = np.triu_indices(len(self.labels), k=1)
+        selected = self.counts[first, second] >= min_count
+        if not within:
+            selected &= np.array([self.labels[i][0] != self.labels[j][0] for i, j in zip(first, second)], dtype=bool)
+        first, second = first[selected], second[selected]
+        return pd.DataFrame({
+            '設問A': [QUESTION_LABELS.get(self.labels[i][0], self.labels[i][0]) for i in first],
+            '選択肢A': [self.labels[i][1] for i in first],
+            '設問B': [QUESTION_LABELS.get(self.labels[j][0], self.labels[j][0]) for j in second],
+            '選択肢B': [self.labels[j][1] for j in second],
+            '件数': self.counts[first, second],
+            '母数': base[first, second],
+            'Jaccard': jaccard[first, second],
+            'リフト': lift[first, second],
+        }, columns=PAIR_COLUMNS)
+
+def _combination_table(series, indicator=None):
+    """複数選択の列を (行ごとの組み合わせのコード, 組み合わせ×（選択肢, 回答有無）の0/1行列, 選択肢) にする
+
+    欠損は末尾の組み合わせ（全て0の行）に割り当てる。indicator（build_indicatorsの列）を渡すと、
+    組み合わせごとの選択肢をインジケータ行列の代表の行から取り、回答を分割し直さない。
+    """
+    codes, combinations = _combinations(series)
+    n_combinations = len(combinations)
+    if indicator is None:
+        matrix = build_indicator_matrix(pd.Series(combinations, dtype=object))
+        values, options = matrix.to_numpy(), matrix.columns
+    else:
+        # 組み合わせごとの代表の行（最初に現れた行）。行のない組み合わせは0行のまま
+        first = np.full(n_combinations, -1, dtype=np.intp)
+        rows = np.flatnonzero(codes >= 0)
+        first[codes[rows[::-1]]] = rows[::-1]
+        values = np.zeros((n_combinations, indicator.shape[1]), dtype=np.uint8)
+        values[first >= 0] = indicator.to_numpy()[first[first >= 0]]
+        options = indicator.columns
+    table = np.zeros((n_combinations + 1, len(options) + 1), dtype=np.uint8)
+    table[:n_combinations, :-1] = values
+    table[:n_combinations, -1] = 1
+    return np.where(codes >= 0, codes, n_combinations), table, options
+
+@traced()
+def cooccurrence(df, keys=MULTI_CHOICE_KEYS, mask=None, weights=None, indicators=None):
+    """複数選択の設問の選択肢×選択肢の共起を求める
+
+    mask:       対象の回答者（セグメントのブールマスク。省略時は全員）
+    weights:    行ごとのウェイト（指定すると件数はウェイトの合計）
+    indicators: build_indicatorsの戻り値（指定すると組み合わせごとの選択肢をそこから取る）
+    """
+    keys = [key for key in keys if COLUMNS[key] in df.columns]
+    selected = None if mask is None else np.asarray(mask, dtype=bool)
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        if selected is not None:
+            weights = weights[selected]
+    # 重みがなければ件数は整数のまま求める
+    dtype = np.int64 if weights is None else float
+
+    tables, labels = [], []
+    for key in keys:
+        col = COLUMNS[key]
+        codes, table, options = _combination_table(df[col], None if indicators is None else indicators.get(col))
+        tables.append((codes if selected is None else codes[selected], table.astype(dtype)))
+        labels.extend((key, option) for option in options)
+    starts = np.cumsum([0] + [table.shape[1] - 1 for _, table in tables])
+
+    n_options, n_keys = len(labels), len(keys)
+    counts = np.zeros((n_options, n_options), dtype=dtype)
+    exposure = np.zeros((n_options, n_keys), dtype=dtype)
+    answered = np.zeros((n_keys, n_keys), dtype=dtype)
+    for a, (codes_a, table_a) in enumerate(tables):
+        for b in range(a, n_keys):
+            codes_b, table_b = tables[b]
+            n_a, n_b = len(table_a), len(table_b)
+            if a == b:
+                sizes = np.bincount(codes_a, weights=weights, minlength=n_a)
+                block = table_a.T @ (sizes[:, None] * table_a)
+            else:
+                # 設問A・Bの組み合わせ×組み合わせの人数（1行に1つだけ1の疎行列同士の積）
+                joint = np.bincount(codes_a * n_b + codes_b, weights=weights, minlength=n_a * n_b)
+                block = table_a.T @ joint.reshape(n_a, n_b) @ table_b
+            for i, j, values in ((a, b, block), (b, a, block.T)):
+                counts[starts[i]:starts[i + 1], starts[j]:starts[j + 1]] = values[:-1, :-1]
+                exposure[starts[i]:starts[i + 1], j] = values[:-1, -1]
+                answered[i, j] = values[-1, -1]
+    return Cooccurrence(keys, labels, counts, exposure, answered)
+
+def matrix_data(table, digits=2):
+    """表をチャート定義に入れられる形（行・列のラベル、値のリスト）に変換する"""
+    values = np.round(table.to_numpy(dtype=float), digits)
+    return {
+        'rows': [str(label) for label in table.index],
+        'columns': [str(label) for label in table.columns],
+        'values': [[None if np.isnan(value) else float(value) for value in row] for row in values],
+    }
+
+def cooccurrence_charts(result, pairs=CHART_PAIRS, measure='lift'):
+    """設問の組み合わせごとのリフト（またはJaccard）のヒートマップの (表示名, チャート定義) のリスト"""
+    from survey_charts import heatmap
+
+    charts = []
+    title = 'リフト' if measure == 'lift' else 'Jaccard'
+    for file, key_a, key_b in pairs:
+        if key_a not in result.keys or key_b not in result.keys:
+            continue
+        table = result.block(key_a, key_b, measure)
+        name = f"{QUESTION_LABELS[key_a]}×{QUESTION_LABELS[key_b]}の共起"
+        charts.append((name, heatmap(file, matrix_data(table), f"{name}（{title}）", (12, 8),
+                                     'RdBu_r', center=1.0 if measure == 'lift' else None)))
+    return charts
+
+def main():
+    """複数選択の設問の共起（Jaccard・リフト）を表示し、ヒートマップを描く"""
+    from survey_charts import draw_charts
+    from survey_loader import CSV_PATH, load_survey
+    from survey_segments import SEGMENTS, segment_masks
+
+    parser = argparse.ArgumentParser(description="複数選択の設問の選択肢の共起（Jaccard・リフト）")
+    parser.add_argument('--csv', type=Path, default=CSV_PATH, help="アンケートのCSV")
+    parser.add_argument('--segment', choices=SEGMENTS, default='all', help="対象のセグメント")
+    parser.add_argument('--top', type=int, default=20, help="表示する組み合わせの件数（リフトの大きい順）")
+    parser.add_argument('--min-count', type=int, default=MIN_COUNT, help="組み合わせの最小件数")
+    parser.add_argument('--output', type=Path, default=None, help="全ての組み合わせ（CSV）の保存先")
+    parser.add_argument('--no-charts', action='store_true', help="ヒートマップを作成しない")
+    args = parser.parse_args()
+
+    df = load_survey(args.csv)
+    mask = segment_masks(df)[args.segment]
+    result = cooccurrence(df, mask=mask)
+    pairs = result.pairs(args.min_count)
+    print(f"対象: {int(mask.sum())}人、選択肢: {len(result.labels)}、組み合わせ（{args.min_count}件以上）: {len(pairs)}")
+    for title, within in (("設問間", False), ("設問内・設問間", True)):
+        shown = pairs if within else pairs[pairs['設問A'] != pairs['設問B']]
+        print(f"\n【{title}の共起（リフトの大きい順）】")
+        shown = shown.sort_values(['リフト', '件数'], ascending=[False, False], kind='stable').head(args.top)
+        print(shown.round(3).to_string(index=False) if len(shown) else "  なし")
+    if args.output:
+        pairs.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"\n✓ 共起の表を保存: {args.output}")
+    if not args.no_charts:
+        draw_charts(cooccurrence_charts(result))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+属性×設問のクロス集計エンジン
+属性ごとに1回だけコード化し、全設問（単一選択・複数選択）の件数をまとめて集計する
+結果は縦持ちの表（属性, 属性値, 設問, 選択肢, 件数, 母数, 割合）で返す
+"""
+
+import numpy as np
+import pandas as pd
+
+from survey_schema import COLUMNS, MULTI_CHOICE_KEYS, SCHEMA, SINGLE_CHOICE_KEYS
+from survey_trace import traced
+
+# 属性定義
+ATTRIBUTES = {
+    '年代': COLUMNS['age'],
+    '性別': COLUMNS['gender'],
+    '地域': COLUMNS['region'],
+    '登山歴': COLUMNS['history'],
+    '登山頻度': COLUMNS['frequency']
+}
+
+# 分析対象の設問（表示名: (列名, 複数選択かどうか)）
+QUESTIONS = {
+    '加入理由': (COLUMNS['join_reason'], True),
+    '加入タイミング': (COLUMNS['join_timing'], False),
+    '認知経路': (COLUMNS['channel'], True),
+    '感じた価値・便益': (COLUMNS['benefit'], False),
+    '決め手となった情報': (COLUMNS['decision'], False),
+}
+
+# 設問の表示名（キー → 表示名）
+QUESTION_LABELS = {
+    'age': '年代',
+    'gender': '性別',
+    'region': '地域',
+    'history': '登山歴',
+    'frequency': '登山頻度',
+    'join_timing': '加入タイミング',
+    'first_insurance': '初めての登山保険か',
+    'status': '加入状況',
+    'ease': '加入手続きの簡単さ',
+    'recommend': '推奨意向',
+    'join_reason': '加入理由',
+    'channel': '認知経路',
+    'benefit': '感じた価値・便益',
+    'decision': '決め手となった情報',
+    'switch_trigger': '切り替えのきっかけ',
+    'switch_timing': '切り替えた時期',
+    'hesitation': '迷った点',
+    'future_intention': '1年契約への切り替え意向',
+    'year_plan_reason': '1年契約の決め手',
+    'cancel_reason': '解約理由',
+}
+
+# 集計値・Excelのクロス集計に含める全ての単一選択・複数選択の設問（スキーマの順）
+ALL_QUESTIONS = {
+    QUESTION_LABELS[key]: (COLUMNS[key], SCHEMA[key]['kind'] == 'multi')
+    for key in SCHEMA if key in SINGLE_CHOICE_KEYS + MULTI_CHOICE_KEYS
+}
+
+CROSSTAB_COLUMNS = ['属性', '属性値', '設問', '選択肢', '件数', '母数', '割合']
+SEGMENT_COLUMNS = ['属性', '属性値', '母数']
+
+def _factorize(series):
+    """値を出現順の整数コードに変換する（欠損は-1）"""
+    codes, uniques = pd.factorize(series)
+    return codes, pd.Index(uniques, dtype=object)
+
+def _bincount(codes, minlength, weights=None):
+    """コードごとの件数（weightsがあればウェイトの合計）"""
+    return np.bincount(codes, weights=weights, minlength=minlength)
+
+def segment_sizes(df, attributes=ATTRIBUTES, weights=None):
+    """属性値ごとの人数（出現順。weights: 行ごとのウェイト）"""
+    frames = []
+    for attr_name, attr_col in attributes.items():
+        if attr_col not in df.columns:
+            continue
+        codes, values = _factorize(df[attr_col])
+        valid = codes >= 0
+        sizes = _bincount(codes[valid], len(values), None if weights is None else weights[valid])
+        frames.append(pd.DataFrame({'属性': attr_name, '属性値': values, '母数': sizes}))
+    if not frames:
+        return pd.DataFrame(columns=SEGMENT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def _single_choice_counts(attr_codes, n_values, answers, weights=None):
+    """単一選択の設問: 属性値×選択肢の件数行列"""
+    answer_codes, options = _factorize(answers)
+    valid = (attr_codes >= 0) & (answer_codes >= 0)
+    flat = attr_codes[valid].astype(np.int64) * len(options) + answer_codes[valid]
+    counts = _bincount(flat, n_values * len(options), None if weights is None else weights[valid])
+    return counts.reshape(n_values, len(options)), options
+
+def _multi_choice_counts(attr_codes, n_values, matrix, weights=None):
+    """複数選択の設問: インジケータ行列を属性値ごとに列和する"""
+    valid = attr_codes >= 0
+    values = matrix.to_numpy()[valid]
+    if weights is not None:
+        values = values * weights[valid][:, None]
+    grouped = pd.DataFrame(values).groupby(attr_codes[valid]).sum()
+    counts = np.zeros((n_values, matrix.shape[1]), dtype=np.int64 if weights is None else float)
+    counts[grouped.index.to_numpy()] = grouped.to_numpy()
+    return counts, matrix.columns
+
+def _tidy(attr_name, values, sizes, question, counts, options):
+    """件数行列を縦持ちにし、各属性値の中で件数の多い順に並べる"""
+    value_idx, option_idx = np.nonzero(counts)
+    table = pd.DataFrame({
+        '属性': attr_name,
+        '属性値': values[value_idx],
+        '設問': question,
+        '選択肢': options[option_idx],
+        '件数': counts[value_idx, option_idx],
+        '母数': sizes[value_idx],
+        '_value': value_idx,
+    })
+    return table.sort_values(['_value', '件数'], ascending=[True, False], kind='stable')
+
+@traced()
+def compute_crosstabs(df, indicators, attributes=ATTRIBUTES, questions=QUESTIONS, weights=None):
+    """全属性×設問のクロス集計を縦持ちの表で返す（行数に対して線形。weightsがあれば件数はウェイトの合計）
+
+    属性と同じ列の設問（年代×年代など）は集計しない。
+    """
+    frames = []
+    for attr_name, attr_col in attributes.items():
+        if attr_col not in df.columns:
+            continue
+        attr_codes, values = _factorize(df[attr_col])
+        valid = attr_codes >= 0
+        sizes = _bincount(attr_codes[valid], len(values), None if weights is None else weights[valid])
+
+        attr_frames = []
+        for question, (col, is_multi) in questions.items():
+            if col == attr_col:
+                continue
+            if is_multi:
+                if col not in indicators:
+                    continue
+                counts, options = _multi_choice_counts(attr_codes, len(values), indicators[col], weights)
+            else:
+                if col not in df.columns:
+                    continue
+                counts, options = _single_choice_counts(attr_codes, len(values), df[col], weights)
+            attr_frames.append(_tidy(attr_name, values, sizes, question, counts, options))
+        if attr_frames:
+            # 属性値 → 設問 → 件数の多い順に並べる
+            frames.append(pd.concat(attr_frames, ignore_index=True).sort_values('_value', kind='stable'))
+
+    if not frames:
+        return pd.DataFrame(columns=CROSSTAB_COLUMNS)
+    table = pd.concat(frames, ignore_index=True).drop(columns='_value')
+    table['割合'] = table['件数'] / table['母数'] * 100
+    return table[CROSSTAB_COLUMNS]
+
+def top_options(crosstab, attr_name, attr_value, question, n=None):
+    """クロス集計表から1セル分（属性値×設問）の選択肢別件数を取り出す"""
+    rows = crosstab[(crosstab['属性'] == attr_name) & (crosstab['属性値'] == attr_value)
+                    & (crosstab['設問'] == question)]
+    counts = pd.Series(rows['件数'].to_numpy(), index=rows['選択肢'].to_numpy())
+    return counts if n is None else counts.head(n)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Excelレポートの書き出し
+openpyxlの書き込み専用モード（行ごとに一時ファイルへ書き出す）でシートを順に作成するため、
+行数やシート数が増えてもメモリ使用量はほぼ一定になる
+属性×設問のクロス集計は、組み合わせごとに件数と割合のシートを作成する
+"""
+
+from survey_trace import traced
+
+# 割合の列の表示形式
+PERCENT_FORMAT = '0.0'
+
+# シート名に使えない文字と最大長
+INVALID_SHEET_CHARS = '[]:*?/\\'
+MAX_SHEET_NAME = 31
+
+def sheet_name(name, used):
+    """Excelで使えるシート名にする（使えない文字は置き換え、31文字まで、重複は連番）"""
+    name = ''.join('_' if ch in INVALID_SHEET_CHARS else ch for ch in name)[:MAX_SHEET_NAME]
+    base, i = name, 2
+    while name in used:
+        suffix = f"_{i}"
+        name = base[:MAX_SHEET_NAME - len(suffix)] + suffix
+        i += 1
+    used.add(name)
+    return name
+
+def display_count(value):
+    """件数を表示用の整数にする（ウェイト付きの小数の件数は四捨五入。欠損はそのまま）"""
+    if value is None or value != value:
+        return value
+    return int(round(value))
+
+def frame_rows(df, percent_columns=(), count_columns=()):
+    """DataFrameを (見出し行, データ行...) に変換する
+
+    percent_columnsの列は割合の表示形式、count_columnsの列は件数（display_countで整数に丸める）。
+    """
+    yield list(df.columns), ()
+    percent = {i for i, col in enumerate(df.columns) if col in percent_columns}
+    counts = {i for i, col in enumerate(df.columns) if col in count_columns}
+    for row in df.itertuples(index=False):
+        values = [value.item() if hasattr(value, 'item') else value for value in row]
+        yield [display_count(value) if i in counts else value for i, value in enumerate(values)], percent
+
+def crosstab_sheets(crosstab, segment_table):
+    """属性×設問ごとの (シート名, 行) を返す
+
+    行は属性値ごとで、選択肢の件数の表の下に同じ並びの割合（%）の表を置く。
+    選択肢は属性値をまとめた件数の多い順、属性値は母数の表の順（回答のない属性値も含む）。
+    ウェイト付きの件数（小数）は件数の表では四捨五入して表示し、割合は丸める前の値から求める。
+    """
+    sizes = {}
+    for attr, value, size in segment_table.itertuples(index=False):
+        sizes.setdefault(attr, {})[value] = size.item() if hasattr(size, 'item') else size
+
+    for (attr, question), cell in crosstab.groupby(['属性', '設問'], sort=False):
+        counts = cell.pivot_table(index='属性値', columns='選択肢', values='件数', aggfunc='sum', sort=False)
+        options = list(counts.sum().sort_values(ascending=False, kind='stable').index)
+        values = list(sizes.get(attr, dict.fromkeys(counts.index)))
+        counts = counts.reindex(index=values, columns=options).fillna(0)
+
+        def rows(counts=counts, attr=attr, options=options):
+            yield [attr, '母数', *options], ()
+            for value, row in counts.iterrows():
+                yield [value, display_count(sizes.get(attr, {}).get(value)),
+                       *[display_count(count) for count in row.tolist()]], ()
+            yield [], ()
+            yield [f"{attr}（割合%）", '母数', *options], ()
+            percent = set(range(2, 2 + len(options)))
+            for value, row in counts.iterrows():
+                size = sizes.get(attr, {}).get(value) or 0
+                yield [value, display_count(size),
+                       *[count / size * 100 if size else None for count in row.tolist()]], percent
+
+        yield f"{attr}×{question}", rows()
+
+@traced()
+def write_workbook(path, sheets):
+    """(シート名, 行のイテレータ) のリストをExcelに書き出す（行は (値のリスト, 割合の列番号の集合)）"""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    workbook = Workbook(write_only=True)
+    used = set()
+    for name, rows in sheets:
+        sheet = workbook.create_sheet(sheet_name(name, used))
+        for values, percent in rows:
+            if percent:
+                values = list(values)
+                for i in percent:
+                    cell = WriteOnlyCell(sheet, value=values[i])
+                    cell.number_format = PERCENT_FORMAT
+                    values[i] = cell
+            sheet.append(values)
+    workbook.save(path)
+    return path
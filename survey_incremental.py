@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+差分更新（インクリメンタル集計）
+前回までの集計値を、処理済みのバイト位置と最後のタイムスタンプ（ウォーターマーク）と一緒に保存し、
+次回は追記された行だけを集計して足し込む
+"""
+
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+import pandas as pd
+
+from survey_aggregates import DEFAULT_CHUNKSIZE, SurveyAggregates
+from survey_loader import CACHE_DIR, CSV_PATH
+from survey_schema import COLUMNS, STRING_COLUMNS, apply_schema, schema_fingerprint
+from survey_timeseries import TIMESTAMP_FORMAT
+from survey_trace import traced
+
+# 状態ファイルの形式を変えたときに上げる
+STATE_VERSION = 3
+
+# 追記かどうかの確認に使う、先頭・処理済み末尾のバイト数
+CHECK_BYTES = 64 * 1024
+
+def state_path_for(csv_path, cache_dir=CACHE_DIR):
+    """元ファイルごとの状態ファイルのパス"""
+    key = hashlib.sha256(str(Path(csv_path).resolve()).encode('utf-8')).hexdigest()[:16]
+    return Path(cache_dir) / f"{key}.incremental.pkl"
+
+def _hash_range(path, start, end):
+    """ファイルの指定範囲のSHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(start)
+        digest.update(f.read(max(end - start, 0)))
+    return digest.hexdigest()
+
+def _anchors(path, offset):
+    """先頭と処理済み部分の末尾のハッシュ（追記のみかどうかの確認用）"""
+    return {
+        'head': _hash_range(path, 0, min(CHECK_BYTES, offset)),
+        'tail': _hash_range(path, max(offset - CHECK_BYTES, 0), offset),
+    }
+
+def _load_state(state_path):
+    try:
+        with open(state_path, 'rb') as f:
+            state = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if state.get('version') != STATE_VERSION or state.get('schema') != schema_fingerprint():
+        return None
+    return state
+
+def _save_state(state_path, state):
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_name(state_path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, state_path)
+
+def _is_append_only(state, csv_path):
+    """前回の処理以降、ファイルが末尾への追記だけで変化しているか"""
+    offset = state['offset']
+    if os.path.getsize(csv_path) < offset:
+        return False
+    return _anchors(csv_path, offset) == state['anchors']
+
+def _fold(agg, reader, watermark, strict=True):
+    """チャンクを集計に足し込み、ウォーターマークを更新する
+
+    strict=Trueの場合、ウォーターマークより前のタイムスタンプが現れたら追記ではない
+    （並べ替えなど）とみなしてFalseを返す。
+    """
+    for chunk in reader:
+        chunk = apply_schema(chunk)
+        parsed = pd.to_datetime(chunk[COLUMNS['timestamp']], format=TIMESTAMP_FORMAT, errors='coerce')
+        if strict and watermark is not None and (parsed < watermark).any():
+            return False, watermark
+        latest = parsed.max()
+        if not pd.isna(latest) and (watermark is None or latest > watermark):
+            watermark = latest
+        agg.merge(SurveyAggregates.from_frame(chunk))
+    return True, watermark
+
+def _full_recompute(csv_path, chunksize):
+    """先頭から全件を集計し、新しい状態を返す"""
+    agg = SurveyAggregates()
+    with open(csv_path, 'rb') as f:
+        with pd.read_csv(f, encoding='utf-8', dtype=STRING_COLUMNS, chunksize=chunksize) as reader:
+            _, watermark = _fold(agg, reader, None, strict=False)
+        offset = f.seek(0, os.SEEK_END)
+    columns = list(pd.read_csv(csv_path, encoding='utf-8', nrows=0).columns)
+    return {'aggregates': agg, 'watermark': watermark, 'offset': offset, 'columns': columns}
+
+@traced()
+def update_aggregates(csv_path=CSV_PATH, chunksize=DEFAULT_CHUNKSIZE, state_path=None, full=False):
+    """前回の集計に追記分だけを足し込んだ集計値を返す（戻り値: 集計値, 追加で処理した行数）
+
+    追記以外の変更（行の削除・並べ替え・先頭や処理済み末尾の書き換え）を検出した場合や
+    full=Trueの場合は、全件を集計し直す。
+    """
+    csv_path = Path(csv_path)
+    state_path = Path(state_path) if state_path else state_path_for(csv_path)
+    state = None if full else _load_state(state_path)
+
+    n_new = None
+    if state is not None and _is_append_only(state, csv_path):
+        if os.path.getsize(csv_path) == state['offset']:
+            # 新しい回答なし
+            return state['aggregates'], 0
+        agg = state['aggregates']
+        n_before = agg.n_rows
+        with open(csv_path, 'rb') as f:
+            f.seek(state['offset'])
+            with pd.read_csv(f, encoding='utf-8', header=None, names=state['columns'],
+                             dtype=STRING_COLUMNS, chunksize=chunksize) as reader:
+                appended, watermark = _fold(agg, reader, state['watermark'])
+            offset = f.seek(0, os.SEEK_END)
+        if appended:
+            state.update(aggregates=agg, watermark=watermark, offset=offset)
+            n_new = agg.n_rows - n_before
+
+    if n_new is None:
+        state = _full_recompute(csv_path, chunksize)
+        n_new = state['aggregates'].n_rows
+
+    state.update(version=STATE_VERSION, schema=schema_fingerprint(), source=str(csv_path),
+                 anchors=_anchors(csv_path, state['offset']))
+    _save_state(state_path, state)
+    return state['aggregates'], n_new
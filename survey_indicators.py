@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+複数選択（[MA]）設問の選択肢インジケータ行列
+回答を1行×選択肢の0/1行列に一度だけ展開し、任意のセグメントの選択肢別件数を
+マスク付きの列和で求める
+"""
+
+import numpy as np
+import pandas as pd
+
+from survey_schema import COLUMNS, MULTI_CHOICE_KEYS
+from survey_trace import traced
+
+# 複数選択の設問（カンマ区切りで回答が保存されている列）
+MULTI_SELECT_COLUMNS = [COLUMNS[key] for key in MULTI_CHOICE_KEYS]
+
+def split_multiple_choice(value):
+    """複数選択の回答を分割"""
+    if pd.isna(value):
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(',')]
+    return []
+
+def build_indicator_matrix(series):
+    """複数選択の列を選択肢ごとの0/1行列（uint8）に展開する
+
+    列の並びは選択肢が最初に現れた順（Categoricalの場合はカテゴリ順）。
+    文字列以外の値（欠損など）は全て0になる。
+    """
+    n_rows = len(series)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # 回答の組み合わせ（カテゴリ）ごとに展開し、コードで行に割り当てる
+        per_category = build_indicator_matrix(pd.Series(series.cat.categories, dtype=object))
+        values = np.vstack([per_category.to_numpy(),
+                            np.zeros((1, per_category.shape[1]), dtype=np.uint8)])
+        matrix = values[series.cat.codes.to_numpy()]  # 欠損（-1）は末尾の0行
+        return pd.DataFrame(matrix, index=series.index, columns=per_category.columns)
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return pd.DataFrame(np.zeros((n_rows, 0), dtype=np.uint8), index=series.index)
+
+    # 行番号をインデックスにして分割・展開する
+    tokens = pd.Series(series.to_numpy(), dtype=object).str.split(',').explode().dropna()
+    tokens = tokens.str.strip()
+    codes, options = pd.factorize(tokens)
+
+    matrix = np.zeros((n_rows, len(options)), dtype=np.uint8)
+    matrix[tokens.index.to_numpy(dtype=np.intp), codes] = 1
+    return pd.DataFrame(matrix, index=series.index, columns=pd.Index(options, dtype=object))
+
+@traced()
+def build_indicators(df, columns=MULTI_SELECT_COLUMNS):
+    """データに含まれる複数選択の列ごとにインジケータ行列を作成する"""
+    return {col: build_indicator_matrix(df[col]) for col in columns if col in df.columns}
+
+def _row_selector(matrix, rows):
+    """行の指定（ブールマスク・インデックス）を行番号に変換する"""
+    if isinstance(rows, pd.Index):
+        return matrix.index.get_indexer(rows)
+    if isinstance(rows, pd.DataFrame):
+        return matrix.index.get_indexer(rows.index)
+    return np.asarray(rows, dtype=bool)
+
+def option_counts(matrix, rows=None, weights=None):
+    """選択肢ごとの回答数を多い順に返す（rows: ブールマスク・インデックス・部分集合のDataFrame）
+
+    weights（行列の行ごとのウェイト）があれば、回答数はウェイトの合計になる。
+    """
+    values = matrix.to_numpy()
+    if rows is not None:
+        selector = _row_selector(matrix, rows)
+        values = values[selector]
+        if weights is not None:
+            weights = np.asarray(weights)[selector]
+    if weights is None:
+        counts = pd.Series(values.sum(axis=0, dtype=np.int64), index=matrix.columns)
+    else:
+        counts = pd.Series(weights @ values, index=matrix.columns)
+    counts = counts[counts > 0]
+    return counts.sort_values(ascending=False, kind='stable')
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+割合の信頼区間
+Wilsonの区間と、リサンプリングを二項分布の一括乱数で行うブートストラップ区間を、
+多数のセル（セグメント×選択肢など）に対して配列演算でまとめて計算する
+ウェイト付きの件数は、デザイン効果（Kish）で割った有効サンプルサイズ上の件数として区間を求める
+"""
+
+import numpy as np
+
+# 信頼水準
+CONFIDENCE = 0.95
+
+# ブートストラップの反復回数と乱数シード（同じデータなら同じ区間になる）
+N_REPLICATES = 2000
+SEED = 0
+
+# 'wilson' / 'bootstrap'
+DEFAULT_METHOD = 'wilson'
+METHODS = ['wilson', 'bootstrap']
+
+def _z(confidence):
+    """標準正規分布の両側分位点"""
+    from statistics import NormalDist
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+def wilson(k, n, confidence=CONFIDENCE):
+    """Wilsonのスコア区間（k: 該当数, n: 母数。配列可）→ (下限, 上限) の割合"""
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    z = _z(confidence)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = k / n
+        denominator = 1 + z**2 / n
+        center = (p + z**2 / (2 * n)) / denominator
+        half = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    low = np.where(n > 0, np.clip(center - half, 0, 1), np.nan)
+    high = np.where(n > 0, np.clip(center + half, 0, 1), np.nan)
+    return low, high
+
+def bootstrap(k, n, confidence=CONFIDENCE, n_replicates=N_REPLICATES, seed=SEED):
+    """パーセンタイル・ブートストラップ区間（配列可）→ (下限, 上限) の割合
+
+    該当/非該当の2値の回答をn件復元抽出することは、二項分布 Binomial(n, k/n) の乱数と同じなので、
+    全セル×全反復を1回の乱数生成（セル数×反復回数の配列）で求める。
+    単一選択の回答分布（多項分布）の各割合も、周辺分布は二項分布のため同じ区間になる。
+    有効サンプルサイズ上の件数（小数）は整数に丸めて抽出する。
+    """
+    k = np.atleast_1d(np.rint(np.asarray(k, dtype=float)).astype(np.int64))
+    n = np.atleast_1d(np.rint(np.asarray(n, dtype=float)).astype(np.int64))
+    rng = np.random.default_rng(seed)
+    safe_n = np.maximum(n, 1)
+    p = np.clip(np.where(n > 0, k / safe_n, 0.0), 0, 1)
+    draws = rng.binomial(safe_n[:, None], p[:, None], size=(len(k), n_replicates)) / safe_n[:, None]
+    alpha = 1 - confidence
+    low, high = np.quantile(draws, [alpha / 2, 1 - alpha / 2], axis=1)
+    return np.where(n > 0, low, np.nan), np.where(n > 0, high, np.nan)
+
+def intervals(k, n, method=DEFAULT_METHOD, confidence=CONFIDENCE):
+    """割合の区間（method: 'wilson' / 'bootstrap'）"""
+    if method == 'bootstrap':
+        return bootstrap(k, n, confidence)
+    if method == 'wilson':
+        return wilson(k, n, confidence)
+    raise ValueError(f"不明な信頼区間の方法: {method}")
+
+def format_interval(low, high):
+    """区間をパーセントの文字列にする（例: 25.1%〜30.3%）"""
+    if np.isnan(low) or np.isnan(high):
+        return "-"
+    return f"{low*100:.1f}%〜{high*100:.1f}%"
+
+def interval_labels(cells, method=DEFAULT_METHOD, confidence=CONFIDENCE, design_effect=1.0):
+    """(該当数, 母数) のリストの区間の文字列のリスト（全セルを1回の配列演算で求める）
+
+    design_effect: ウェイト付きの件数のデザイン効果（セルごとの配列も可）。
+    該当数・母数をこれで割った有効サンプルサイズ上の件数で区間を求める。
+    """
+    if not cells:
+        return []
+    k, n = np.array(cells, dtype=float).reshape(-1, 2).T
+    design_effect = np.asarray(design_effect, dtype=float)
+    low, high = intervals(k / design_effect, n / design_effect, method, confidence)
+    return [format_interval(lo, hi) for lo, hi in zip(low, high)]
+
+def confidence_key(confidence=CONFIDENCE):
+    """レポートで使う項目名（例: 95%信頼区間）"""
+    return f"{confidence*100:.0f}%信頼区間"
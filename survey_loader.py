@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+アンケートCSVの共通ローダー
+初回にCSVをパースしてスキーマの型（Categorical）に変換し、列指向のバイナリキャッシュ
+（Parquet）を作成する。2回目以降はキャッシュから読み込む
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from survey_schema import STRING_COLUMNS, apply_schema, schema_fingerprint
+from survey_trace import traced
+
+# CSVファイルのパス
+CSV_PATH = Path.home() / "Downloads" / "20251031_YAMAPアウトドア保険 加入者アンケート（回答） - フォームの回答 1.csv"
+
+# キャッシュの保存先（スクリプトの実行ディレクトリ配下）
+CACHE_DIR = Path(".cache") / "survey"
+
+# キャッシュ形式を変えたときに上げる
+CACHE_VERSION = 3
+
+def _parquet_available():
+    """Parquetの読み書きができるか（pyarrowの有無）"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def file_fingerprint(path):
+    """ファイルのサイズ・更新時刻・内容ハッシュ（SHA-256）を返す"""
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': digest.hexdigest(),
+    }
+
+def _cache_paths(csv_path, cache_dir):
+    """元ファイルごとのメタ情報とデータのパス（拡張子なし）を返す"""
+    key = hashlib.sha256(str(Path(csv_path).resolve()).encode('utf-8')).hexdigest()[:16]
+    return cache_dir / f"{key}.json", cache_dir / key
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_atomic(path, write):
+    """一時ファイルに書いてから置き換える（途中で落ちても壊れたキャッシュを残さない）"""
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        write(tmp_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    os.replace(tmp_path, path)
+
+def _write_meta(meta_path, meta):
+    _write_atomic(meta_path, lambda p: p.write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8'))
+
+def _check_cache(meta, csv_path, data_path):
+    """キャッシュが元ファイルと一致しているか判定する（一致, メタ情報の更新要否）"""
+    if meta is None or meta.get('version') != CACHE_VERSION or not data_path.exists():
+        return False, False
+    if meta.get('schema') != schema_fingerprint():
+        return False, False
+    stat = os.stat(csv_path)
+    if meta['size'] != stat.st_size:
+        return False, False
+    if meta['mtime_ns'] == stat.st_mtime_ns:
+        return True, False
+    # 更新時刻だけ変わった場合（再ダウンロードなど）は内容ハッシュで判定する
+    if meta['sha256'] == file_fingerprint(csv_path)['sha256']:
+        meta['mtime_ns'] = stat.st_mtime_ns
+        return True, True
+    return False, False
+
+def _write_frame(df, data_base):
+    """Parquetで保存する（pyarrowがない・変換できない列がある場合はpickle）"""
+    if _parquet_available():
+        try:
+            path = data_base.with_suffix('.parquet')
+            _write_atomic(path, lambda p: df.to_parquet(p, index=False))
+            return 'parquet'
+        except (ValueError, TypeError):
+            pass
+    _write_atomic(data_base.with_suffix('.pkl'), lambda p: df.to_pickle(p))
+    return 'pickle'
+
+def _read_frame(data_path):
+    """キャッシュを読み込む（壊れている・読めない場合はNone）"""
+    try:
+        if data_path.suffix == '.parquet':
+            return pd.read_parquet(data_path)
+        return pd.read_pickle(data_path)
+    except Exception:
+        return None
+
+def read_survey_csv(csv_path=CSV_PATH):
+    """CSVをそのままパースする（キャッシュなし）"""
+    return pd.read_csv(csv_path, encoding='utf-8', dtype=STRING_COLUMNS)
+
+def iter_survey_chunks(csv_path=CSV_PATH, chunksize=100_000):
+    """CSVをチャンクごとに読み込み、スキーマの型に変換して返す"""
+    with pd.read_csv(csv_path, encoding='utf-8', dtype=STRING_COLUMNS, chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield apply_schema(chunk)
+
+@traced()
+def load_survey(csv_path=CSV_PATH, use_cache=True, cache_dir=CACHE_DIR):
+    """アンケートデータを読み込み、スキーマの型に変換する（キャッシュが有効ならキャッシュから）"""
+    csv_path = Path(csv_path)
+    if not use_cache:
+        return apply_schema(read_survey_csv(csv_path))
+
+    cache_dir = Path(cache_dir)
+    meta_path, data_base = _cache_paths(csv_path, cache_dir)
+    meta = _read_meta(meta_path)
+    suffix = '.parquet' if meta and meta.get('format') == 'parquet' else '.pkl'
+    valid, touched = _check_cache(meta, csv_path, data_base.with_suffix(suffix))
+    if valid:
+        df = _read_frame(data_base.with_suffix(suffix))
+        if df is not None:
+            if touched:
+                _write_meta(meta_path, meta)
+            return df
+
+    df = apply_schema(read_survey_csv(csv_path))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    data_format = _write_frame(df, data_base)
+    meta = dict(file_fingerprint(csv_path), version=CACHE_VERSION, schema=schema_fingerprint(),
+                format=data_format, source=str(csv_path))
+    _write_meta(meta_path, meta)
+    return df
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+宣言的な指標の定義と一括評価
+指標を「分母の条件 → そのうち分子の条件に当てはまる人」の辞書で定義し、全指標の条件を
+一度だけBitsetにしてからAND・ポップカウントで件数を求める（指標を増やしても行の走査は増えない）
+
+指標の定義（辞書）:
+    'numerator':   分子の条件 {設問のキー: 値}（分母の条件とのAND）
+    'denominator': 分母の条件（省略時は全回答者）
+    'by':          属性値ごとに求める単一選択の設問のキー（省略可）
+
+条件の値:
+    '60代' / ['60代', '70代以上']    その回答値（複数選択は選択肢）のいずれか
+    {'contains': '手続き'}            その文字列を含む回答値・選択肢のいずれか
+    'segment': 'continuing' など     加入状況のセグメント（survey_segments.SEGMENTS。リストでOR）
+複数の条件はANDで組み合わせる。
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from survey_schema import SCHEMA
+from survey_segment_index import Bitset, SegmentIndex
+from survey_segments import SEGMENTS
+from survey_trace import traced
+
+METRIC_COLUMNS = ['指標', '属性値', '分子', '分母', '割合']
+
+def _term(key, value):
+    """条件1つを (キー, 判定方法, 値のタプル) に正規化する"""
+    if key != 'segment' and key not in SCHEMA:
+        raise ValueError(f"不明な設問のキー: {key}")
+    if isinstance(value, dict):
+        if set(value) != {'contains'}:
+            raise ValueError(f"不明な条件: {key}={value}")
+        return (key, 'contains', (value['contains'],))
+    values = (value,) if isinstance(value, str) else tuple(value)
+    if key == 'segment':
+        unknown = [name for name in values if name not in SEGMENTS]
+        if unknown:
+            raise ValueError(f"不明なセグメント: {unknown}（{', '.join(SEGMENTS)}）")
+    return (key, 'in', values)
+
+def _terms(conditions):
+    """条件の辞書を、並び順によらない条件の集合にする"""
+    return frozenset(_term(key, value) for key, value in (conditions or {}).items())
+
+class MetricPlan:
+    """指標の定義をまとめて評価する計画（条件・条件の組み合わせは指標をまたいで1回だけ求める）"""
+
+    def __init__(self, specs):
+        self.metrics = []
+        for name, spec in specs.items():
+            unknown = set(spec) - {'numerator', 'denominator', 'by'}
+            if unknown:
+                raise ValueError(f"指標「{name}」の不明な項目: {sorted(unknown)}")
+            by = spec.get('by')
+            if by is not None and SCHEMA.get(by, {}).get('kind') not in ('single', 'ordinal'):
+                raise ValueError(f"指標「{name}」のbyは単一選択の設問のキーにしてください: {by}")
+            denominator = _terms(spec.get('denominator'))
+            numerator = denominator | _terms(spec.get('numerator'))
+            self.metrics.append((name, numerator, denominator, by))
+        # 評価に必要な条件と条件の組み合わせ（重複を除く）
+        self.conjunctions = {terms for _, numerator, denominator, _ in self.metrics
+                             for terms in (numerator, denominator)}
+        self.terms = {term for terms in self.conjunctions for term in terms}
+
+    def _bitset(self, index, term):
+        key, how, values = term
+        if key == 'segment':
+            result = index.segment(values[0])
+            for name in values[1:]:
+                result = result | index.segment(name)
+            return result
+        multi = SCHEMA[key]['kind'] == 'multi'
+        choices = [choice for k, choice in (index.options if multi else index.values) if k == key]
+        if how == 'contains':
+            values = [choice for choice in choices if values[0] in str(choice)]
+        lookup = index.option if multi else index.value
+        result = Bitset.empty(index.n_rows)
+        for value in values:
+            result = result | lookup(key, value)
+        return result
+
+    @traced()
+    def evaluate(self, index):
+        """指標ごとの (分子, 分母) を返す（byのある指標は {属性値: (分子, 分母)}。ウェイトはindex.total()に従う）"""
+        bitsets = {term: self._bitset(index, term) for term in self.terms}
+        selected = {}
+        for terms in self.conjunctions:
+            result = index.all()
+            for term in terms:
+                result = result & bitsets[term]
+            selected[terms] = result
+
+        results = {}
+        for name, numerator, denominator, by in self.metrics:
+            if by is None:
+                results[name] = (index.total(selected[numerator]), index.total(selected[denominator]))
+                continue
+            groups = {}
+            for key, value in index.values:
+                if key == by:
+                    group = index.value(key, value)
+                    groups[value] = (index.total(selected[numerator] & group), index.total(selected[denominator] & group))
+            results[name] = groups
+        return results
+
+def compile_metrics(specs):
+    """指標の定義（{指標名: 定義}）を評価の計画にする（定義の誤りはここでValueError）"""
+    return MetricPlan(specs)
+
+def evaluate_metrics(specs, index):
+    """指標の定義を評価する（同じ定義を繰り返し評価する場合はcompile_metricsの戻り値を使う）"""
+    return compile_metrics(specs).evaluate(index)
+
+def metric_table(results):
+    """評価結果を縦持ちの表（指標, 属性値, 分子, 分母, 割合）にする"""
+    rows = []
+    for name, result in results.items():
+        groups = result if isinstance(result, dict) else {'': result}
+        for value, (k, n) in groups.items():
+            rows.append((name, value, k, n, k / n * 100 if n else float('nan')))
+    return pd.DataFrame(rows, columns=METRIC_COLUMNS)
+
+def load_specs(path):
+    """指標の定義をJSONファイルから読み込む（{指標名: 定義}）"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def main():
+    """JSONの指標定義を評価して表示する（例: metrics.json --output metrics.csv）"""
+    from survey_loader import CSV_PATH, load_survey
+
+    parser = argparse.ArgumentParser(description="指標の定義（JSON）の一括評価")
+    parser.add_argument('specs', type=Path, help="指標の定義のJSON（{指標名: {numerator, denominator, by}}）")
+    parser.add_argument('--csv', type=Path, default=CSV_PATH, help="アンケートのCSV")
+    parser.add_argument('--output', type=Path, default=None, help="結果の表（CSV）の保存先")
+    args = parser.parse_args()
+
+    plan = compile_metrics(load_specs(args.specs))
+    index = SegmentIndex.from_frame(load_survey(args.csv))
+    table = metric_table(plan.evaluate(index))
+    print(table.round(1).to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"\n✓ 指標の表を保存: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分析パイプライン（全レポートの一括作成）
+読み込み → セグメント判定 → 集計・分析 → 出力（コンソール・Excel・JSON・マークダウン・グラフ）
+の各ステージを一度だけ計算して共有し、全ての成果物を1回の読み込み・1回のセグメント判定で作成する
+"""
+
+import argparse
+from functools import cached_property
+from pathlib import Path
+
+import analyze_research_questions as research
+import analyze_survey as survey
+from create_marketing_insights import JSON_PATH, MD_PATH, build_insights, write_reports
+from survey_aggregates import DEFAULT_CHUNKSIZE, aggregate_frame, stream_aggregates
+from survey_charts import draw_charts
+from survey_cooccurrence import cooccurrence, cooccurrence_charts
+from survey_incremental import update_aggregates
+from survey_indicators import build_indicators
+from survey_intervals import DEFAULT_METHOD, METHODS
+from survey_loader import CSV_PATH, load_survey
+from survey_segment_index import SegmentIndex
+from survey_trace import add_arguments as add_trace_arguments, enable_from_args as enable_trace, traced
+from survey_weights import print_raking, rake_frame, read_margins
+
+class SurveyPipeline:
+    """分析の各ステージ（初めて参照されたときに一度だけ計算し、以降は結果を共有する）
+
+    ステージの依存関係:
+        frame → indicators → index → segments → aggregates → crosstab
+        frame → weights（index・aggregatesで使う）
+        frame, indicators, index, weights → insights
+    chunksize / incremental を指定した場合、aggregatesは全件のDataFrameを使わずに集計する
+    （insightsを使う出力がなければCSV全体は読み込まれない）。
+    margins_path（構成比のCSV）を指定した場合、全ての件数は全件からレイキングしたウェイト付きになる
+    （chunksize / incremental とは同時に指定できない）。
+    """
+
+    def __init__(self, csv_path=CSV_PATH, chunksize=None, incremental=False, full=False,
+                 interval_method=DEFAULT_METHOD, margins_path=None):
+        if margins_path and (chunksize or incremental):
+            raise ValueError("ウェイト調整はchunksize・incrementalと同時に指定できません（ウェイトは全件から求める）")
+        self.csv_path = csv_path
+        self.chunksize = chunksize
+        self.incremental = incremental
+        self.full = full
+        self.interval_method = interval_method
+        self.margins_path = margins_path
+
+    @cached_property
+    def frame(self):
+        """アンケートの全回答（スキーマ適用済み）"""
+        print("データを読み込んでいます...")
+        df = load_survey(self.csv_path)
+        print(f"データ読み込み完了: {len(df)}件の回答")
+        return df
+
+    @cached_property
+    def weights(self):
+        """構成比へのレイキングによる行ごとのウェイト（margins_pathなしはNone）"""
+        if not self.margins_path:
+            return None
+        raking = rake_frame(self.frame, read_margins(self.margins_path))
+        print_raking(raking)
+        return raking.weights
+
+    @cached_property
+    def indicators(self):
+        """複数選択の設問のインジケータ行列"""
+        return build_indicators(self.frame)
+
+    @cached_property
+    def index(self):
+        """回答値・選択肢・加入状況セグメントごとのビット列"""
+        return SegmentIndex.from_frame(self.frame, self.indicators, self.weights)
+
+    @cached_property
+    def segments(self):
+        """加入状況によるセグメントのブールマスク"""
+        return self.index.segment_masks()
+
+    @cached_property
+    def aggregates(self):
+        """件数・クロス集計・セグメント人数"""
+        if self.incremental:
+            agg, n_new = update_aggregates(self.csv_path, self.chunksize or DEFAULT_CHUNKSIZE, full=self.full)
+            print(f"差分更新: 新しい回答 {n_new}件を集計")
+            return agg
+        if self.chunksize:
+            return stream_aggregates(self.csv_path, self.chunksize)
+        return aggregate_frame(self.frame, self.indicators, self.segments, self.weights)
+
+    @cached_property
+    def crosstab(self):
+        """属性×設問のクロス集計"""
+        return self.aggregates.crosstab()
+
+    @cached_property
+    def insights(self):
+        """マーケティングインサイト（JSON・マークダウンの内容）"""
+        return build_insights(self.frame, self.indicators, self.index, self.interval_method, self.weights)
+
+@traced()
+def write_console(pipeline):
+    """集計結果をコンソールに表示する（analyze_survey.py・analyze_research_questions.pyと同じ内容）"""
+    agg = pipeline.aggregates
+    survey.basic_statistics(agg)
+    survey.insurance_analysis(agg)
+    survey.satisfaction_analysis(agg)
+    survey.hiking_experience_analysis(agg)
+    survey.motivation_analysis(agg)
+    research.analyze_by_attribute(agg, pipeline.crosstab)
+    research.analyze_upsell_experience(agg)
+    research.analyze_continuation(agg)
+
+@traced()
+def write_summary_csv(pipeline):
+    survey.save_data_summary(pipeline.aggregates)
+
+@traced()
+def write_xlsx(pipeline):
+    research.create_summary_report(pipeline.aggregates, pipeline.crosstab)
+
+# JSON・マークダウンの保存先と表示名
+REPORT_OUTPUTS = {'json': (JSON_PATH, "JSON"), 'markdown': (MD_PATH, "マークダウン")}
+
+@traced()
+def write_insight_reports(pipeline, formats):
+    """インサイトのレポートを1回だけ描画し、指定した形式（JSON・マークダウン）をまとめて保存する"""
+    write_reports(pipeline.insights, {fmt: REPORT_OUTPUTS[fmt][0] for fmt in formats})
+    for fmt in formats:
+        path, label = REPORT_OUTPUTS[fmt]
+        print(f"✓ {label}レポートを保存: {path}")
+
+@traced()
+def write_charts(pipeline):
+    """両スクリプトのグラフをまとめて描画する（描き直しが必要なグラフを1つのプールで並列に描画）"""
+    print("\n" + "="*80)
+    print("グラフを作成しています...")
+    print("="*80)
+    agg = pipeline.aggregates
+    charts = survey.chart_specs(agg) + research.chart_specs(agg)
+    if not (pipeline.chunksize or pipeline.incremental):
+        # 共起のヒートマップは全件の回答の組み合わせから求める（件数だけの集計値からは求められない）
+        charts += cooccurrence_charts(cooccurrence(pipeline.frame, weights=pipeline.weights,
+                                                   indicators=pipeline.indicators))
+    draw_charts(charts)
+
+# 出力名 → 出力処理（この順に実行する。JSON・マークダウンはwrite_insight_reportsでまとめて保存する）
+WRITERS = {
+    'console': write_console,
+    'summary_csv': write_summary_csv,
+    'xlsx': write_xlsx,
+    'json': write_insight_reports,
+    'markdown': write_insight_reports,
+    'charts': write_charts,
+}
+
+def run(outputs=None, **options):
+    """指定した出力を作成する（outputs: WRITERSのキーのリスト、省略時は全て）"""
+    pipeline = SurveyPipeline(**options)
+    selected = [name for name in WRITERS if name in set(outputs or WRITERS)]
+    reports = [name for name in selected if name in REPORT_OUTPUTS]
+    for name in selected:
+        if name not in REPORT_OUTPUTS:
+            WRITERS[name](pipeline)
+        elif name == reports[0]:
+            write_insight_reports(pipeline, reports)
+    return pipeline
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="YAMAPアウトドア保険 加入者アンケート分析（全レポートの一括作成）")
+    parser.add_argument('--outputs', nargs='+', choices=list(WRITERS), default=None,
+                        help="作成する出力（省略時は全て）")
+    parser.add_argument('--no-charts', action='store_true',
+                        help="グラフを作成しない（matplotlib / seabornを読み込まない）")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="CSVを指定行数ずつ読み込んで集計する（JSON・マークダウンは全件読み込みが必要）")
+    parser.add_argument('--incremental', action='store_true',
+                        help="前回の集計結果に追記された回答だけを足し込む")
+    parser.add_argument('--full', action='store_true',
+                        help="--incrementalの保存済み集計を使わず全件を集計し直す")
+    parser.add_argument('--interval', choices=METHODS, default=DEFAULT_METHOD,
+                        help="レポートの割合の信頼区間の計算方法")
+    parser.add_argument('--weights', type=Path, default=None, metavar='MARGINS_CSV',
+                        help="年代・性別・地域の構成比のCSVにレイキングしたウェイト付きで集計する")
+    add_trace_arguments(parser)
+    args = parser.parse_args()
+    if args.full and not args.incremental:
+        parser.error("--fullは--incrementalと同時に指定してください")
+    if args.weights and (args.chunksize or args.incremental):
+        parser.error("--weightsは--chunksize・--incrementalと同時に指定できません（ウェイトは全件から求める）")
+    enable_trace(args)
+
+    outputs = args.outputs or list(WRITERS)
+    if args.no_charts:
+        outputs = [name for name in outputs if name != 'charts']
+
+    print("="*80)
+    print("YAMAPアウトドア保険 加入者アンケート分析（全レポートの一括作成）")
+    print("="*80)
+
+    run(outputs, chunksize=args.chunksize, incremental=args.incremental, full=args.full,
+        interval_method=args.interval, margins_path=args.weights)
+
+    print("\n" + "="*80)
+    print("分析が完了しました！")
+    print("="*80)
+
+if __name__ == "__main__":
+    main()
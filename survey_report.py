@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+レポートのモデルと出力形式ごとの描画
+レポートをセクション・ブロック（項目・リスト・分布・表・示唆など）の型で表し、
+同じモデルからマークダウン・JSON・Excel・コンソールの各形式を1回の走査で作成する
+セクションごとに内容のハッシュと描画結果を保存しておき、再作成時は内容が変わったセクションだけを描画し直す
+"""
+
+import hashlib
+import io
+import json
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from survey_excel import write_workbook
+from survey_trace import traced
+
+# 描画の書式を変えたときに上げる（保存済みの描画結果を使わなくなる）
+RENDERER_VERSION = 1
+
+CACHE_DIR = Path(".cache") / "report"
+
+FORMATS = ['markdown', 'json', 'xlsx', 'console']
+
+# ---------------------------------------------------------------------------
+# モデル
+# ---------------------------------------------------------------------------
+
+@dataclass
+class Fields:
+    """「**項目:** 値」の並び"""
+    items: list  # [(項目, 値の文字列)]
+
+@dataclass
+class ItemList:
+    """見出し付きの「- キー: 値」のリスト"""
+    label: str
+    items: list  # [(キー, 値の文字列)]
+
+@dataclass
+class Distribution:
+    """件数の分布（件数・割合・信頼区間）"""
+    label: str
+    rows: list  # [(回答, 件数, 割合(%), 信頼区間の文字列 or None)]
+    total: int = None  # 指定すると末尾に「**合計:** N人」を出す
+
+@dataclass
+class Rate:
+    """分子/分母と割合（詳細分析の1行）"""
+    group: str
+    count: int
+    count_unit: str
+    denominator: int
+    rate: str
+    interval: str = None
+    note: str = ""
+
+@dataclass
+class RateGroups:
+    """「**詳細分析:**」の下の小見出しごとの割合"""
+    label: str
+    groups: list  # [(小見出し, [Rate])]
+
+@dataclass
+class Table:
+    """表（1行目は列名）"""
+    columns: list
+    rows: list
+
+@dataclass
+class Suggestions:
+    """マーケ施策への示唆（見出し・根拠付き、または文字列のリスト）"""
+    label: str
+    items: list  # [(示唆, データ or None, プロセス or None)] または [文字列]
+    detailed: bool = False
+
+@dataclass
+class Block:
+    """見出し（###）と本文のブロック"""
+    heading: str
+    body: list = field(default_factory=list)
+
+@dataclass
+class Section:
+    """レポートのセクション（##）。payloadはJSONに出力する元の内容"""
+    key: str
+    title: str
+    blocks: list
+    payload: Any = None
+
+    def fingerprint(self):
+        """セクションの内容のハッシュ（これが同じなら描画結果も同じ）"""
+        content = json.dumps([RENDERER_VERSION, self.key, self.title, self.payload],
+                             ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+@dataclass
+class Report:
+    title: str
+    sections: list
+
+# ---------------------------------------------------------------------------
+# マークダウン
+# ---------------------------------------------------------------------------
+
+def _interval_suffix(interval):
+    return f"、{interval}" if interval else ""
+
+def _markdown_body(out, item):
+    if isinstance(item, Fields):
+        for label, value in item.items:
+            out.write(f"**{label}:** {value}\n\n")
+    elif isinstance(item, ItemList):
+        out.write(f"**{item.label}:**\n")
+        for key, value in item.items:
+            out.write(f"- {key}: {value}\n")
+        out.write("\n")
+    elif isinstance(item, Distribution):
+        out.write(f"**{item.label}:**\n")
+        for label, count, pct, interval in item.rows:
+            out.write(f"- {label}: {count}人 ({pct:.1f}%{_interval_suffix(interval)})\n")
+        if item.total is not None:
+            out.write(f"\n**合計:** {item.total}人\n\n")
+        else:
+            out.write("\n")
+    elif isinstance(item, RateGroups):
+        out.write(f"**{item.label}:**\n\n")
+        for name, rates in item.groups:
+            out.write(f"##### {name}\n\n")
+            for rate in rates:
+                out.write(f"- **{rate.group}:** {rate.count}{rate.count_unit}/{rate.denominator}人"
+                          f"（{rate.rate}{_interval_suffix(rate.interval)}）\n")
+                out.write(f"  - {rate.note}\n\n")
+    elif isinstance(item, Table):
+        out.write("| " + " | ".join(item.columns) + " |\n")
+        out.write("|---" * len(item.columns) + "|\n")
+        for row in item.rows:
+            out.write("| " + " | ".join(row) + " |\n")
+        out.write("\n")
+    elif isinstance(item, Suggestions):
+        out.write(f"**{item.label}:**\n\n")
+        if item.detailed:
+            for title, data, process in item.items:
+                out.write(f"##### {title}\n\n")
+                if data is not None:
+                    out.write(f"- **データ:** {data}\n")
+                    out.write(f"- **プロセス:** {process}\n\n")
+        else:
+            for suggestion in item.items:
+                out.write(f"- {suggestion}\n")
+        out.write("\n")
+
+def render_markdown_section(section):
+    out = io.StringIO()
+    out.write(f"## {section.key}: {section.title}\n\n")
+    for block in section.blocks:
+        out.write(f"### {block.heading}\n\n")
+        for item in block.body:
+            _markdown_body(out, item)
+    return out.getvalue()
+
+# ---------------------------------------------------------------------------
+# JSON（payloadをjson.dump(indent=2)と同じ書式で出力する）
+# ---------------------------------------------------------------------------
+
+def render_json_section(section):
+    value = json.dumps(section.payload, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+    return f"  {json.dumps(section.key, ensure_ascii=False)}: {value}"
+
+# ---------------------------------------------------------------------------
+# コンソール
+# ---------------------------------------------------------------------------
+
+def _console_body(out, item):
+    if isinstance(item, Fields):
+        for label, value in item.items:
+            out.write(f"  {label}: {value}\n")
+    elif isinstance(item, ItemList):
+        out.write(f"  {item.label}:\n")
+        for key, value in item.items:
+            out.write(f"    - {key}: {value}\n")
+    elif isinstance(item, Distribution):
+        out.write(f"  {item.label}:\n")
+        for label, count, pct, interval in item.rows:
+            out.write(f"    - {label}: {count}人 ({pct:.1f}%{_interval_suffix(interval)})\n")
+        if item.total is not None:
+            out.write(f"    合計: {item.total}人\n")
+    elif isinstance(item, RateGroups):
+        for name, rates in item.groups:
+            out.write(f"  {name}:\n")
+            for rate in rates:
+                out.write(f"    - {rate.group}: {rate.count}{rate.count_unit}/{rate.denominator}人"
+                          f"（{rate.rate}{_interval_suffix(rate.interval)}）\n")
+    elif isinstance(item, Table):
+        widths = [max(len(str(value)) for value in column) for column in zip(item.columns, *item.rows)]
+        for row in [item.columns, *item.rows]:
+            out.write("    " + "  ".join(str(value).ljust(width) for value, width in zip(row, widths)) + "\n")
+    elif isinstance(item, Suggestions):
+        out.write(f"  {item.label}:\n")
+        for suggestion in item.items:
+            out.write(f"    - {suggestion[0] if item.detailed else suggestion}\n")
+
+def render_console_section(section):
+    out = io.StringIO()
+    out.write(f"\n【{section.key}: {section.title}】\n")
+    for block in section.blocks:
+        out.write(f"\n■ {block.heading}\n")
+        for item in block.body:
+            _console_body(out, item)
+    return out.getvalue()
+
+# ---------------------------------------------------------------------------
+# Excel（セクションごとに1シート。行のリストを描画結果として保存する）
+# ---------------------------------------------------------------------------
+
+def _xlsx_body(rows, item):
+    if isinstance(item, Fields):
+        rows.extend([label, value] for label, value in item.items)
+    elif isinstance(item, ItemList):
+        rows.append([item.label])
+        rows.extend(['', key, value] for key, value in item.items)
+    elif isinstance(item, Distribution):
+        rows.append([item.label, '回答', '人数', '割合(%)', '信頼区間'])
+        rows.extend(['', label, count, round(pct, 1), interval or ''] for label, count, pct, interval in item.rows)
+        if item.total is not None:
+            rows.append(['', '合計', item.total])
+    elif isinstance(item, RateGroups):
+        rows.append([item.label, '区分', '人数', '分母', '割合', '信頼区間', '分析'])
+        for name, rates in item.groups:
+            rows.extend([name, rate.group, rate.count, rate.denominator, rate.rate, rate.interval or '', rate.note]
+                        for rate in rates)
+    elif isinstance(item, Table):
+        rows.append(['', *item.columns])
+        rows.extend(['', *row] for row in item.rows)
+    elif isinstance(item, Suggestions):
+        rows.append([item.label])
+        for suggestion in item.items:
+            rows.append(['', *suggestion] if item.detailed else ['', suggestion])
+    rows.append([])
+
+def render_xlsx_section(section):
+    rows = [[f"{section.key}: {section.title}"], []]
+    for block in section.blocks:
+        rows.append([f"■ {block.heading}"])
+        for item in block.body:
+            _xlsx_body(rows, item)
+    return rows
+
+# ---------------------------------------------------------------------------
+# 描画
+# ---------------------------------------------------------------------------
+
+SECTION_RENDERERS = {
+    'markdown': render_markdown_section,
+    'json': render_json_section,
+    'xlsx': render_xlsx_section,
+    'console': render_console_section,
+}
+
+class RenderCache:
+    """出力ファイルごとのセクションの描画結果（ハッシュ → 描画結果）"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+
+    def _path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]
+        return self.cache_dir / f"{digest}.json"
+
+    def load(self, key):
+        if self.cache_dir is None:
+            return {}
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, key, fragments):
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(fragments, f, ensure_ascii=False)
+        tmp_path.replace(path)
+
+def _same_content(path, text):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read() == text
+    except OSError:
+        return False
+
+def _assemble(fmt, report, fragments):
+    if fmt == 'markdown':
+        return f"# {report.title}\n\n" + "".join(fragments)
+    if fmt == 'json':
+        return "{\n" + ",\n".join(fragments) + "\n}" if fragments else "{}"
+    if fmt == 'console':
+        return f"{'='*80}\n{report.title}\n{'='*80}" + "".join(fragments)
+    return fragments
+
+@traced()
+def render(report, outputs, cache=None):
+    """レポートを複数の形式で作成する（outputs: {形式: 保存先のパス}。consoleはNoneで表示のみ）
+
+    セクションを1回だけ走査して全形式の描画結果を作り、ファイルはまとめて1回で書き出す。
+    cacheを渡すと、内容のハッシュが前回と同じセクションは保存済みの描画結果を使い、
+    出力が前回と同じファイルは書き直さない。戻り値は {形式: 描画し直したセクション数}。
+    """
+    cache = cache or RenderCache(None)
+    formats = list(outputs)
+    previous = {fmt: cache.load(f"{fmt}:{outputs[fmt]}") for fmt in formats}
+    current = {fmt: {} for fmt in formats}
+    fragments = {fmt: [] for fmt in formats}
+    rendered = {fmt: 0 for fmt in formats}
+
+    for section in report.sections:
+        digest = section.fingerprint()
+        for fmt in formats:
+            fragment = previous[fmt].get(digest)
+            if fragment is None:
+                fragment = SECTION_RENDERERS[fmt](section)
+                rendered[fmt] += 1
+            current[fmt][digest] = fragment
+            fragments[fmt].append(fragment)
+
+    for fmt in formats:
+        path = outputs[fmt]
+        if fmt == 'console':
+            print(_assemble(fmt, report, fragments[fmt]))
+        elif fmt == 'xlsx':
+            unchanged = rendered[fmt] == 0 and list(previous[fmt]) == list(current[fmt])
+            if not (unchanged and Path(path).exists()):
+                write_workbook(path, [(section.key, ((row, ()) for row in rows))
+                                      for section, rows in zip(report.sections, fragments[fmt])])
+        else:
+            text = _assemble(fmt, report, fragments[fmt])
+            if not _same_content(path, text):
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+        if fmt != 'console':
+            cache.save(f"{fmt}:{path}", current[fmt])
+    return rendered
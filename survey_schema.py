@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+アンケートの列スキーマ
+短いキーとフォームの列名（設問文）の対応、設問の種類、回答の選択肢を一元管理する
+読み込み時に単一選択の列をCategorical（順序のある設問は順序付き）に変換する
+"""
+
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+# 設問の種類
+#   single:   単一選択
+#   ordinal:  単一選択（順序あり）
+#   multi:    複数選択（カンマ区切り）
+#   text:     自由記述
+#   timestamp / id: そのまま文字列として扱う
+SCHEMA = {
+    'timestamp': {
+        'header': 'タイムスタンプ',
+        'kind': 'timestamp',
+    },
+    'user_id': {
+        'header': 'ユーザーID',
+        'kind': 'id',
+    },
+    'age': {
+        'header': '年代をお選びください。',
+        'kind': 'ordinal',
+        'domain': ['10代以下', '20代', '30代', '40代', '50代', '60代', '70代以上'],
+    },
+    'gender': {
+        'header': '性別をお選びください。',
+        'kind': 'single',
+        'domain': ['男性', '女性', '上記以外', '回答しない'],
+    },
+    'region': {
+        'header': 'お住まいの地域をお選びください。',
+        'kind': 'single',
+        'domain': [
+            '北海道',
+            '東北（青森・岩手・宮城・秋田・山形・福島）',
+            '関東（茨城・栃木・群馬・埼玉・千葉・東京・神奈川）',
+            '甲信越（新潟・山梨・長野）',
+            '北陸（富山・石川・福井）',
+            '東海（岐阜・静岡・愛知）',
+            '近畿（三重・滋賀・京都・大阪・兵庫・奈良・和歌山）',
+            '中国（鳥取・ 島根・岡山・広島・山口）',
+            '四国（徳島・香川・愛媛・高知）',
+            '九州（福岡・佐賀・長崎・熊本・大分・宮崎・鹿児島）',
+        ],
+    },
+    'history': {
+        'header': 'あなたの登山歴に最も近いものをお選びください。',
+        'kind': 'ordinal',
+        'domain': ['1年未満', '1〜3年未満', '3〜5年未満', '5〜10年未満', '10年以上'],
+    },
+    'frequency': {
+        'header': '直近1年以内に、どのくらいの頻度で登山・ハイキングをしていますか？',
+        'kind': 'ordinal',
+        'domain': ['年に1回未満', '年に1〜2回程度', '2〜3か月に1回程度', '月に1回程度', '月に2〜3回程度', '週に1回以上'],
+    },
+    'join_timing': {
+        'header': 'ヤマップグループの「外あそびレジャー保険」「山歩保険」にご加入されたタイミングについて教えてください。',
+        'kind': 'single',
+        'domain': [
+            '登山予定に関わらず、年間を通した補償を検討し加入',
+            '登山の予定が決まった時点で加入',
+            '登山の数日前に加入',
+            '登山直前・前日に加入',
+        ],
+    },
+    'first_insurance': {
+        'header': '登山保険への加入は今回が初めてですか？',
+        'kind': 'single',
+        'domain': ['はい', 'いいえ'],
+    },
+    'status': {
+        'header': '以下から、現在のご加入状況について1つお選びください。',
+        'kind': 'single',
+        'domain': [
+            '山歩保険に加入し、現在も加入中',
+            '外あそびレジャー保険の1年契約に加入し、現在も加入中',
+            '外あそびレジャー保険の7日契約、もしくは30日契約に現在加入中',
+            '外あそびレジャー保険の7日契約、もしくは30日契約に加入し、現在は契約が終了している',
+            '外あそびレジャー保険の7日・30日契約に加入した後に、1年契約に移行した',
+        ],
+    },
+    'ease': {
+        'header': 'YAMAPアウトドア保険への加入手続きは簡単でしたか？',
+        'kind': 'ordinal',
+        'domain': ['とても難しかった', 'やや難しかった', 'どちらともいえない', 'やや簡単だった', 'とても簡単だった'],
+    },
+    'recommend': {
+        'header': '加入中のYAMAPアウトドア保険を家族や友人、山仲間に勧めたいですか？',
+        'kind': 'single',
+        'domain': ['とても勧めたい', 'やや勧めたい', 'どちらともいえない', 'あまり勧めたくない', '全く勧めたくない'],
+    },
+    'join_reason': {
+        'header': 'あなたがYAMAPアウトドア保険に加入した理由を教えてください。（当てはまるものに全てチェックをしてください）[MA]',
+        'kind': 'multi',
+        'domain': [
+            '登山中の「ケガなどの事故」に備えたかったから',
+            '登山中の「遭難捜索・救助」に備えたかったから',
+            '加入手続きが簡単だったから',
+            '保険料が手頃だったから',
+            '遭難による経済的負担を家族にかけたくないから',
+            'ヤマップグループの登山保険だから',
+        ],
+    },
+    'channel': {
+        'header': 'YAMAPアウトドア保険を知ったきっかけをすべてお選びください。（複数選択可）[MA]',
+        'kind': 'multi',
+        'domain': [
+            'YAMAPアプリ内のバナー',
+            'YAMAPのWebサイト',
+            'アプリのお知らせ（プッシュ通知）',
+            'YAMAPのメルマガ、ニュースレター',
+        ],
+    },
+    'benefit': {
+        'header': '保険加入後、保険から感じるメリットとして、以下のどれを最も実感しますか？',
+        'kind': 'single',
+        'domain': [
+            '「いつでも山に行ける安心」を買っている',
+            '「家族への責任」を果たしている',
+            '「想定外の出費回避」の備えとして',
+        ],
+    },
+    'decision': {
+        'header': '保険のご案内ページで、加入の「決め手となった情報」を1つ選んでお答えください。',
+        'kind': 'single',
+        'domain': [],
+    },
+    'switch_trigger': {
+        'header': '短期契約の後に1年契約に切り替えようと思ったきっかけを教えてください。（複数選択可）[MA]',
+        'kind': 'multi',
+        'domain': [
+            '年契約の方がコストパフォーマンスが良いと思ったため',
+            '登山やアウトドアに行く機会が増えたため',
+            '毎回短期で加入するのが手間だと感じたため',
+            '更新・加入忘れを防ぎたかったため',
+            '長期の補償内容が魅力的だったため',
+            '7日・30日プランを利用して安心感を実感したため',
+        ],
+    },
+    'switch_timing': {
+        'header': '実際に短期契約の後に1年契約に切り替えたのはいつですか？',
+        'kind': 'single',
+        'domain': [],
+    },
+    'hesitation': {
+        'header': 'どのような点で迷われましたか？（複数選択可）[MA]',
+        'kind': 'multi',
+        'domain': [],
+    },
+    'future_intention': {
+        'header': '今後、1年契約に切り替えるご意向はありますか？',
+        'kind': 'single',
+        'domain': ['かなり検討している', '少し検討している', 'あまり検討していない', '全く検討していない'],
+    },
+    'year_plan_reason': {
+        'header': '1年契約を選択した決め手を教えてください。（当てはまるものに全てチェックをしてください）[MA]',
+        'kind': 'multi',
+        'domain': [
+            '1年を通して登山時の安心を得たいから',
+            '1年契約の方がコストパフォーマンスが良いから',
+            '登山頻度が高いから',
+            '更新の手間がないから',
+            '登山のたびに短期プランに加入するのが面倒だから',
+        ],
+    },
+    'cancel_reason': {
+        'header': '解約した理由を上位3つまで選んで教えてください。',
+        'kind': 'multi',
+        'domain': [
+            '保険金の請求など保険利用がない場合も保険料を払い続けることになるため',
+            'YAMAPアウトドア保険の他プランへの切替えを検討しているため',
+            '他社への切り替えを検討しているため',
+            '補償内容がニーズに合わなくなったため',
+            '保険料が高いと感じたため',
+            '保険料の自動引き落としに抵抗を感じるため',
+            '生活費（固定費）の定期的な見直しのため',
+            '登山やアウトドアを控える予定があるため',
+            'ライフステージ（例：家族構成）が変化したため',
+            '契約後のサポートが不十分だったため',
+        ],
+    },
+    'cancel_detail': {
+        'header': '上記で選んだ選択肢について、より具体的に教えてください。',
+        'kind': 'text',
+    },
+}
+
+# 短いキー → 列名
+COLUMNS = {key: spec['header'] for key, spec in SCHEMA.items()}
+KEYS_BY_HEADER = {header: key for key, header in COLUMNS.items()}
+
+# 種類ごとのキー
+SINGLE_CHOICE_KEYS = [key for key, spec in SCHEMA.items() if spec['kind'] in ('single', 'ordinal')]
+ORDINAL_KEYS = [key for key, spec in SCHEMA.items() if spec['kind'] == 'ordinal']
+MULTI_CHOICE_KEYS = [key for key, spec in SCHEMA.items() if spec['kind'] == 'multi']
+TEXT_KEYS = [key for key, spec in SCHEMA.items() if spec['kind'] == 'text']
+
+# 文字列として読み込む列（チャンクごとに型推論が変わらないようにする）
+STRING_COLUMNS = {COLUMNS[key]: str for key in SINGLE_CHOICE_KEYS + MULTI_CHOICE_KEYS + TEXT_KEYS}
+
+def schema_fingerprint():
+    """スキーマの内容ハッシュ（キャッシュの無効化に使う）"""
+    payload = json.dumps(SCHEMA, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+def to_categorical(series, domain, ordered=False):
+    """選択肢の順にカテゴリを並べたCategoricalに変換する
+
+    カテゴリは実際に出現した値のみ。選択肢にない値（「その他」の自由記述など）は
+    選択肢の後ろに出現順で追加する。
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype(object)
+    # 1回のハッシュでコード化し、カテゴリの並べ替えはコードの付け替えで行う
+    codes, observed = pd.factorize(series)
+    position = {value: i for i, value in enumerate(observed)}
+    categories = [v for v in domain if v in position]
+    known = set(categories)
+    categories += [v for v in observed if v not in known]
+    new_code = np.empty(len(categories), dtype=np.int64)
+    for i, value in enumerate(categories):
+        new_code[position[value]] = i
+    codes = np.where(codes >= 0, new_code[np.maximum(codes, 0)] if len(categories) else -1, -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories, ordered=ordered),
+                     index=series.index, name=series.name)
+
+def apply_schema(df):
+    """選択式の列をCategorical（順序のある設問は順序付き）に変換する
+
+    複数選択の列も回答の組み合わせ単位でCategoricalにする（インジケータ行列の作成が
+    組み合わせの種類数で済む）。
+    """
+    df = df.copy()
+    for key in SINGLE_CHOICE_KEYS + MULTI_CHOICE_KEYS:
+        spec = SCHEMA[key]
+        if spec['header'] not in df.columns:
+            continue
+        domain = spec['domain'] if spec['kind'] != 'multi' else []
+        df[spec['header']] = to_categorical(df[spec['header']], domain,
+                                            ordered=spec['kind'] == 'ordinal')
+    return df
+
+def value_counts(series, weights=None):
+    """回答のある選択肢のみの件数（多い順。weights: 行ごとのウェイトがあれば件数はウェイトの合計）"""
+    if weights is None:
+        counts = series.value_counts()
+    else:
+        counts = pd.Series(weights, index=series.index).groupby(series, observed=True, sort=False).sum()
+        counts = counts.sort_values(ascending=False, kind='stable')
+    return counts[counts > 0]
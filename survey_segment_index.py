@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+セグメントのビットマップインデックス
+加入状況・属性の回答値ごと、複数選択の選択肢ごとに、該当する回答者をビット列（64bit単位）で
+一度だけ作成しておき、任意のセグメント（例: 60代以上 かつ 継続 かつ 女性）をビット演算
+（AND / OR / NOT）とポップカウントで求める
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from survey_indicators import build_indicators
+from survey_schema import COLUMNS, MULTI_CHOICE_KEYS, SCHEMA, SINGLE_CHOICE_KEYS
+from survey_segments import SEGMENT_LABELS, SEGMENTS, STATUS_PATTERNS, contains
+from survey_trace import traced
+
+if hasattr(np, 'bitwise_count'):
+    def _popcount(words):
+        return int(np.bitwise_count(words).sum())
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words):
+        return int(_POPCOUNT_TABLE[words.view(np.uint8)].sum(dtype=np.int64))
+
+def _pack(mask):
+    """ブール配列を64bit単位のビット列に詰める（末尾の余りビットは0）"""
+    packed = np.packbits(np.asarray(mask, dtype=bool), bitorder='little')
+    padding = (-len(packed)) % 8
+    if padding:
+        packed = np.concatenate([packed, np.zeros(padding, dtype=np.uint8)])
+    return packed.view(np.uint64)
+
+class Bitset:
+    """回答者の集合（1行1ビット）"""
+
+    __slots__ = ('words', 'n')
+
+    def __init__(self, words, n):
+        self.words = words
+        self.n = n
+
+    @classmethod
+    def from_mask(cls, mask):
+        return cls(_pack(mask), len(mask))
+
+    @classmethod
+    def empty(cls, n):
+        return cls(np.zeros((n + 63) // 64, dtype=np.uint64), n)
+
+    @classmethod
+    def full(cls, n):
+        return ~cls.empty(n)
+
+    def __and__(self, other):
+        return Bitset(self.words & other.words, self.n)
+
+    def __or__(self, other):
+        return Bitset(self.words | other.words, self.n)
+
+    def __sub__(self, other):
+        return Bitset(self.words & ~other.words, self.n)
+
+    def __invert__(self):
+        words = ~self.words
+        tail = self.n % 64
+        if tail and len(words):
+            # 行数を超える余りビットは常に0にしておく
+            words[-1] &= np.uint64((1 << tail) - 1)
+        return Bitset(words, self.n)
+
+    def count(self):
+        """該当する人数（ポップカウント）"""
+        return _popcount(self.words)
+
+    def to_mask(self):
+        """行ごとのブール配列に戻す"""
+        return np.unpackbits(self.words.view(np.uint8), count=self.n, bitorder='little').astype(bool)
+
+    def __repr__(self):
+        return f"Bitset({self.count()}/{self.n})"
+
+class SegmentIndex:
+    """回答値・選択肢・加入状況セグメントごとのビット列"""
+
+    def __init__(self, n_rows, weights=None):
+        self.n_rows = n_rows
+        # 行ごとのウェイト（Noneならウェイトなし）
+        self.weights = None if weights is None else np.asarray(weights, dtype=float)
+        # (キー, 回答値) -> Bitset（単一選択）、(キー, 選択肢) -> Bitset（複数選択）
+        self.values = {}
+        self.options = {}
+        # キー -> 回答のある行のBitset
+        self.answers = {}
+        # セグメント名 -> Bitset
+        self.segments = {}
+
+    @classmethod
+    @traced()
+    def from_frame(cls, df, indicators=None, weights=None):
+        """DataFrameからインデックスを作成する（列ごとに1回コード化する）
+
+        weightsを渡すと、total()はウェイト付きの人数を返す。
+        """
+        index = cls(len(df), weights)
+        for key in SINGLE_CHOICE_KEYS:
+            col = COLUMNS[key]
+            if col not in df.columns:
+                continue
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes, values = series.cat.codes.to_numpy(), list(series.cat.categories)
+            else:
+                codes, values = pd.factorize(series)
+                values = list(values)
+            for i, value in enumerate(values):
+                index.values[(key, value)] = Bitset.from_mask(codes == i)
+            index.answers[key] = Bitset.from_mask(codes >= 0)
+
+        if indicators is None:
+            indicators = build_indicators(df)
+        for key in MULTI_CHOICE_KEYS:
+            col = COLUMNS[key]
+            if col not in indicators:
+                continue
+            matrix = indicators[col]
+            for option, column in zip(matrix.columns, matrix.to_numpy().T):
+                index.options[(key, option)] = Bitset.from_mask(column > 0)
+            index.answers[key] = Bitset.from_mask(df[col].notna().to_numpy())
+
+        # 加入状況のセグメント: パターンに一致する回答値のビット列のOR
+        index.segments['all'] = index.all()
+        status_values = pd.Series([value for key, value in index.values if key == 'status'], dtype=object)
+        for name, pattern in STATUS_PATTERNS.items():
+            matched = status_values[contains(status_values, pattern)] if len(status_values) else []
+            index.segments[name] = index.any_of('status', matched)
+        # 年契約加入者のうち、短期→年契約の切り替え時期に回答した人
+        index.segments['switched'] = index.segments['year_plan'] & index.answered('switch_timing')
+        return index
+
+    def all(self):
+        """全回答者"""
+        return Bitset.full(self.n_rows)
+
+    def value(self, key, value):
+        """単一選択の設問で、その回答値を選んだ人"""
+        bitset = self.values.get((key, value))
+        return bitset if bitset is not None else Bitset.empty(self.n_rows)
+
+    def any_of(self, key, values):
+        """単一選択の設問で、いずれかの回答値を選んだ人"""
+        result = Bitset.empty(self.n_rows)
+        for value in values:
+            result = result | self.value(key, value)
+        return result
+
+    def option(self, key, option):
+        """複数選択の設問で、その選択肢を選んだ人"""
+        bitset = self.options.get((key, option))
+        return bitset if bitset is not None else Bitset.empty(self.n_rows)
+
+    def answered(self, key):
+        """その設問に回答した人"""
+        bitset = self.answers.get(key)
+        return bitset if bitset is not None else Bitset.empty(self.n_rows)
+
+    def segment(self, name):
+        """加入状況のセグメント（survey_segments.SEGMENTSの名前）"""
+        return self.segments[name]
+
+    def where(self, segment=None, **filters):
+        """セグメントと属性の条件をANDで組み合わせる
+
+        例: where('continuing', age=['60代', '70代以上'], gender='女性')
+        値にリストを渡すとそのいずれか（OR）。複数選択の設問はその選択肢を選んだ人。
+        """
+        result = self.segment(segment) if segment else self.all()
+        for key, values in filters.items():
+            if isinstance(values, str):
+                values = [values]
+            if SCHEMA[key]['kind'] == 'multi':
+                selected = Bitset.empty(self.n_rows)
+                for option in values:
+                    selected = selected | self.option(key, option)
+            else:
+                selected = self.any_of(key, values)
+            result = result & selected
+        return result
+
+    def total(self, bitset):
+        """集合の人数（ウェイトがあればウェイトの合計）"""
+        if self.weights is None:
+            return bitset.count()
+        return float(self.weights[bitset.to_mask()].sum())
+
+    def segment_masks(self):
+        """survey_segments.segment_masksと同じ形（セグメント名 -> ブール配列）"""
+        return {name: self.segments[name].to_mask() for name in SEGMENTS}
+
+def main():
+    """その場でセグメントの人数を求める（例: --segment continuing --filter age=60代,70代以上 gender=女性）"""
+    from survey_loader import CSV_PATH, load_survey
+
+    parser = argparse.ArgumentParser(description="セグメントの人数の確認")
+    parser.add_argument('--segment', choices=SEGMENTS, default=None, help="加入状況のセグメント")
+    parser.add_argument('--filter', nargs='*', default=[], metavar='KEY=VALUE[,VALUE...]',
+                        help="設問のキーと回答値（カンマ区切りでOR）")
+    args = parser.parse_args()
+
+    filters = {}
+    for item in args.filter:
+        key, _, values = item.partition('=')
+        if key not in SCHEMA:
+            parser.error(f"不明な設問のキー: {key}")
+        filters[key] = values.split(',')
+
+    df = load_survey(CSV_PATH)
+    index = SegmentIndex.from_frame(df)
+
+    start = time.perf_counter()
+    n = index.where(args.segment, **filters).count()
+    elapsed = time.perf_counter() - start
+
+    label = SEGMENT_LABELS[args.segment] if args.segment else SEGMENT_LABELS['all']
+    conditions = ' かつ '.join([label] + [f"{key}={'/'.join(values)}" for key, values in filters.items()])
+    print(f"{conditions}: {n}人 / {index.n_rows}人 ({n/index.n_rows*100:.1f}%)")
+    print(f"集計時間: {elapsed*1e6:.0f}µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+加入状況によるセグメント定義
+年契約・アップセル経験者・短期プラン・継続・非継続の判定を一か所にまとめる
+"""
+
+import numpy as np
+import pandas as pd
+
+from survey_schema import COLUMNS
+from survey_trace import traced
+
+# 加入状況の列に対する判定パターン（正規表現）
+STATUS_PATTERNS = {
+    'year_plan': '1年契約',
+    'short_plan': '7日契約|30日契約',
+    'continuing': '外あそびレジャー保険の1年契約に加入し、現在も加入中',
+    'discontinued': '契約が終了している|解約',
+}
+
+# セグメントの表示名
+SEGMENT_LABELS = {
+    'all': '全体',
+    'year_plan': '年契約加入者',
+    'switched': 'アップセル経験者',
+    'short_plan': '短期プラン加入者',
+    'continuing': '年契約継続者',
+    'discontinued': '非継続者',
+}
+
+SEGMENTS = list(SEGMENT_LABELS)
+
+def contains(series, pattern):
+    """str.containsと同じ判定をブール配列で返す（Categoricalはカテゴリ単位で判定する）"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        matched = np.asarray(series.cat.categories.astype(str).str.contains(pattern, regex=True), dtype=bool)
+        matched = np.append(matched, False)  # 欠損（コード-1）
+        return matched[series.cat.codes.to_numpy()]
+    return series.str.contains(pattern, na=False).to_numpy(dtype=bool)
+
+@traced()
+def segment_masks(df):
+    """セグメントごとのブールマスク"""
+    status = df[COLUMNS['status']]
+    masks = {'all': np.ones(len(df), dtype=bool)}
+    for name, pattern in STATUS_PATTERNS.items():
+        masks[name] = contains(status, pattern)
+    # 年契約加入者のうち、短期→年契約の切り替え時期に回答した人
+    masks['switched'] = masks['year_plan'] & df[COLUMNS['switch_timing']].notna().to_numpy()
+    return {name: masks[name] for name in SEGMENTS}
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+集計のクエリサービス（ローカルHTTP）
+アンケートを一度だけ読み込んでセグメントのビットマップインデックスをメモリに保持し、
+セグメントの人数・設問の回答件数・属性×設問のクロス集計をJSONで返す
+同じ問い合わせの結果はLRUキャッシュから返し、リクエストはスレッドで並行に処理する
+
+例:
+    curl 'http://127.0.0.1:8765/counts?key=channel&segment=continuing&gender=女性&age=30代'
+    curl 'http://127.0.0.1:8765/crosstab?attribute=age&key=join_reason'
+"""
+
+import argparse
+import json
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from survey_indicators import build_indicators
+from survey_loader import CSV_PATH, load_survey
+from survey_schema import SCHEMA
+from survey_segment_index import SegmentIndex
+from survey_segments import SEGMENTS
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 1024
+
+# フィルタではないクエリパラメータ
+RESERVED_PARAMS = {'segment', 'key', 'attribute'}
+
+class QueryError(ValueError):
+    """問い合わせの内容が不正（HTTP 400）"""
+
+class SurveyQueries:
+    """インデックスに対する問い合わせ（結果はLRUキャッシュに保持する）"""
+
+    def __init__(self, df, cache_size=DEFAULT_CACHE_SIZE):
+        self.index = SegmentIndex.from_frame(df, build_indicators(df))
+        self.n_rows = len(df)
+        # 設問のキー → 回答値・選択肢（インデックスに含まれるもの）
+        self.choices = {}
+        for key, value in self.index.values:
+            self.choices.setdefault(key, []).append(value)
+        for key, option in self.index.options:
+            self.choices.setdefault(key, []).append(option)
+        self._cached = lru_cache(maxsize=cache_size)(self._run)
+
+    def _select(self, segment, filters):
+        if segment is not None and segment not in SEGMENTS:
+            raise QueryError(f"不明なセグメント: {segment}（{', '.join(SEGMENTS)}）")
+        for key in dict(filters):
+            if key not in SCHEMA:
+                raise QueryError(f"不明な設問のキー: {key}")
+        return self.index.where(segment, **{key: list(values) for key, values in filters})
+
+    def _counts(self, selected, key):
+        if key not in self.choices:
+            raise QueryError(f"集計できない設問のキー: {key}")
+        multi = SCHEMA[key]['kind'] == 'multi'
+        counts = {}
+        for choice in self.choices[key]:
+            bitset = self.index.option(key, choice) if multi else self.index.value(key, choice)
+            n = (selected & bitset).count()
+            if n > 0:
+                counts[choice] = n
+        return dict(sorted(counts.items(), key=lambda item: -item[1]))
+
+    def _run(self, kind, segment, filters, key, attribute):
+        selected = self._select(segment, filters)
+        n = selected.count()
+        result = {'n': n, 'total': self.n_rows}
+        if kind == 'segment':
+            return result
+        if key is None:
+            raise QueryError("key（集計する設問）を指定してください")
+        if kind == 'counts':
+            counts = self._counts(selected, key)
+            result['counts'] = counts
+            result['shares'] = {choice: count / n * 100 for choice, count in counts.items()} if n else {}
+            return result
+        # crosstab: 属性値ごとの件数
+        if attribute is None:
+            raise QueryError("attribute（単一選択の属性のキー）を指定してください")
+        if SCHEMA.get(attribute, {}).get('kind') == 'multi' or attribute not in self.choices:
+            raise QueryError(f"不明な属性のキー: {attribute}（単一選択の設問のキーを指定してください）")
+        rows = {}
+        for value in self.choices.get(attribute, []):
+            cell = selected & self.index.value(attribute, value)
+            size = cell.count()
+            if size > 0:
+                rows[value] = {'n': size, 'counts': self._counts(cell, key)}
+        result['rows'] = rows
+        return result
+
+    def query(self, kind, params):
+        """問い合わせを実行する（params: クエリパラメータ {名前: [値]}）"""
+        filters = []
+        for name, values in params.items():
+            if name in RESERVED_PARAMS:
+                continue
+            choices = tuple(sorted(v for value in values for v in value.split(',') if v))
+            filters.append((name, choices))
+        # 条件の並び順によらず同じキャッシュのキーにする
+        args = (kind, params.get('segment', [None])[0], tuple(sorted(filters)),
+                params.get('key', [None])[0], params.get('attribute', [None])[0])
+        return self._cached(*args)
+
+    def cache_info(self):
+        info = self._cached.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxsize': info.maxsize}
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """GET /segment・/counts・/crosstab・/stats をJSONで返す"""
+
+    # Content-Lengthを必ず返すため、接続を使い回せる。ヘッダーと本文を別に送るので、
+    # Nagleアルゴリズムによる数十ミリ秒の待ちを避ける
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    queries = None
+    quiet = False
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        kind = url.path.strip('/')
+        start = time.perf_counter()
+        try:
+            if kind == 'stats':
+                body = {'rows': self.queries.n_rows, 'cache': self.queries.cache_info()}
+            elif kind in ('segment', 'counts', 'crosstab'):
+                body = dict(self.queries.query(kind, parse_qs(url.query)))
+            else:
+                self._send(404, {'error': f"不明なパス: {url.path}（/segment, /counts, /crosstab, /stats）"})
+                return
+        except QueryError as exc:
+            self._send(400, {'error': str(exc)})
+            return
+        except Exception as exc:
+            # 想定外のエラーでも応答を返し、接続を使い回せるようにする
+            self.log_error("問い合わせの処理に失敗しました: %r", exc)
+            self._send(500, {'error': f"内部エラー: {type(exc).__name__}: {exc}"})
+            return
+        body['elapsed_ms'] = (time.perf_counter() - start) * 1000
+        self._send(200, body)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+def serve(csv_path=CSV_PATH, host=DEFAULT_HOST, port=DEFAULT_PORT, cache_size=DEFAULT_CACHE_SIZE, quiet=False):
+    """サービスを起動する（Ctrl+Cで終了）"""
+    print("データを読み込んでいます...")
+    df = load_survey(csv_path)
+    QueryHandler.queries = SurveyQueries(df, cache_size)
+    QueryHandler.quiet = quiet
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    print(f"データ読み込み完了: {len(df)}件の回答")
+    print(f"✓ http://{host}:{server.server_port}/ で待ち受けています（/segment, /counts, /crosstab, /stats）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def start_background(queries, host=DEFAULT_HOST, port=0):
+    """テスト・ベンチマーク用に別スレッドで起動する（戻り値: サーバー。port=0で空いているポート）"""
+    QueryHandler.queries = queries
+    QueryHandler.quiet = True
+    server = ThreadingHTTPServer((host, port), QueryHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="集計のクエリサービス（ローカルHTTP）")
+    parser.add_argument('--csv', default=CSV_PATH, help="アンケートのCSV")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE, help="結果を保持する問い合わせの件数")
+    parser.add_argument('--quiet', action='store_true', help="アクセスログを表示しない")
+    args = parser.parse_args()
+    serve(args.csv, args.host, args.port, args.cache_size, args.quiet)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+属性値×選択肢の一括検定（リフト・有意差・多重比較の補正）
+全属性×設問×選択肢の組み合わせごとに、その属性値の回答者とそれ以外（同じ属性に回答した人）の
+選択率を比べ、リフト・カイ二乗検定（期待度数が小さい組み合わせはFisherの正確検定）のp値・
+Benjamini-Hochberg法で補正したp値を配列演算でまとめて求める
+"""
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from survey_trace import traced
+
+# 有意水準（補正後p値。偽発見率）
+ALPHA = 0.05
+
+# 期待度数がこれ未満の組み合わせはFisherの正確検定にする
+MIN_EXPECTED = 5
+
+# 特徴的な回答として挙げる組み合わせの最小件数
+MIN_COUNT = 5
+
+TEST_COLUMNS = ['属性', '属性値', '設問', '選択肢', '件数', '母数', 'それ以外の件数', 'それ以外の母数', '割合', 'それ以外の割合',
+                '差（pt）', 'リフト', '検定', 'p値', '補正後p値', '有意']
+
+def _erfc(x):
+    """相補誤差関数（Chebyshev近似。相対誤差1.2e-7未満）"""
+    z = np.abs(x)
+    t = 1.0 / (1.0 + 0.5 * z)
+    poly = -1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+        -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (
+            -0.82215223 + t * 0.17087277))))))))
+    result = t * np.exp(-z * z + poly)
+    return np.where(x >= 0, result, 2.0 - result)
+
+def _log_factorials(n):
+    """0!〜n!の対数"""
+    return np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, n + 1, dtype=float)))])
+
+def chi2_pvalues(a, b, c, d):
+    """2×2表（a b / c d）のカイ二乗検定（自由度1、補正なし）のp値"""
+    a, b, c, d = (np.asarray(v, dtype=float) for v in (a, b, c, d))
+    n = a + b + c + d
+    denominator = (a + b) * (c + d) * (a + c) * (b + d)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        chi2 = np.where(denominator > 0, n * (a * d - b * c) ** 2 / denominator, 0.0)
+    return np.minimum(_erfc(np.sqrt(chi2 / 2.0)), 1.0)
+
+def fisher_pvalues(a, row, col, n):
+    """2×2表のFisherの正確検定（両側）のp値（a: 左上の件数、row・col: 1行目・1列目の合計、n: 総数）
+
+    超幾何分布の確率を、全ての表の取りうる値を並べた2次元配列でまとめて計算する。
+    """
+    a, row, col, n = (np.asarray(v, dtype=np.int64) for v in (a, row, col, n))
+    if len(a) == 0:
+        return np.empty(0)
+    log_fact = _log_factorials(int(n.max()))
+    low = np.maximum(0, row + col - n)
+    high = np.minimum(row, col)
+    x = low[:, None] + np.arange(int((high - low).max()) + 1)[None, :]
+    valid = x <= high[:, None]
+    x = np.where(valid, x, low[:, None])
+
+    def log_pmf(k):
+        return (log_fact[col] + log_fact[n - col] + log_fact[row] + log_fact[n - row] - log_fact[n])[..., None] \
+            - log_fact[k] - log_fact[col[:, None] - k] - log_fact[row[:, None] - k] - log_fact[(n - col - row)[:, None] + k]
+
+    observed = log_pmf(a[:, None])[:, 0]
+    probs = log_pmf(x)
+    # 観測した表以下の確率の表の合計（浮動小数点の誤差を許容する）
+    extreme = valid & (probs <= observed[:, None] + 1e-7)
+    return np.minimum(np.where(extreme, np.exp(probs), 0.0).sum(axis=1), 1.0)
+
+def bh_adjust(pvalues):
+    """Benjamini-Hochberg法で補正したp値（nanは補正の対象外）"""
+    pvalues = np.asarray(pvalues, dtype=float)
+    adjusted = np.full(len(pvalues), np.nan)
+    tested = np.flatnonzero(~np.isnan(pvalues))
+    m = len(tested)
+    if m == 0:
+        return adjusted
+    order = tested[np.argsort(pvalues[tested], kind='stable')]
+    ranked = pvalues[order] * m / np.arange(1, m + 1)
+    adjusted[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return adjusted
+
+def contingency_cube(crosstab, segment_table):
+    """クロス集計（縦持ち）を、回答のなかった組み合わせも含む全ての属性値×選択肢の表にする
+
+    戻り値の列: 属性, 属性値, 設問, 選択肢, 件数, 母数, 選択肢の合計（属性に回答した人の中）, 属性の合計
+    """
+    sizes = segment_table.assign(属性の合計=segment_table.groupby('属性', sort=False)['母数'].transform('sum'))
+    options = crosstab.groupby(['属性', '設問', '選択肢'], sort=False, as_index=False)['件数'].sum()
+    options = options.rename(columns={'件数': '選択肢の合計'})
+    cube = sizes.merge(options, on='属性', how='inner')
+    cube = cube.merge(crosstab[['属性', '属性値', '設問', '選択肢', '件数']],
+                      on=['属性', '属性値', '設問', '選択肢'], how='left')
+    cube['件数'] = cube['件数'].fillna(0)
+    return cube[['属性', '属性値', '設問', '選択肢', '件数', '母数', '選択肢の合計', '属性の合計']]
+
+@traced()
+def test_cells(cube, alpha=ALPHA, min_expected=MIN_EXPECTED, design_effect=1.0):
+    """全ての属性値×選択肢を、その属性値の回答者とそれ以外で比べる（戻り値の列: TEST_COLUMNS）
+
+    design_effect: ウェイト付きの件数のデザイン効果（Kish）。件数をこれで割った有効サンプルサイズで検定する。
+    """
+    k = cube['件数'].to_numpy(dtype=float)
+    r = cube['母数'].to_numpy(dtype=float)
+    total = cube['選択肢の合計'].to_numpy(dtype=float)
+    n = cube['属性の合計'].to_numpy(dtype=float)
+    k_out, r_out = total - k, n - r
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate_in = np.where(r > 0, k / r, np.nan)
+        rate_out = np.where(r_out > 0, k_out / r_out, np.nan)
+        lift = rate_in / rate_out
+        expected = np.minimum.reduce([r * total, r * (n - total), r_out * total, r_out * (n - total)]) / n
+    testable = (r > 0) & (r_out > 0) & (total > 0) & (total < n)
+
+    pvalues = np.full(len(cube), np.nan)
+    cells = (k, r - k, k_out, r_out - k_out)
+    pvalues[testable] = chi2_pvalues(*(cell / design_effect for cell in cells))[testable]
+    exact = testable & (expected < min_expected)
+    # ウェイト付きの件数（小数）はカイ二乗検定のみ
+    exact &= np.equal(np.mod(k, 1), 0) & np.equal(np.mod(total, 1), 0)
+    if exact.any():
+        pvalues[exact] = fisher_pvalues(k[exact], r[exact], total[exact], n[exact])
+    adjusted = bh_adjust(pvalues)
+
+    table = cube[['属性', '属性値', '設問', '選択肢', '件数', '母数']].copy()
+    table['それ以外の件数'] = k_out
+    table['それ以外の母数'] = r_out
+    table['割合'] = rate_in * 100
+    table['それ以外の割合'] = rate_out * 100
+    table['差（pt）'] = (rate_in - rate_out) * 100
+    table['リフト'] = lift
+    table['検定'] = np.where(exact, 'Fisher', np.where(testable, 'カイ二乗', '-'))
+    table['p値'] = pvalues
+    table['補正後p値'] = adjusted
+    table['有意'] = adjusted < alpha
+    return table[TEST_COLUMNS]
+
+def distinctive_cells(table, k=10, min_count=MIN_COUNT, higher=True):
+    """有意な組み合わせのうち、リフトの大きい順（higher=Falseなら小さい順）に上位k件"""
+    selected = table[table['有意'] & (table['件数'] >= min_count)]
+    selected = selected[selected['リフト'] > 1] if higher else selected[selected['リフト'] < 1]
+    return selected.sort_values(['リフト', '補正後p値'], ascending=[not higher, True], kind='stable').head(k)
+
+def significance_table(crosstab, segment_table, alpha=ALPHA, design_effect=1.0):
+    """クロス集計と属性値ごとの人数から、全ての組み合わせの検定結果の表を作る（design_effect: test_cellsを参照）"""
+    return test_cells(contingency_cube(crosstab, segment_table), alpha, design_effect=design_effect)
+
+def main():
+    """全ての属性値×選択肢を検定し、特徴的な組み合わせを表示する"""
+    from survey_crosstab import compute_crosstabs, segment_sizes
+    from survey_indicators import build_indicators
+    from survey_loader import CSV_PATH, load_survey
+
+    parser = argparse.ArgumentParser(description="属性値×選択肢の一括検定（リフト・有意差）")
+    parser.add_argument('--top', type=int, default=20, help="表示する組み合わせの件数")
+    parser.add_argument('--alpha', type=float, default=ALPHA, help="有意水準（補正後p値）")
+    parser.add_argument('--output', type=Path, default=None, help="全ての組み合わせの検定結果（CSV）の保存先")
+    args = parser.parse_args()
+
+    df = load_survey(CSV_PATH)
+    crosstab = compute_crosstabs(df, build_indicators(df))
+    table = significance_table(crosstab, segment_sizes(df), args.alpha)
+    print(f"検定した組み合わせ: {int(table['p値'].notna().sum())}件、"
+          f"有意（補正後p値 < {args.alpha}）: {int(table['有意'].sum())}件")
+    columns = ['属性', '属性値', '設問', '選択肢', '件数', '割合', 'それ以外の割合', 'リフト', '補正後p値']
+    for title, higher in (("それ以外より高い回答", True), ("それ以外より低い回答", False)):
+        print(f"\n【{title}】")
+        cells = distinctive_cells(table, args.top, higher=higher)
+        print(cells[columns].round(3).to_string(index=False) if len(cells) else "  なし")
+    if args.output:
+        table.to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"\n✓ 検定結果を保存: {args.output}")
+
+if __name__ == "__main__":
+    main()
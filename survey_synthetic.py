@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成アンケートデータの生成
+実データと同じ列構成・回答の選択肢・複数選択のカンマ区切り・加入状況による設問の分岐（未回答の空欄）で
+任意の件数のCSVを作成する（ベンチマークや共有用。実データは含まない）
+"""
+
+import argparse
+import csv
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from survey_schema import COLUMNS, SCHEMA
+
+# 選択肢が定義されていない設問の回答例
+VOCABULARIES = {
+    'decision': [
+        '補償内容・保険金額の一覧',
+        '保険料の例',
+        '遭難捜索・救助費用の補償',
+        '加入手続きの流れ',
+        'よくある質問',
+    ],
+    'switch_timing': ['1か月以内', '1〜3か月以内', '3〜6か月以内', '6か月以上前'],
+    'hesitation': ['保険料', '補償内容', '契約期間', '登山の予定が立たない', '特に迷わなかった'],
+}
+
+# 自由記述の例（改行・カンマを含む回答も混ぜる）
+TEXT_SAMPLES = [
+    '普段は低山がメインの為。遠征でアルプスに行く時にスポットで入る方が安いと思いました',
+    '登山の回数が減ったため',
+    '他社の保険に切り替えました。\n補償内容はほぼ同じです',
+    '保険料が高い, 利用しなかった',
+]
+
+# 回答の分布（選択肢の定義順の重み。定義がない設問は均等）
+WEIGHTS = {
+    'age': [1, 32, 65, 338, 829, 622, 124],
+    'gender': [65, 33, 1, 1],
+    'history': [5, 12, 13, 25, 45],
+    'frequency': [3, 20, 25, 30, 15, 7],
+    'status': [890, 788, 37, 228, 14],
+    'ease': [1, 4, 10, 40, 45],
+    'recommend': [30, 45, 20, 4, 1],
+}
+
+# 加入状況ごとに回答する設問（それ以外の人は空欄）
+STATUS_QUESTIONS = {
+    '外あそびレジャー保険の1年契約に加入し、現在も加入中': ['year_plan_reason'],
+    '外あそびレジャー保険の7日契約、もしくは30日契約に現在加入中': ['future_intention'],
+    '外あそびレジャー保険の7日契約、もしくは30日契約に加入し、現在は契約が終了している':
+        ['future_intention', 'cancel_reason', 'cancel_detail'],
+    '外あそびレジャー保険の7日・30日契約に加入した後に、1年契約に移行した':
+        ['switch_trigger', 'switch_timing', 'hesitation'],
+}
+
+# 複数選択で作成する回答の組み合わせの種類数（上限）
+N_COMBINATIONS = 64
+
+DEFAULT_CHUNKSIZE = 100_000
+
+START_TIME = pd.Timestamp('2025-10-01 09:00:00')
+
+def _vocabulary(key):
+    return SCHEMA[key].get('domain') or VOCABULARIES.get(key, [])
+
+def _probabilities(key, n_values):
+    weights = np.asarray(WEIGHTS.get(key, np.ones(n_values)), dtype=float)
+    return weights / weights.sum()
+
+def _combinations(rng, options, n_combinations=N_COMBINATIONS, max_selected=3):
+    """複数選択の回答（1〜3個の選択肢をカンマ区切り）の候補と出現確率"""
+    combos = []
+    for _ in range(n_combinations):
+        size = rng.integers(1, min(max_selected, len(options)) + 1)
+        picked = sorted(rng.choice(len(options), size=size, replace=False))
+        combos.append(', '.join(options[i] for i in picked))
+    # 組み合わせの出現頻度は偏りを持たせる（Zipf分布）
+    weights = 1 / np.arange(1, len(combos) + 1)
+    return combos, weights / weights.sum()
+
+# 時:分:秒の文字列（フォームの書式は時がゼロ埋めなし。例: 9:14:39）
+_TIMES_OF_DAY = np.array([f"{s // 3600}:{s // 60 % 60:02d}:{s % 60:02d}" for s in range(86400)], dtype=object)
+
+def _format_timestamps(seconds):
+    """UNIX秒の配列をフォームのタイムスタンプ文字列（例: 2025/11/05 9:14:39）にする
+
+    strftimeは件数が多いと遅いため、日付は日ごと、時刻は1日分の表から引く。
+    """
+    days, time_of_day = np.divmod(seconds, 86400)
+    unique_days, day_codes = np.unique(days, return_inverse=True)
+    dates = np.array([pd.Timestamp(int(day) * 86400, unit='s').strftime('%Y/%m/%d ') for day in unique_days],
+                     dtype=object)
+    return dates[day_codes] + _TIMES_OF_DAY[time_of_day]
+
+class SurveyGenerator:
+    """合成データの生成器（seedが同じなら同じデータになる）"""
+
+    def __init__(self, seed=0):
+        self.rng = np.random.default_rng(seed)
+        self.choices = {}
+        for key, spec in SCHEMA.items():
+            vocabulary = _vocabulary(key)
+            if spec['kind'] == 'multi':
+                self.choices[key] = _combinations(self.rng, vocabulary)
+            elif spec['kind'] in ('single', 'ordinal'):
+                self.choices[key] = (vocabulary, _probabilities(key, len(vocabulary)))
+        self.n_generated = 0
+        self.last_second = int(START_TIME.timestamp())
+
+    def _pick(self, key, n):
+        values, p = self.choices[key]
+        return np.asarray(values, dtype=object)[self.rng.choice(len(values), size=n, p=p)]
+
+    def _columns(self, n):
+        """n件分の回答を列ごとの配列で返す（キーは列名）"""
+        data = {}
+        # 回答時刻: 前の回答から平均1分後（昇順）
+        gaps = self.rng.exponential(60, size=n).round().astype('int64') + 1
+        seconds = self.last_second + np.cumsum(gaps)
+        self.last_second = int(seconds[-1]) if n else self.last_second
+        data['timestamp'] = _format_timestamps(seconds)
+        data['user_id'] = [f'u{i:08d}' for i in range(self.n_generated, self.n_generated + n)]
+        self.n_generated += n
+
+        for key in self.choices:
+            data[key] = self._pick(key, n)
+
+        # 自由記述は半数程度が空欄
+        data['cancel_detail'] = np.asarray(TEXT_SAMPLES, dtype=object)[self.rng.integers(len(TEXT_SAMPLES), size=n)]
+        data['cancel_detail'][self.rng.random(n) < 0.5] = None
+
+        # 加入状況による分岐: 対象外の人は空欄
+        answering = {}
+        for value, keys in STATUS_QUESTIONS.items():
+            for key in keys:
+                answering[key] = answering.get(key, np.zeros(n, dtype=bool)) | (data['status'] == value)
+        for key, mask in answering.items():
+            data[key] = np.where(mask, data[key], None)
+
+        return {COLUMNS[key]: data[key] for key in SCHEMA}
+
+    def generate(self, n):
+        """n件分の回答（列名は実データと同じ）"""
+        return pd.DataFrame(self._columns(n))
+
+    def write_csv(self, path, n_rows, chunksize=DEFAULT_CHUNKSIZE):
+        """n_rows件のCSVをチャンクごとに書き出す（1000万件でもメモリはチャンク分で済む）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS.values())
+            for start in range(0, n_rows, chunksize):
+                # DataFrame.to_csvより速いため、列の配列をそのまま行に組み替えて書き出す（Noneは空欄）
+                writer.writerows(zip(*self._columns(min(chunksize, n_rows - start)).values()))
+        tmp_path.replace(path)
+        return path
+
+def generate_survey(n_rows, seed=0):
+    """n_rows件の合成データ（DataFrame）"""
+    return SurveyGenerator(seed).generate(n_rows)
+
+def write_survey_csv(path, n_rows, seed=0, chunksize=DEFAULT_CHUNKSIZE):
+    """n_rows件の合成データをCSVに書き出す"""
+    return SurveyGenerator(seed).write_csv(path, n_rows, chunksize)
+
+def main():
+    parser = argparse.ArgumentParser(description="合成アンケートデータ（CSV）の生成")
+    parser.add_argument('rows', type=int, help="件数（例: 1000, 100000, 1000000, 10000000）")
+    parser.add_argument('output', type=Path, help="出力先のCSVファイル")
+    parser.add_argument('--seed', type=int, default=0, help="乱数のシード")
+    args = parser.parse_args()
+
+    path = write_survey_csv(args.output, args.rows, args.seed)
+    print(f"✓ 合成データを保存: {path}（{args.rows}件）")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自由記述の全文検索と語句の統計
+自由記述の列の全回答を文字2-gramの転置インデックスにし、キーワード・フレーズの検索（セグメントで絞り込み）、
+頻出語句、セグメントに特徴的な語句を求める（形態素解析は使わない）
+"""
+
+import argparse
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from survey_schema import COLUMNS, TEXT_KEYS
+from survey_segments import SEGMENT_LABELS, SEGMENTS
+from survey_trace import traced
+
+# インデックスのn-gramの長さ
+NGRAM = 2
+
+# 特徴的な語句の事前分布の強さ（語句1つあたりの疑似的な回答件数。候補の語句の数を掛けて両側に同じ重みで加える）
+PRIOR_COUNT = 0.5
+
+DISTINCTIVE_COLUMNS = ['語句', '件数', '割合', 'それ以外の割合', '特徴度']
+
+def _is_term(gram):
+    """語句の統計に含めるか（記号・空白を含む語句と、ひらがなだけの「した」「ため」などは除く）"""
+    if any(unicodedata.category(ch)[0] in 'PZC' for ch in gram):
+        return False
+    return not all('\u3040' <= ch <= '\u309f' for ch in gram)
+
+def normalize(text):
+    """表記ゆれを揃える（全角英数→半角、英字は小文字、改行は空白）"""
+    return unicodedata.normalize('NFKC', str(text)).lower().replace('\r', ' ').replace('\n', ' ')
+
+def _codepoints(texts):
+    """文字列のリストを1本のコードポイント配列と各文字列の開始位置にする"""
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    starts = np.concatenate([[0], np.cumsum(lengths)])
+    points = np.frombuffer(''.join(texts).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    return points, starts
+
+def _gram_keys(points, starts, n=NGRAM):
+    """全文書のn-gramを (文書番号, n-gramの数値キー) の配列で返す（文書をまたぐn-gramは除く）"""
+    n_points = len(points)
+    if n_points < n:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+    # コードポイント（21bit）をn個連結した数値キー
+    keys = np.zeros(n_points - n + 1, dtype=np.uint64)
+    for offset in range(n):
+        keys = (keys << np.uint64(21)) | points[offset:n_points - n + 1 + offset]
+    position = np.arange(len(keys))
+    doc = np.searchsorted(starts, position, side='right') - 1
+    valid = position + n <= starts[doc + 1]
+    return doc[valid], keys[valid]
+
+def _decode(key, n=NGRAM):
+    chars = []
+    for _ in range(n):
+        chars.append(chr(int(key) & 0x1FFFFF))
+        key = int(key) >> 21
+    return ''.join(reversed(chars))
+
+class TextIndex:
+    """自由記述の転置インデックス
+
+    同じ文面の回答は1文書にまとめ、行ごとに文書番号（回答なしは-1）を持つ。
+    n-gram → 文書番号のポスティングはCSR形式（indptr / docs）の配列で持つ。
+    """
+
+    def __init__(self, texts, codes, keys, indptr, docs, n=NGRAM):
+        self.texts = texts        # 文書番号 -> 正規化した文面
+        self.codes = codes        # 設問のキー -> 行ごとの文書番号
+        self.keys = keys          # n-gramの数値キー（昇順）
+        self.indptr = indptr
+        self.docs = docs
+        self.n = n
+        self.n_rows = len(next(iter(codes.values()))) if codes else 0
+        self._originals = {}
+
+    @classmethod
+    @traced()
+    def from_frame(cls, df, text_keys=TEXT_KEYS, n=NGRAM):
+        """DataFrameの自由記述の列からインデックスを作成する"""
+        columns = {key: df[COLUMNS[key]] for key in text_keys if COLUMNS[key] in df.columns}
+        normalized = {key: series.dropna().astype(str).map(normalize) for key, series in columns.items()}
+        texts = pd.unique(pd.concat(list(normalized.values()))) if normalized else np.array([], dtype=object)
+        lookup = pd.Index(texts)
+        codes = {}
+        for key, series in columns.items():
+            row_codes = np.full(len(df), -1, dtype=np.int64)
+            row_codes[series.notna().to_numpy()] = lookup.get_indexer(normalized[key])
+            codes[key] = row_codes
+
+        points, starts = _codepoints(list(texts))
+        doc, gram = _gram_keys(points, starts, n)
+        # n-gramに昇順の番号を振る（np.uniqueのreturn_inverseより速いハッシュで一意化してから並べる）
+        gram_codes, uniques = pd.factorize(gram)
+        order = np.argsort(uniques, kind='stable')
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        keys, gram_ids = uniques[order], rank[gram_codes]
+        # (n-gram, 文書) の重複を除き、n-gram順に並べる
+        pairs = np.sort(gram_ids * max(len(texts), 1) + doc)
+        pairs = pairs[np.concatenate([[True], pairs[1:] != pairs[:-1]])]
+        pair_grams, pair_docs = np.divmod(pairs, max(len(texts), 1))
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(pair_grams, minlength=len(keys)))])
+        index = cls(np.asarray(texts, dtype=object), codes, keys, indptr, pair_docs, n)
+        index._originals = {key: series for key, series in columns.items()}
+        return index
+
+    def _postings(self, key):
+        i = np.searchsorted(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return np.empty(0, dtype=np.int64)
+        return self.docs[self.indptr[i]:self.indptr[i + 1]]
+
+    def matching_docs(self, query):
+        """文面にqueryを含む文書番号（n-gramのポスティングの積集合 → 部分一致で確認）"""
+        query = normalize(query)
+        if len(query) < self.n:
+            candidates = np.arange(len(self.texts))
+        else:
+            points, starts = _codepoints([query])
+            _, grams = _gram_keys(points, starts, self.n)
+            postings = sorted((self._postings(key) for key in np.unique(grams)), key=len)
+            candidates = postings[0]
+            for other in postings[1:]:
+                if len(candidates) == 0:
+                    break
+                candidates = np.intersect1d(candidates, other, assume_unique=True)
+        found = pd.Series(self.texts[candidates], dtype=object).str.contains(query, regex=False).to_numpy(dtype=bool)
+        return np.asarray(candidates, dtype=np.int64)[found]
+
+    def _doc_mask(self, docs):
+        hit = np.zeros(len(self.texts) + 1, dtype=bool)
+        hit[docs] = True
+        return hit
+
+    def search(self, query, rows=None, text_keys=None):
+        """queryを含む回答の行のブール配列（rows: 絞り込む行のブール配列。セグメントなど）"""
+        hit = self._doc_mask(self.matching_docs(query))
+        mask = np.zeros(self.n_rows, dtype=bool)
+        for key in text_keys or self.codes:
+            # 回答なし（-1）は末尾の番兵（常にFalse）を参照する
+            mask |= hit[self.codes[key]]
+        if rows is not None:
+            mask &= rows
+        return mask
+
+    def comments(self, mask, limit=None, text_keys=None):
+        """行のブール配列に該当する元の文面（設問のキー, 行番号, 文面）を行順に最大limit件"""
+        results = []
+        for key in text_keys or self.codes:
+            series = self._originals[key]
+            rows = np.flatnonzero(mask & (self.codes[key] >= 0))
+            for row in rows[:limit]:
+                results.append((key, int(row), series.iloc[row]))
+        return results[:limit]
+
+    def _doc_weights(self, rows=None, text_keys=None):
+        """文書ごとの回答件数（rowsで絞り込み）"""
+        weights = np.zeros(len(self.texts), dtype=np.int64)
+        for key in text_keys or self.codes:
+            codes = self.codes[key]
+            selected = codes >= 0 if rows is None else (codes >= 0) & rows
+            weights += np.bincount(codes[selected], minlength=len(self.texts))
+        return weights
+
+    def _term_counts(self, weights):
+        """n-gramごとの、その語句を含む回答の件数"""
+        gram_ids = np.repeat(np.arange(len(self.keys)), np.diff(self.indptr))
+        return np.bincount(gram_ids, weights=weights[self.docs], minlength=len(self.keys)).astype(np.int64)
+
+    def _term_frame(self, counts, min_count):
+        ids = np.flatnonzero(counts >= max(min_count, 1))
+        terms = [_decode(self.keys[i], self.n) for i in ids]
+        keep = [i for i, term in enumerate(terms) if _is_term(term)]
+        return ids[keep], [terms[i] for i in keep]
+
+    def top_terms(self, rows=None, k=20, min_count=1, text_keys=None):
+        """頻出語句（その語句を含む回答の件数の多い順）"""
+        weights = self._doc_weights(rows, text_keys)
+        n_answers = int(weights.sum())
+        counts = self._term_counts(weights)
+        ids, terms = self._term_frame(counts, min_count)
+        table = pd.DataFrame({'語句': terms, '件数': counts[ids]})
+        table['割合'] = table['件数'] / n_answers * 100 if n_answers else 0.0
+        return table.sort_values(['件数', '語句'], ascending=[False, True], kind='stable').head(k).reset_index(drop=True)
+
+    def distinctive_terms(self, rows, k=20, min_count=3, text_keys=None):
+        """rowsの回答に特徴的な語句（それ以外の回答と比べた、平滑化した対数オッズ比の大きい順）
+
+        両側に同じ事前分布（全回答での出現率を平均とし、重みは PRIOR_COUNT × 候補の語句の数）を加えるため、
+        件数の少ない語句の比が極端にならず、それ以外の回答が少なくても向きは逆転しない。
+        それ以外の回答がない場合は比べられないため空の表を返す。
+        """
+        inside = self._doc_weights(rows, text_keys)
+        outside = self._doc_weights(~rows, text_keys)
+        n_in, n_out = int(inside.sum()), int(outside.sum())
+        if n_in == 0 or n_out == 0:
+            return pd.DataFrame(columns=DISTINCTIVE_COLUMNS)
+        counts_in = self._term_counts(inside)
+        counts_out = self._term_counts(outside)
+        ids, terms = self._term_frame(counts_in, min_count)
+        c_in, c_out = counts_in[ids].astype(float), counts_out[ids].astype(float)
+        prior = PRIOR_COUNT * len(ids)
+        pooled = (c_in + c_out) / (n_in + n_out)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            log_odds_in = np.log2(c_in + prior * pooled) - np.log2(n_in - c_in + prior * (1 - pooled))
+            log_odds_out = np.log2(c_out + prior * pooled) - np.log2(n_out - c_out + prior * (1 - pooled))
+            score = log_odds_in - log_odds_out
+        # 全ての回答に含まれる語句（オッズが無限大）は差がないものとする
+        score = np.where(np.isfinite(score), score, 0.0)
+        table = pd.DataFrame({
+            '語句': terms,
+            '件数': counts_in[ids],
+            '割合': c_in / n_in * 100,
+            'それ以外の割合': c_out / n_out * 100,
+            '特徴度': score,
+        }, columns=DISTINCTIVE_COLUMNS)
+        return table.sort_values(['特徴度', '件数'], ascending=False, kind='stable').head(k).reset_index(drop=True)
+
+def main():
+    """自由記述を検索する（例: 保険料 --segment discontinued / --top 20 / --distinctive discontinued）"""
+    from survey_loader import CSV_PATH, load_survey
+    from survey_segment_index import SegmentIndex
+
+    parser = argparse.ArgumentParser(description="自由記述の検索と語句の統計")
+    parser.add_argument('query', nargs='?', default=None, help="検索する語句（部分一致）")
+    parser.add_argument('--segment', choices=SEGMENTS, default=None, help="加入状況のセグメントで絞り込む")
+    parser.add_argument('--limit', type=int, default=10, help="表示する回答の件数")
+    parser.add_argument('--top', type=int, default=None, metavar='K', help="頻出語句を上位K件表示する")
+    parser.add_argument('--distinctive', choices=SEGMENTS, default=None,
+                        help="そのセグメントに特徴的な語句を表示する")
+    args = parser.parse_args()
+
+    df = load_survey(CSV_PATH)
+    start = time.perf_counter()
+    index = TextIndex.from_frame(df)
+    print(f"インデックス作成: {len(index.texts)}種類の文面（{(time.perf_counter() - start)*1000:.0f}ms）")
+    segment = SegmentIndex.from_frame(df)
+    rows = segment.segment(args.segment).to_mask() if args.segment else None
+    label = SEGMENT_LABELS[args.segment or 'all']
+
+    if args.query:
+        start = time.perf_counter()
+        mask = index.search(args.query, rows)
+        elapsed = time.perf_counter() - start
+        print(f"\n「{args.query}」を含む回答（{label}）: {int(mask.sum())}件（検索時間: {elapsed*1000:.1f}ms）")
+        for key, row, text in index.comments(mask, args.limit):
+            print(f"  [{row}] {text}")
+
+    if args.top:
+        print(f"\n【頻出語句（{label}）】")
+        print(index.top_terms(rows, args.top).round(1).to_string(index=False))
+
+    if args.distinctive:
+        print(f"\n【{SEGMENT_LABELS[args.distinctive]}に特徴的な語句】")
+        table = index.distinctive_terms(segment.segment(args.distinctive).to_mask())
+        print(table.round(2).to_string(index=False) if len(table) else "  なし（比べる回答がありません）")
+
+if __name__ == "__main__":
+    main()
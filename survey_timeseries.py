@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回答の時系列（到着曲線・直近N日の構成比・キャンペーン別のコホート）
+タイムスタンプは書式を指定して一度だけ日時にパースし、元ファイルごとに .cache/survey/ に保存する。
+集計は日×回答値の件数表（1回のbincount）の累積和の差とresampleで求め、期間ごとに行を
+絞り込み直さないため、何年分の回答が続けて集まっても行の走査は1回で済む
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from survey_loader import CACHE_DIR, CSV_PATH, file_fingerprint, load_survey
+from survey_schema import COLUMNS, SCHEMA
+from survey_trace import traced
+
+# フォームのタイムスタンプの書式（時はゼロ埋めなし。例: 2025/11/05 9:14:39）
+TIMESTAMP_FORMAT = '%Y/%m/%d %H:%M:%S'
+
+# キャッシュの形式を変えたときに上げる
+TIMESTAMPS_VERSION = 1
+
+# 到着曲線の集計単位（D: 日別、W: 週別。週は月曜始まり）
+FREQUENCIES = {'D': 'D', 'W': 'W-MON'}
+
+# 直近N日の構成比・コホートの構成比を求める設問（キー: 表示名）と日数
+ROLLING_KEYS = {'join_timing': '加入タイミング', 'status': '加入状況'}
+ROLLING_WINDOW = 7
+
+ARRIVAL_COLUMNS = ['期間', '回答数', '累計回答数', '累計割合']
+
+# キャンペーン期間のCSVの列（終了日はその日を含む）
+CAMPAIGN_COLUMNS = ['キャンペーン', '開始日', '終了日']
+
+OUTSIDE_CAMPAIGN = 'キャンペーン期間外'
+
+COHORT_COLUMNS = ['キャンペーン', '開始日', '終了日', '回答数', '1日あたり回答数', '構成比']
+COHORT_SHARE_COLUMNS = ['キャンペーン', '設問', '回答', '件数', '母数', '割合']
+
+def parse_timestamps(values):
+    """タイムスタンプの文字列をdatetime64[s]の配列にする（欠損・書式の違う値はNaT）"""
+    parsed = pd.to_datetime(pd.Series(values, dtype='str'), format=TIMESTAMP_FORMAT, errors='coerce')
+    return parsed.to_numpy().astype('datetime64[s]')
+
+def timestamp_range(values):
+    """最も古い・新しいタイムスタンプを元の文字列で返す（日時として比較する）
+
+    文字列のままでは「9:14:39」が「17:02:10」より後になるため、パースしてから比べる。
+    日時として読める値がなければ文字列の順、値がなければ (None, None)。
+    """
+    values = pd.Series(values, dtype='str').dropna()
+    if len(values) == 0:
+        return None, None
+    parsed = parse_timestamps(values)
+    valid = np.flatnonzero(~np.isnat(parsed))
+    if len(valid) == 0:
+        return values.min(), values.max()
+    return values.iloc[valid[parsed[valid].argmin()]], values.iloc[valid[parsed[valid].argmax()]]
+
+def timestamps_path_for(csv_path, cache_dir=CACHE_DIR):
+    """元ファイルごとのパース済みタイムスタンプのパス（.npy）"""
+    key = hashlib.sha256(str(Path(csv_path).resolve()).encode('utf-8')).hexdigest()[:16]
+    return Path(cache_dir) / f"{key}.timestamps.npy"
+
+def _is_fresh(meta, csv_path):
+    """保存したタイムスタンプが元ファイルと一致しているか（更新時刻が違えば内容ハッシュで判定）"""
+    if meta is None or meta.get('version') != TIMESTAMPS_VERSION:
+        return False
+    stat = os.stat(csv_path)
+    if meta.get('size') != stat.st_size:
+        return False
+    return meta.get('mtime_ns') == stat.st_mtime_ns or meta.get('sha256') == file_fingerprint(csv_path)['sha256']
+
+@traced()
+def load_timestamps(csv_path=CSV_PATH, df=None, cache_dir=CACHE_DIR):
+    """行ごとの回答日時（datetime64[s]。保存済みで元ファイルが変わっていなければパースしない）
+
+    df: 読み込み済みのDataFrame（パースし直す場合に使う。省略時はload_survey）
+    """
+    csv_path = Path(csv_path)
+    data_path = timestamps_path_for(csv_path, cache_dir)
+    meta_path = data_path.with_suffix('.json')
+    try:
+        meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        if _is_fresh(meta, csv_path):
+            return np.load(data_path, allow_pickle=False)
+    except (OSError, ValueError):
+        pass
+
+    if df is None:
+        df = load_survey(csv_path, cache_dir=cache_dir)
+    timestamps = parse_timestamps(df[COLUMNS['timestamp']])
+    data_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = data_path.with_name(data_path.name + '.tmp.npy')
+    np.save(tmp_path, timestamps, allow_pickle=False)
+    os.replace(tmp_path, data_path)
+    meta = dict(file_fingerprint(csv_path), version=TIMESTAMPS_VERSION, source=str(csv_path))
+    meta_path.write_text(json.dumps(meta, ensure_ascii=False), encoding='utf-8')
+    return timestamps
+
+def _day_index(timestamps):
+    """行ごとの日の番号（最初の回答日が0、日時のない行は-1）と、最初から最後の回答日までの日付"""
+    days = np.asarray(timestamps).astype('datetime64[D]')
+    valid = ~np.isnat(days)
+    if not valid.any():
+        return np.full(len(days), -1, dtype=np.int64), pd.DatetimeIndex([], name='日付')
+    first, last = days[valid].min(), days[valid].max()
+    index = np.where(valid, (days - first).astype(np.int64), -1)
+    return index, pd.date_range(first, last, freq='D', name='日付')
+
+def _codes(series):
+    """単一選択の列を (コード, 回答値) にする（欠損は-1）"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy().astype(np.int64), list(series.cat.categories)
+    codes, values = pd.factorize(series)
+    return codes.astype(np.int64), list(values)
+
+def _daily_counts(day, codes, n_days, n_values):
+    """日×回答値の件数表（1回のbincount）"""
+    valid = (day >= 0) & (codes >= 0)
+    counts = np.bincount(day[valid] * n_values + codes[valid], minlength=n_days * n_values)
+    return counts.reshape(n_days, n_values)
+
+@traced()
+def arrival_curve(timestamps, freq='D'):
+    """期間ごとの回答数と累計（freq: 'D' 日別 / 'W' 週別。回答のない期間も0件で含む）"""
+    if freq not in FREQUENCIES:
+        raise ValueError(f"不明な集計単位: {freq}（{', '.join(FREQUENCIES)}）")
+    day, dates = _day_index(timestamps)
+    counts = pd.Series(np.bincount(day[day >= 0], minlength=len(dates)), index=dates)
+    if freq != 'D':
+        counts = counts.resample(FREQUENCIES[freq], label='left', closed='left').sum()
+    cumulative = counts.cumsum()
+    total = int(cumulative.iloc[-1]) if len(cumulative) else 0
+    return pd.DataFrame({
+        '期間': counts.index,
+        '回答数': counts.to_numpy(),
+        '累計回答数': cumulative.to_numpy(),
+        '累計割合': cumulative.to_numpy() / total * 100 if total else np.zeros(len(counts)),
+    }, columns=ARRIVAL_COLUMNS)
+
+@traced()
+def rolling_shares(df, timestamps, key, window=ROLLING_WINDOW):
+    """日ごとの、その日までの直近window日の回答値の構成比（%）
+
+    戻り値: 日付を行、回答値（一度も回答のない値を除く）を列とする表と、末尾の列「回答数」（直近window日の人数）
+    """
+    if window < 1:
+        raise ValueError(f"日数は1以上にしてください: {window}")
+    codes, values = _codes(df[COLUMNS[key]])
+    day, dates = _day_index(timestamps)
+    counts = _daily_counts(day, codes, len(dates), len(values))
+    # 直近window日の件数 = 累積和の差
+    cumulative = np.vstack([np.zeros((1, len(values)), dtype=np.int64), counts.cumsum(axis=0)])
+    end = np.arange(1, len(dates) + 1)
+    in_window = cumulative[end] - cumulative[np.maximum(end - window, 0)]
+    totals = in_window.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        shares = np.where(totals[:, None] > 0, in_window / totals[:, None] * 100, np.nan)
+    present = counts.sum(axis=0) > 0
+    table = pd.DataFrame(shares[:, present], index=dates, columns=[values[i] for i in np.flatnonzero(present)])
+    table['回答数'] = totals
+    return table
+
+def read_campaigns(path):
+    """キャンペーン期間のCSV（キャンペーン, 開始日, 終了日）を開始日順の表にする（期間の重なりはエラー）"""
+    table = pd.read_csv(path, encoding='utf-8-sig', dtype=str)
+    missing = [col for col in CAMPAIGN_COLUMNS if col not in table.columns]
+    if missing:
+        raise ValueError(f"キャンペーン期間のCSVに列がありません: {missing}（{', '.join(CAMPAIGN_COLUMNS)}）")
+    campaigns = pd.DataFrame({
+        'キャンペーン': table['キャンペーン'].str.strip(),
+        '開始日': pd.to_datetime(table['開始日'], errors='raise'),
+        '終了日': pd.to_datetime(table['終了日'], errors='raise'),
+    })
+    if campaigns['キャンペーン'].duplicated().any():
+        raise ValueError(f"キャンペーン名が重複しています: {list(campaigns['キャンペーン'])}")
+    if (campaigns['終了日'] < campaigns['開始日']).any():
+        raise ValueError("終了日が開始日より前のキャンペーンがあります")
+    campaigns = campaigns.sort_values('開始日', kind='stable').reset_index(drop=True)
+    overlap = campaigns['開始日'].iloc[1:].to_numpy() <= campaigns['終了日'].iloc[:-1].to_numpy()
+    if overlap.any():
+        raise ValueError(f"キャンペーン期間が重なっています: {campaigns['キャンペーン'].iloc[1:][overlap].tolist()}")
+    return campaigns
+
+def assign_campaigns(timestamps, campaigns):
+    """行ごとのキャンペーンの番号（campaignsの行。期間外・日時のない行は-1）を二分探索で求める"""
+    timestamps = np.asarray(timestamps).astype('datetime64[s]')
+    starts = campaigns['開始日'].to_numpy().astype('datetime64[D]').astype('datetime64[s]')
+    # 終了日はその日を含む
+    ends = (campaigns['終了日'].to_numpy().astype('datetime64[D]') + 1).astype('datetime64[s]')
+    position = np.searchsorted(starts, timestamps, side='right') - 1
+    inside = (position >= 0) & ~np.isnat(timestamps)
+    inside[inside] = timestamps[inside] < ends[position[inside]]
+    return np.where(inside, position, -1)
+
+@traced()
+def campaign_cohorts(df, timestamps, campaigns, keys=ROLLING_KEYS):
+    """キャンペーン期間ごとのコホート（回答数の表と、設問の回答値の構成比の縦持ちの表）
+
+    期間外の回答は「キャンペーン期間外」のコホートにまとめる。
+    """
+    cohort = assign_campaigns(timestamps, campaigns)
+    names = list(campaigns['キャンペーン']) + [OUTSIDE_CAMPAIGN]
+    # 期間外（-1）は末尾のコホート
+    cohort = np.where(cohort >= 0, cohort, len(campaigns))
+    sizes = np.bincount(cohort, minlength=len(names))
+
+    days = ((campaigns['終了日'] - campaigns['開始日']).dt.days + 1).tolist() + [np.nan]
+    summary = pd.DataFrame({
+        'キャンペーン': names,
+        '開始日': list(campaigns['開始日'].dt.date) + [None],
+        '終了日': list(campaigns['終了日'].dt.date) + [None],
+        '回答数': sizes,
+        '1日あたり回答数': sizes / np.array(days, dtype=float),
+        '構成比': sizes / len(cohort) * 100 if len(cohort) else np.zeros(len(names)),
+    }, columns=COHORT_COLUMNS)
+
+    rows = []
+    for key in keys:
+        if COLUMNS[key] not in df.columns:
+            continue
+        codes, values = _codes(df[COLUMNS[key]])
+        counts = _daily_counts(cohort, codes, len(names), len(values))
+        answered = counts.sum(axis=1)
+        label = ROLLING_KEYS.get(key, SCHEMA[key]['header'])
+        for i, name in enumerate(names):
+            for j in np.flatnonzero(counts[i] > 0):
+                rows.append((name, label, values[j], int(counts[i, j]), int(answered[i]),
+                             counts[i, j] / answered[i] * 100))
+    return summary, pd.DataFrame(rows, columns=COHORT_SHARE_COLUMNS)
+
+def main():
+    """回答の到着曲線・直近N日の構成比・キャンペーン別のコホートを表示する"""
+    parser = argparse.ArgumentParser(description="回答の時系列（到着曲線・直近N日の構成比・キャンペーン別のコホート）")
+    parser.add_argument('--csv', type=Path, default=CSV_PATH, help="アンケートのCSV")
+    parser.add_argument('--freq', choices=list(FREQUENCIES), default='W', help="到着曲線の集計単位（D: 日別、W: 週別）")
+    parser.add_argument('--window', type=int, default=ROLLING_WINDOW, help="構成比を求める直近の日数")
+    parser.add_argument('--campaigns', type=Path, default=None, help="キャンペーン期間のCSV（キャンペーン, 開始日, 終了日）")
+    parser.add_argument('--output-dir', type=Path, default=None, help="各表（CSV）の保存先のフォルダ")
+    args = parser.parse_args()
+
+    df = load_survey(args.csv)
+    timestamps = load_timestamps(args.csv, df)
+    n_missing = int(np.isnat(timestamps).sum())
+    start, end = timestamp_range(df[COLUMNS['timestamp']])
+    print(f"回答期間: {start} ～ {end}（{len(df)}件" + (f"、日時を読めない回答 {n_missing}件）" if n_missing else "）"))
+
+    tables = {}
+    tables['arrival'] = arrival_curve(timestamps, args.freq)
+    print(f"\n【回答の到着（{'日別' if args.freq == 'D' else '週別'}）】")
+    arrival = tables['arrival'].assign(期間=tables['arrival']['期間'].dt.strftime('%Y/%m/%d'))
+    print(arrival.round(1).to_string(index=False))
+
+    for key in ROLLING_KEYS:
+        table = rolling_shares(df, timestamps, key, args.window)
+        tables[f'rolling_{key}'] = table
+        # 表示は週ごと（各週の最終日時点の直近N日）
+        shown = table.iloc[::-1].iloc[::7].iloc[::-1]
+        shown.index = shown.index.strftime('%Y/%m/%d')
+        print(f"\n【{ROLLING_KEYS[key]}: 直近{args.window}日の構成比（%）】")
+        print(shown.round(1).to_string())
+
+    if args.campaigns:
+        summary, shares = campaign_cohorts(df, timestamps, read_campaigns(args.campaigns))
+        tables['cohorts'], tables['cohort_shares'] = summary, shares
+        print("\n【キャンペーン別のコホート】")
+        print(summary.round(1).to_string(index=False))
+        print(shares.round(1).to_string(index=False))
+
+    if args.output_dir:
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        for name, table in tables.items():
+            table.to_csv(args.output_dir / f"{name}.csv", index=name.startswith('rolling_'), encoding='utf-8-sig')
+        print(f"\n✓ 時系列の表を保存: {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+処理ごとの時間・メモリの計測（トレース）
+@traced を付けた関数の実時間・CPU時間・ピークRSS・（任意で）tracemallocの増減・入出力の件数を記録し、
+JSON Lines（.jsonl）またはChromeのトレース形式（.json、chrome://tracing / Perfettoで表示）で保存する
+enable() を呼ばない限り計測は行わない（関数呼び出し1回分の分岐のみ）
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_TRACE_PATH = Path("trace.jsonl")
+
+# 計測中のトレース（無効時はNone）
+_tracer = None
+
+def _peak_rss():
+    """プロセスのピークRSS（バイト）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def _rows(value):
+    """件数の分かる値（集計値・DataFrame・Series）の行数"""
+    n_rows = getattr(value, 'n_rows', None)
+    if isinstance(n_rows, int):
+        return n_rows
+    if hasattr(value, 'shape') and hasattr(value, 'index'):
+        return len(value)
+    if isinstance(value, tuple) and value:
+        return _rows(value[0])
+    return None
+
+class Tracer:
+    """計測結果の書き出し先"""
+
+    def __init__(self, path=DEFAULT_TRACE_PATH, memory=False):
+        self.path = Path(path)
+        self.memory = memory
+        self.chrome = self.path.suffix == '.json'
+        self.events = []
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = None if self.chrome else open(self.path, 'w', encoding='utf-8')
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def record(self, event):
+        if self.chrome:
+            self.events.append({
+                'name': event['name'],
+                'ph': 'X',
+                'ts': event['start'] * 1e6,
+                'dur': event['wall'] * 1e6,
+                'pid': self.pid,
+                'tid': event['thread'],
+                'args': {k: v for k, v in event.items() if k not in ('name', 'start', 'wall', 'thread')},
+            })
+        else:
+            self._file.write(json.dumps(event, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def close(self):
+        if self.chrome:
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+        elif not self._file.closed:
+            self._file.close()
+
+def enable(path=DEFAULT_TRACE_PATH, memory=False):
+    """計測を開始する（memory=Trueでtracemallocによるメモリの増減も記録する。処理は遅くなる）"""
+    global _tracer
+    disable()
+    _tracer = Tracer(path, memory)
+    atexit.register(disable)
+    return _tracer
+
+def disable():
+    """計測を終了し、トレースを保存する"""
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
+
+def is_enabled():
+    return _tracer is not None
+
+def _run_traced(name, func, args, kwargs):
+    # tracemallocのピークはプロセスで1つのため、入れ子の計測では外側のmemory_peakは
+    # 内側の計測が始まって以降のピークになる
+    tracer = _tracer
+    event = {'name': name, 'rows_in': next((n for n in map(_rows, args) if n is not None), None)}
+    if tracer.memory:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = None
+    try:
+        result = func(*args, **kwargs)
+        return result
+    except BaseException as exc:
+        event['error'] = type(exc).__name__
+        raise
+    finally:
+        event.update(
+            start=start - tracer.origin,
+            wall=time.perf_counter() - start,
+            cpu=time.process_time() - cpu_start,
+            peak_rss=_peak_rss(),
+            rows_out=_rows(result),
+            thread=threading.get_ident(),
+        )
+        if tracer.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            event['memory_delta'] = current - before
+            event['memory_peak'] = peak - before
+        tracer.record(event)
+
+def traced(name=None):
+    """関数を計測対象にするデコレータ（name: トレース上の名前。省略時はモジュール名.関数名）"""
+    def decorate(func):
+        module = func.__module__
+        if module == '__main__':
+            # スクリプトとして実行した場合もファイル名で記録する
+            module = Path(getattr(sys.modules['__main__'], '__file__', module)).stem
+        label = name or f"{module}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return func(*args, **kwargs)
+            return _run_traced(label, func, args, kwargs)
+        return wrapper
+    return decorate
+
+def add_arguments(parser):
+    """コマンドラインに --trace / --trace-memory を追加する"""
+    parser.add_argument('--trace', nargs='?', type=Path, const=DEFAULT_TRACE_PATH, default=None,
+                        help=f"処理ごとの時間・メモリを記録する（省略時 {DEFAULT_TRACE_PATH}、"
+                             "拡張子 .json はChromeのトレース形式）")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="--traceでtracemallocによるメモリの増減も記録する（処理は遅くなる）")
+
+def enable_from_args(args):
+    """--trace が指定されていれば計測を開始する"""
+    if args.trace is not None:
+        enable(args.trace, memory=args.trace_memory)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+調査回（ウェーブ）の比較
+複数回のエクスポートCSVを並列に読み込み（共通スキーマに変換して集計値にする）、
+デモグラフィック・加入タイミング・認知経路・継続率・年契約への意向の割合と前回差を求める
+"""
+
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from survey_aggregates import SurveyAggregates, aggregate_frame
+from survey_intervals import DEFAULT_METHOD, confidence_key, interval_labels
+from survey_loader import load_survey
+from survey_trace import traced
+from survey_weights import rake_frame
+
+# 比較する分布: (指標, セグメント, キー, 回答の並び順 'count' / 'domain')
+WAVE_METRICS = [
+    ('年代別分布', 'all', 'age', 'domain'),
+    ('性別分布', 'all', 'gender', 'count'),
+    ('地域別分布', 'all', 'region', 'count'),
+    ('加入タイミング', 'all', 'join_timing', 'count'),
+    ('認知経路', 'all', 'channel', 'count'),
+    ('短期プラン加入者の年契約への意向', 'short_plan', 'future_intention', 'domain'),
+]
+
+# 継続率: 年契約継続者 / (年契約継続者 + 非継続者)
+CONTINUATION_METRIC = '継続率'
+
+WAVE_COLUMNS = ['指標', '回答', '調査回', '件数', '母数', '割合', '前回差']
+
+DELTA_CSV_PATH = Path("wave_comparison.csv")
+
+def wave_label(csv_path):
+    """ファイル名から調査回の名前を作る（先頭の日付 20251031_... があれば日付）"""
+    stem = Path(csv_path).stem
+    match = re.match(r'(\d{8})_', stem)
+    return match.group(1) if match else stem
+
+def aggregate_wave(csv_path, margins=None):
+    """1回分のCSVを読み込んで集計値にする（ワーカープロセスで実行）
+
+    margins（read_marginsの戻り値）を渡すと、その回の回答者を構成比にレイキングしたウェイトで集計する。
+    """
+    df = load_survey(csv_path)
+    return aggregate_frame(df, weights=None if margins is None else rake_frame(df, margins).weights)
+
+@traced()
+def load_waves(paths, labels=None, workers=None, return_latest=False, margins=None):
+    """複数回分のCSVを並列に集計し、{調査回: 集計値} を指定の順で返す
+
+    各ワーカーは件数だけの集計値を返すため、プロセス間の受け渡しは行データに比べて小さい。
+    return_latest=Trueの場合、最新回（最後のCSV）は呼び出し元のプロセスで読み込み、
+    (集計値の辞書, 最新回のDataFrame, 最新回のレイキングの結果) を返す（最新回のインサイトのために読み込み直さない）。
+    margins（read_marginsの戻り値）を渡すと、調査回ごとに同じ構成比へレイキングしたウェイトで集計する
+    （marginsなしの場合、レイキングの結果はNone）。
+    """
+    paths = [Path(path) for path in paths]
+    labels = list(labels) if labels else [wave_label(path) for path in paths]
+    if len(labels) != len(paths):
+        raise ValueError("調査回の名前の数がファイル数と一致しません")
+    if len(set(labels)) != len(labels):
+        raise ValueError(f"調査回の名前が重複しています: {labels}")
+
+    pooled = paths[:-1] if return_latest else paths
+    latest = None
+    n_workers = min(len(pooled), workers or os.cpu_count() or 1)
+    if n_workers > 1:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = pool.map(partial(aggregate_wave, margins=margins), pooled)
+            # 最新回はワーカーの集計と並行して読み込む
+            if return_latest:
+                latest = load_survey(paths[-1])
+            aggregates = list(results)
+    else:
+        aggregates = [aggregate_wave(path, margins) for path in pooled]
+    if return_latest:
+        if latest is None:
+            latest = load_survey(paths[-1])
+        raking = rake_frame(latest, margins) if margins is not None else None
+        aggregates.append(aggregate_frame(latest, weights=None if raking is None else raking.weights))
+        return dict(zip(labels, aggregates)), latest, raking
+    return dict(zip(labels, aggregates))
+
+def _metric_rows(waves, total, metric, segment, key, order):
+    # 回答の並びは全調査回を合わせた件数順（または選択肢の定義順）で揃える
+    answers = list(total.counts(segment, key, order).index)
+    rows = []
+    for label, agg in waves.items():
+        counts = agg.counts(segment, key)
+        n = agg.size(segment)
+        for answer in answers:
+            rows.append((metric, answer, label, counts.get(answer, 0), n))
+    return rows
+
+@traced()
+def wave_table(waves):
+    """調査回ごとの割合と前回差（ポイント）の縦持ちの表"""
+    total = SurveyAggregates()
+    for agg in waves.values():
+        total.merge(agg)
+    rows = []
+    for metric, segment, key, order in WAVE_METRICS:
+        if all(agg.has(key) for agg in waves.values()):
+            rows.extend(_metric_rows(waves, total, metric, segment, key, order))
+    for label, agg in waves.items():
+        continuing = agg.size('continuing')
+        rows.append((CONTINUATION_METRIC, '継続', label, continuing, continuing + agg.size('discontinued')))
+
+    table = pd.DataFrame(rows, columns=WAVE_COLUMNS[:5])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        table['割合'] = np.where(table['母数'] > 0, table['件数'] / table['母数'] * 100, np.nan)
+    # 同じ指標・回答の1つ前の調査回との差
+    table['前回差'] = table.groupby(['指標', '回答'], sort=False)['割合'].diff()
+    return table[WAVE_COLUMNS]
+
+def _format_delta(delta):
+    if pd.isna(delta):
+        return "-"
+    # -0.04 などを「-0.0pt」と表示しない
+    return f"{round(delta, 1) + 0.0:+.1f}pt"
+
+def wave_insights(waves, table=None, interval_method=DEFAULT_METHOD):
+    """レポート（JSON・マークダウン）の「調査回の比較」セクション（各調査回の割合に信頼区間を付ける）
+
+    ウェイト付きの調査回は、その回のデザイン効果で割った有効サンプルサイズで区間を求める。
+    """
+    if table is None:
+        table = wave_table(waves)
+    design_effects = table['調査回'].map({label: agg.design_effect for label, agg in waves.items()})
+    table = table.assign(信頼区間=interval_labels(list(zip(table['件数'], table['母数'])), interval_method,
+                                              design_effect=design_effects.to_numpy(dtype=float)))
+    ci_key = f"調査回別の割合（{confidence_key()}）"
+    labels = list(waves)
+    section = {
+        "タイトル": f"調査回ごとの比較（{' → '.join(labels)}）",
+        "インサイト": [{
+            "見出し": "調査回",
+            "内容": {label: f"{agg.n_rows}件" for label, agg in waves.items()},
+        }],
+    }
+    for metric, rows in table.groupby('指標', sort=False):
+        shares = {}
+        intervals = {}
+        deltas = {}
+        for answer, answer_rows in rows.groupby('回答', sort=False):
+            shares[answer] = {label: ("-" if pd.isna(rate) else f"{rate:.1f}%")
+                              for label, rate in zip(answer_rows['調査回'], answer_rows['割合'])}
+            intervals[answer] = dict(zip(answer_rows['調査回'], answer_rows['信頼区間']))
+            deltas[answer] = {label: _format_delta(delta)
+                              for label, delta in zip(answer_rows['調査回'], answer_rows['前回差'])
+                              if label != labels[0]}
+        section["インサイト"].append({
+            "見出し": metric,
+            "母数": {label: round(n) for label, n in zip(rows['調査回'], rows['母数'])},
+            "調査回別の割合": shares,
+            ci_key: intervals,
+            "前回差（pt）": deltas,
+        })
+    return section
+
+def print_wave_table(table):
+    """コンソールに指標ごとの割合と前回差を表示する"""
+    for metric, rows in table.groupby('指標', sort=False):
+        print(f"\n【{metric}】")
+        wide = rows.pivot_table(index='回答', columns='調査回', values='割合', sort=False)
+        delta = rows.pivot_table(index='回答', columns='調査回', values='前回差', sort=False)
+        for label in delta.columns:
+            wide[f"前回差({label})"] = delta[label]
+        print(wide.round(1).to_string())
+
+def main():
+    """複数回分のCSVを比較する（例: 20251031_....csv 20260430_....csv）"""
+    parser = argparse.ArgumentParser(description="調査回ごとの比較（割合と前回差）")
+    parser.add_argument('paths', nargs='+', type=Path, help="調査回ごとのCSV（古い順）")
+    parser.add_argument('--labels', nargs='+', default=None, help="調査回の名前（省略時はファイル名の日付）")
+    parser.add_argument('--workers', type=int, default=None, help="並列に読み込むプロセス数")
+    parser.add_argument('--output', type=Path, default=DELTA_CSV_PATH, help="比較表（CSV）の保存先")
+    args = parser.parse_args()
+
+    waves = load_waves(args.paths, args.labels, args.workers)
+    table = wave_table(waves)
+    print_wave_table(table)
+    table.to_csv(args.output, index=False, encoding='utf-8-sig')
+    print(f"\n✓ 比較表を保存: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+母集団の構成比へのウェイト調整（レイキング / 反復比例フィッティング）
+年代・性別・地域の回答値ごとの構成比（CSV）に合うよう、回答者にウェイトを付ける。
+行ごとの反復はせず、年代×性別×地域のセルの人数表（コードから1回のbincountで作成）に対して
+比例調整を繰り返し、最後にセルのウェイトを行に割り当てるため、行数によらずミリ秒で収束する
+
+構成比のCSV（UTF-8）:
+    設問,回答,構成比
+    年代,30代,18.5
+    性別,女性,32.0
+    ...
+設問は属性名（年代・性別・地域）またはスキーマのキー（age・gender・region）。構成比は設問ごとに
+合計が1になるよう正規化する（%・人数でもよい）。構成比にない回答値・無回答の人は、その設問では調整しない。
+"""
+
+import argparse
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from survey_crosstab import ATTRIBUTES
+from survey_schema import COLUMNS, KEYS_BY_HEADER
+from survey_trace import traced
+
+# 調整に使う設問
+RAKING_KEYS = ['age', 'gender', 'region']
+
+MAX_ITERATIONS = 100
+
+# 収束の判定（ウェイト付きの構成比と目標の差の最大値）
+TOLERANCE = 1e-6
+
+MARGIN_COLUMNS = ['設問', '回答', '構成比']
+
+@dataclass
+class RakingResult:
+    """レイキングの結果（weightsは行ごとのウェイト。合計は行数）"""
+
+    weights: np.ndarray
+    iterations: int
+    max_error: float
+    converged: bool
+    # 構成比にあるが回答者のいない回答値（設問のキー, 回答値）
+    missing: list
+
+    @property
+    def effective_n(self):
+        """有効サンプルサイズ（Kish）"""
+        return effective_n(self.weights)
+
+    @property
+    def design_effect(self):
+        """ウェイトによるデザイン効果（行数 / 有効サンプルサイズ）"""
+        return kish_design_effect(self.weights)
+
+def effective_n(weights):
+    """有効サンプルサイズ（Kish）: (Σw)² / Σw²"""
+    weights = np.asarray(weights, dtype=float)
+    total = weights.sum()
+    return float(total * total / (weights ** 2).sum()) if total > 0 else 0.0
+
+def kish_design_effect(weights):
+    """ウェイトによるデザイン効果（Kish）: 行数 / 有効サンプルサイズ（ウェイトなしなら1）"""
+    if weights is None:
+        return 1.0
+    n_eff = effective_n(weights)
+    return len(weights) / n_eff if n_eff else float('nan')
+
+def read_margins(path):
+    """構成比のCSVを {設問のキー: {回答値: 構成比}} にする（設問ごとに合計1に正規化）"""
+    table = pd.read_csv(path, encoding='utf-8-sig', dtype={'設問': str, '回答': str})
+    missing = [col for col in MARGIN_COLUMNS if col not in table.columns]
+    if missing:
+        raise ValueError(f"構成比のCSVに列がありません: {missing}（{', '.join(MARGIN_COLUMNS)}）")
+    margins = {}
+    for name, rows in table.groupby('設問', sort=False):
+        key = KEYS_BY_HEADER.get(ATTRIBUTES.get(name), name)
+        if key not in COLUMNS:
+            raise ValueError(f"不明な設問: {name}")
+        if key not in RAKING_KEYS:
+            raise ValueError(f"調整に使えない設問: {name}（{', '.join(RAKING_KEYS)} のいずれか）")
+        shares = pd.to_numeric(rows['構成比'], errors='raise').to_numpy(dtype=float)
+        if (shares < 0).any() or shares.sum() <= 0:
+            raise ValueError(f"{name}の構成比が不正です")
+        margins[key] = dict(zip(rows['回答'].str.strip(), shares / shares.sum()))
+    return margins
+
+def _codes(series):
+    """列を (コード, 回答値) にする（欠損は-1）"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy().astype(np.int64), list(series.cat.categories)
+    codes, values = pd.factorize(series)
+    return codes.astype(np.int64), list(values)
+
+@traced()
+def rake(codes, targets, max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE):
+    """コード化した列ごとの目標構成比にウェイトを合わせる
+
+    codes:   [行ごとのコードの配列（0..k-1、対象外は-1）]
+    targets: [長さkの目標構成比（対象外の値はnan）]
+    戻り値: (行ごとのウェイト, 反復回数, 構成比の差の最大値)
+    """
+    n_rows = len(codes[0]) if codes else 0
+    # 対象外（-1・nan）は各設問の末尾のセルにまとめる
+    sizes = [len(target) + 1 for target in targets]
+    cell = np.zeros(n_rows, dtype=np.int64)
+    for code, size in zip(codes, sizes):
+        cell = cell * size + np.where(code >= 0, code, size - 1)
+    counts = np.bincount(cell, minlength=int(np.prod(sizes))).reshape(sizes).astype(float)
+
+    goals = [np.append(np.asarray(target, dtype=float), np.nan) for target in targets]
+
+    table = counts.copy()
+    iterations, max_error = 0, 0.0
+    for iterations in range(1, max_iterations + 1):
+        for axis, goal in enumerate(goals):
+            other = tuple(i for i in range(table.ndim) if i != axis)
+            current = table.sum(axis=other)
+            matched = ~np.isnan(goal)
+            factor = np.ones_like(current)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                factor[matched] = goal[matched] * current[matched].sum() / current[matched]
+            factor[~np.isfinite(factor)] = 1.0
+            shape = [1] * table.ndim
+            shape[axis] = -1
+            table *= factor.reshape(shape)
+
+        max_error = 0.0
+        for axis, goal in enumerate(goals):
+            current = table.sum(axis=tuple(i for i in range(table.ndim) if i != axis))
+            matched = ~np.isnan(goal)
+            total = current[matched].sum()
+            if total > 0:
+                max_error = max(max_error, float(np.abs(current[matched] / total - goal[matched]).max()))
+        if max_error < tolerance:
+            break
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cell_weights = np.where(counts > 0, table / counts, 0.0).ravel()
+    return cell_weights[cell], iterations, max_error
+
+def rake_frame(df, margins, keys=RAKING_KEYS, max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE):
+    """DataFrameの回答者に構成比（read_marginsの戻り値）へのウェイトを付ける"""
+    codes, targets, missing = [], [], []
+    for key in keys:
+        if key not in margins or COLUMNS[key] not in df.columns:
+            continue
+        code, values = _codes(df[COLUMNS[key]])
+        observed = np.bincount(code[code >= 0], minlength=len(values)) > 0
+        target = np.array([margins[key].get(str(value), np.nan) for value in values], dtype=float)
+        # 回答者のいない回答値の構成比は他の回答値に配分する
+        target[~observed] = np.nan
+        seen = {str(value) for value, present in zip(values, observed) if present}
+        missing.extend((key, value) for value in margins[key] if value not in seen)
+        if np.nansum(target) > 0:
+            target = target / np.nansum(target)
+        codes.append(code)
+        targets.append(target)
+    if not codes:
+        raise ValueError(f"調整に使える設問がありません（構成比のCSVの設問: {list(margins)}）")
+    weights, iterations, max_error = rake(codes, targets, max_iterations, tolerance)
+    return RakingResult(weights, iterations, max_error, max_error < tolerance, missing)
+
+def weighted_shares(df, weights, key):
+    """設問の回答値ごとのウェイト付き構成比（%）"""
+    code, values = _codes(df[COLUMNS[key]])
+    valid = code >= 0
+    counts = np.bincount(code[valid], weights=weights[valid], minlength=len(values))
+    total = counts.sum()
+    return pd.Series(counts / total * 100 if total > 0 else counts, index=values)
+
+def print_raking(result):
+    """レイキングの結果（収束・有効サンプルサイズ）を表示する"""
+    state = "収束" if result.converged else "未収束"
+    print(f"ウェイト調整: {result.iterations}回の反復で{state}（構成比の差の最大 {result.max_error:.2e}）")
+    print(f"  ウェイトの範囲: {result.weights.min():.3f}〜{result.weights.max():.3f}、"
+          f"有効サンプルサイズ: {result.effective_n:.0f}（デザイン効果 {result.design_effect:.2f}）")
+    for key, value in result.missing:
+        print(f"  ※ 回答者のいない回答値（{key}: {value}）の構成比は他の回答値に配分しました")
+
+def main():
+    """構成比のCSVでウェイトを求め、調整前後の構成比を表示する"""
+    from survey_loader import CSV_PATH, load_survey
+
+    parser = argparse.ArgumentParser(description="母集団の構成比へのウェイト調整（レイキング）")
+    parser.add_argument('margins', type=Path, help="構成比のCSV（設問, 回答, 構成比）")
+    parser.add_argument('--csv', type=Path, default=CSV_PATH, help="アンケートのCSV")
+    parser.add_argument('--output', type=Path, default=None, help="行ごとのウェイト（CSV）の保存先")
+    args = parser.parse_args()
+
+    df = load_survey(args.csv)
+    margins = read_margins(args.margins)
+    result = rake_frame(df, margins)
+    print_raking(result)
+    for key in RAKING_KEYS:
+        if key in margins:
+            before = weighted_shares(df, np.ones(len(df)), key)
+            after = weighted_shares(df, result.weights, key)
+            target = pd.Series(margins[key]) * 100
+            table = pd.DataFrame({'調整前%': before, '調整後%': after, '目標%': target.reindex(before.index)})
+            print(f"\n【{key}】")
+            print(table.round(1).to_string())
+    if args.output:
+        pd.DataFrame({'ウェイト': result.weights}).to_csv(args.output, index=False, encoding='utf-8-sig')
+        print(f"\n✓ ウェイトを保存: {args.output}")
+
+if __name__ == "__main__":
+    main()